@@ -4,6 +4,8 @@ import numpy as np
 import plotly.graph_objects as go
 from datetime import datetime
 
+from simulador_imss import calcular_pension, calcular_mod40
+
 # Configuración
 st.set_page_config(
     page_title="IMSS Ley 73 - PRO", 
@@ -27,103 +29,6 @@ st.markdown("**LEY 73 - Art. 167**")
 st.caption("Modelo basado en cálculo oficial con Modalidad 40")
 st.divider()
 
-# ============================================
-# FUNCIONES DE CÁLCULO
-# ============================================
-
-def calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa=True):
-    FACTOR_POR_EDAD = {60:0.75, 61:0.80, 62:0.85, 63:0.90, 64:0.95, 65:1.00}
-    FACTOR_EDAD = FACTOR_POR_EDAD.get(edad_retiro, 0.75)
-    
-    PCT_CUANTIA = 0.13
-    PCT_INCREMENTO = 0.0245
-    PCT_ESPOSA = 0.15 if esposa else 0
-    DECRETO_FOX = 0.11
-    
-    años_para_retiro = max(0, edad_retiro - edad_actual)
-    semanas_60 = semanas + (52 * años_para_retiro)
-    
-    cuantia_basica_diaria = salario * PCT_CUANTIA
-    cuantia_basica_anual = cuantia_basica_diaria * 365
-    
-    incremento_diario = salario * PCT_INCREMENTO
-    años_despues_500 = max(0, (semanas_60 - 500) / 52)
-    incrementos_anuales = incremento_diario * 365 * años_despues_500
-    
-    cuantia_total_anual = cuantia_basica_anual + incrementos_anuales
-    asignacion_anual = cuantia_total_anual * PCT_ESPOSA
-    total_con_asignacion = cuantia_total_anual + asignacion_anual
-    decreto_fox = total_con_asignacion * DECRETO_FOX
-    cuantia_base_total = total_con_asignacion + decreto_fox
-    
-    pension_anual = cuantia_base_total * FACTOR_EDAD
-    pension_mensual = pension_anual / 12
-    
-    return {
-        'mensual': round(pension_mensual, 2),
-        'anual': round(pension_anual, 2),
-        'semanas_60': round(semanas_60, 0),
-        'factor_edad': FACTOR_EDAD
-    }
-
-def calcular_mod40(semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa=True):
-    años_para_retiro = max(0, edad_retiro - edad_actual)
-    
-    factores = {1: 0.13347, 2: 0.14438, 3: 0.15529, 4: 0.1662}
-    
-    meses_por_año = 30.4
-    inversion = 0
-    meses_restantes = meses_m40
-    
-    for año in range(1, 5):
-        if meses_restantes <= 0:
-            break
-        meses_en_año = min(12, meses_restantes)
-        inversion += salario_m40 * meses_en_año * meses_por_año * factores.get(año, 0.13347)
-        meses_restantes -= meses_en_año
-    
-    semanas_m40 = (meses_m40 / 12) * 52
-    semanas_totales = semanas + (52 * años_para_retiro) + semanas_m40
-    
-    if meses_m40 >= 6:
-        semanas_ponderadas = min(semanas_m40, 250)
-        semanas_previas = 250 - semanas_ponderadas
-        nuevo_promedio = ((salario * semanas_previas) + (salario_m40 * semanas_ponderadas)) / 250 if semanas_previas > 0 else salario_m40
-    else:
-        nuevo_promedio = salario
-    
-    FACTOR_POR_EDAD = {60:0.75, 61:0.80, 62:0.85, 63:0.90, 64:0.95, 65:1.00}
-    FACTOR_EDAD = FACTOR_POR_EDAD.get(edad_retiro, 0.75)
-    
-    PCT_CUANTIA = 0.13
-    PCT_INCREMENTO = 0.0245
-    PCT_ESPOSA = 0.15 if esposa else 0
-    DECRETO_FOX = 0.11
-    AJUSTE_FINAL = 1.2166
-    
-    años_despues_500 = max(0, (semanas_totales - 500) / 52)
-    
-    pension_anual = (
-        ((nuevo_promedio * PCT_CUANTIA * 365) +
-         (nuevo_promedio * PCT_INCREMENTO * 365 * años_despues_500)) *
-        (1 + PCT_ESPOSA) * (1 + DECRETO_FOX) * FACTOR_EDAD * AJUSTE_FINAL
-    )
-    
-    pension_mensual = pension_anual / 12
-    base = calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa)
-    incremento = pension_mensual - base['mensual']
-    
-    return {
-        'base': base['mensual'],
-        'con_m40': round(pension_mensual, 2),
-        'incremento': round(incremento, 2),
-        'inversion': round(inversion, 2),
-        'recuperacion_meses': round(inversion / max(1, incremento), 1),
-        'utilidad_20': round((incremento * 12 * 20) - inversion, 2),
-        'roi': round(((incremento * 12 * 20) / inversion) * 100, 0) if inversion > 0 else 0,
-        'nuevo_promedio': round(nuevo_promedio, 2)
-    }
-
 # ============================================
 # PESTAÑAS
 # ============================================
@@ -1,22 +1,30 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
 from datetime import datetime
-import hashlib
-import platform
-import os
 import json
+import math
+import os
+import re
+import time
+
+# Solo lo que necesita la pantalla de licencia (sin NumPy, pandas ni plotly): los módulos pesados
+# se importan donde se usan, después de validar la licencia
+from simulador_imss.cache import CACHE
+from simulador_imss.escenario import Escenario
+from simulador_imss import instrumentacion
+from simulador_imss.instrumentacion import medir
+from simulador_imss.licencias import get_machine_id, obtener_almacen
+from simulador_imss.parametros import REGLAS, VERSION_DEFECTO
+from simulador_imss import persistente
+from simulador_imss.tokens import LicenciaInvalida, parece_token, validar_token
+
+# La app sí guarda resultados en disco: en SIMULADOR_CACHE_DB o en ARCHIVO_CACHE junto a la app (=0 la apaga)
+if persistente.RUTA is None and os.environ.get(persistente.VARIABLE_RUTA) != "0":
+    persistente.activar()
 
 # ============================================
 # SISTEMA DE LICENCIAS MEJORADO (2 MÁQUINAS)
 # ============================================
 
-def get_machine_id():
-    """Genera un identificador único para la máquina"""
-    machine_info = f"{platform.node()}-{platform.processor()}-{os.name}"
-    return hashlib.md5(machine_info.encode()).hexdigest()[:10]
-
 # Base de datos de licencias
 LICENCIAS = {
     "CLIENTE1-A3F8": {
@@ -39,33 +47,46 @@ LICENCIAS = {
     },
 }
 
-ARCHIVO_LICENCIAS = "licencias_activas.json"
-
-def cargar_licencias():
-    """Carga el estado de las licencias desde archivo"""
-    if os.path.exists(ARCHIVO_LICENCIAS):
-        with open(ARCHIVO_LICENCIAS, "r") as f:
-            return json.load(f)
-    return {}
-
-def guardar_licencias(estado):
-    """Guarda el estado de las licencias en archivo"""
-    with open(ARCHIVO_LICENCIAS, "w") as f:
-        json.dump(estado, f, indent=2)
+# Registro de máquinas (SQLite compartido por todo el proceso)
+ALMACEN_LICENCIAS = obtener_almacen()
 
 def verificar_licencia():
     """Verifica licencia por máquina"""
     
     if st.session_state.get("licencia_validada", False):
-        return True
+        token = st.session_state.get("token_licencia")
+        if token is None:
+            return True
+        # Los tokens firmados se revalidan en cada rerun (solo CPU, sin archivos)
+        try:
+            validar_token(token, get_machine_id())
+            return True
+        except LicenciaInvalida as e:
+            st.session_state.licencia_validada = False
+            st.session_state.token_licencia = None
+            st.sidebar.error(f"❌ {e}")
     
     machine_id = get_machine_id()
-    estado_licencias = cargar_licencias()
     
     st.sidebar.header("🔐 Acceso PRO")
     codigo = st.sidebar.text_input("Código de licencia", type="password")
     
     if st.sidebar.button("Activar licencia"):
+        # Token firmado: se valida sin consultar el registro de máquinas
+        if parece_token(codigo):
+            try:
+                datos_token = validar_token(codigo, machine_id)
+            except LicenciaInvalida as e:
+                st.sidebar.error(f"❌ {e}")
+                st.sidebar.caption(f"ID de esta máquina: {machine_id}")
+                return False
+            st.session_state.licencia_validada = True
+            st.session_state.codigo_usado = datos_token["codigo"]
+            st.session_state.token_licencia = codigo
+            st.sidebar.success("✅ Acceso concedido")
+            st.rerun()
+            return True
+        
         if codigo in LICENCIAS:
             licencia = LICENCIAS[codigo]
             
@@ -80,27 +101,22 @@ def verificar_licencia():
                 st.sidebar.error("❌ Licencia expirada")
                 return False
             
-            # Cargar máquinas autorizadas para este código
-            maquinas = estado_licencias.get(codigo, [])
+            # Revisar y, si hay lugar, registrar la máquina en una sola operación
+            autorizada, nueva, total = ALMACEN_LICENCIAS.registrar_maquina(codigo, machine_id, licencia["max_maquinas"])
             
             # Si la máquina ya está autorizada, acceso directo
-            if machine_id in maquinas:
+            if autorizada and not nueva:
                 st.session_state.licencia_validada = True
                 st.session_state.codigo_usado = codigo
                 st.sidebar.success("✅ Acceso concedido")
                 st.rerun()
                 return True
             
-            # Si es una máquina nueva, verificar límite
-            if len(maquinas) < licencia["max_maquinas"]:
-                # Registrar nueva máquina
-                maquinas.append(machine_id)
-                estado_licencias[codigo] = maquinas
-                guardar_licencias(estado_licencias)
-                
+            # Máquina nueva registrada dentro del límite
+            if autorizada:
                 st.session_state.licencia_validada = True
                 st.session_state.codigo_usado = codigo
-                st.sidebar.success(f"✅ Máquina registrada ({len(maquinas)}/{licencia['max_maquinas']})")
+                st.sidebar.success(f"✅ Máquina registrada ({total}/{licencia['max_maquinas']})")
                 st.rerun()
                 return True
             else:
@@ -121,9 +137,27 @@ def verificar_licencia():
 
 st.set_page_config(page_title="IMSS Ley 73 - PRO", layout="centered")
 
-if not verificar_licencia():
+# Instrumentación opcional (SIMULADOR_METRICAS=1 o desde el panel de admin)
+inicio_rerun = time.perf_counter()
+
+with medir("licencia"):
+    licencia_valida = verificar_licencia()
+if not licencia_valida:
     st.stop()
 
+@st.cache_resource(show_spinner=False)
+def precalentar_nucleo():
+    """Núcleo compilado de los lotes grandes (si hay numba), cargado en un hilo una vez por proceso
+
+    NumPy se importa aquí, en el hilo principal: pandas, plotly o Streamlit
+    revisan sys.modules y fallarían con un módulo a medio importar por otro
+    hilo. Por eso pandas y plotly no se precargan, se importan donde se usan.
+    """
+    from simulador_imss import lote
+    return lote.precalentar_nucleo()
+
+precalentar_nucleo()
+
 # Ocultar menús de Streamlit
 hide_streamlit_style = """
             <style>
@@ -140,128 +174,202 @@ st.markdown("**LEY 73 - Art. 167**")
 st.caption("Modelo basado en cálculo oficial con Modalidad 40")
 st.divider()
 
+# Versión de reglas (parámetros precompilados): cambiarla no recarga nada
+versiones_reglas = list(REGLAS)
+reglas = st.sidebar.selectbox("📐 Reglas de cálculo", versiones_reglas,
+                              index=versiones_reglas.index(VERSION_DEFECTO), key="reglas")
+st.sidebar.caption(REGLAS[reglas].descripcion)
+
 # ============================================
-# FUNCIONES DE CÁLCULO
+# COMPARATIVA EN CACHÉ
 # ============================================
 
-def calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa=True):
-    FACTOR_POR_EDAD = {60:0.75, 61:0.80, 62:0.85, 63:0.90, 64:0.95, 65:1.00}
-    FACTOR_EDAD = FACTOR_POR_EDAD.get(edad_retiro, 0.75)
-    
-    PCT_CUANTIA = 0.13
-    PCT_INCREMENTO = 0.0245
-    PCT_ESPOSA = 0.15 if esposa else 0
-    DECRETO_FOX = 0.11
-    
-    años_para_retiro = max(0, edad_retiro - edad_actual)
-    semanas_60 = semanas + (52 * años_para_retiro)
-    
-    cuantia_basica_diaria = salario * PCT_CUANTIA
-    cuantia_basica_anual = cuantia_basica_diaria * 365
-    
-    incremento_diario = salario * PCT_INCREMENTO
-    años_despues_500 = max(0, (semanas_60 - 500) / 52)
-    incrementos_anuales = incremento_diario * 365 * años_despues_500
-    
-    cuantia_total_anual = cuantia_basica_anual + incrementos_anuales
-    asignacion_anual = cuantia_total_anual * PCT_ESPOSA
-    total_con_asignacion = cuantia_total_anual + asignacion_anual
-    decreto_fox = total_con_asignacion * DECRETO_FOX
-    cuantia_base_total = total_con_asignacion + decreto_fox
-    
-    pension_anual = cuantia_base_total * FACTOR_EDAD
-    pension_mensual = pension_anual / 12
-    
-    return {
-        'mensual': round(pension_mensual, 2),
-        'anual': round(pension_anual, 2),
-        'semanas_60': round(semanas_60, 0),
-        'factor_edad': FACTOR_EDAD
-    }
-
-def calcular_mod40(semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa=True):
-    años_para_retiro = max(0, edad_retiro - edad_actual)
-    
-    factores = {1: 0.13347, 2: 0.14438, 3: 0.15529, 4: 0.1662}
-    
-    meses_por_año = 30.4
-    inversion = 0
-    meses_restantes = meses_m40
-    
-    for año in range(1, 5):
-        if meses_restantes <= 0:
-            break
-        meses_en_año = min(12, meses_restantes)
-        inversion += salario_m40 * meses_en_año * meses_por_año * factores.get(año, 0.13347)
-        meses_restantes -= meses_en_año
-    
-    semanas_m40 = (meses_m40 / 12) * 52
-    semanas_totales = semanas + (52 * años_para_retiro) + semanas_m40
-    
-    if meses_m40 >= 6:
-        semanas_ponderadas = min(semanas_m40, 250)
-        semanas_previas = 250 - semanas_ponderadas
-        nuevo_promedio = ((salario * semanas_previas) + (salario_m40 * semanas_ponderadas)) / 250 if semanas_previas > 0 else salario_m40
-    else:
-        nuevo_promedio = salario
-    
-    FACTOR_POR_EDAD = {60:0.75, 61:0.80, 62:0.85, 63:0.90, 64:0.95, 65:1.00}
-    FACTOR_EDAD = FACTOR_POR_EDAD.get(edad_retiro, 0.75)
-    
-    PCT_CUANTIA = 0.13
-    PCT_INCREMENTO = 0.0245
-    PCT_ESPOSA = 0.15 if esposa else 0
-    DECRETO_FOX = 0.11
-    AJUSTE_FINAL = 1.2166
-    
-    años_despues_500 = max(0, (semanas_totales - 500) / 52)
-    
-    pension_anual = (
-        ((nuevo_promedio * PCT_CUANTIA * 365) +
-         (nuevo_promedio * PCT_INCREMENTO * 365 * años_despues_500)) *
-        (1 + PCT_ESPOSA) * (1 + DECRETO_FOX) * FACTOR_EDAD * AJUSTE_FINAL
-    )
-    
-    pension_mensual = pension_anual / 12
-    base = calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa)
-    incremento = pension_mensual - base['mensual']
-    
-    return {
-        'base': base['mensual'],
-        'con_m40': round(pension_mensual, 2),
-        'incremento': round(incremento, 2),
-        'inversion': round(inversion, 2),
-        'recuperacion_meses': round(inversion / max(1, incremento), 1),
-        'utilidad_20': round((incremento * 12 * 20) - inversion, 2),
-        'roi': round(((incremento * 12 * 20) / inversion) * 100, 0) if inversion > 0 else 0,
-        'nuevo_promedio': round(nuevo_promedio, 2)
-    }
+@st.cache_data(max_entries=256, show_spinner=False)
+def comparativa_cacheada(clave, _pension_base, _filas):
+    """Tabla, serie numérica y figura en JSON de la comparativa, por entradas
+
+    `clave` son las entradas de las que depende la comparativa; las filas vienen
+    del escenario. La figura se arma y serializa una sola vez; cada render la
+    reconstruye con plotly.io.from_json, así ninguna sesión toca un objeto
+    compartido (st.cache_data entrega una copia).
+    """
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    pension_base = _pension_base
+    meses_lista = [f['meses'] for f in _filas]
+    pensiones_con_m40 = [f['con_m40'] for f in _filas]
+
+    with medir("comparativa.dataframe"):
+        # Columnas numéricas; el formato lo pone FORMATO_COLUMNAS al mostrarla
+        tabla = pd.DataFrame({
+            "meses": meses_lista,
+            "base": [pension_base] * len(_filas),
+            **{campo: [f[campo] for f in _filas] for campo in ("con_m40", "incremento", "inversion",
+                                                              "recuperacion_meses", "utilidad_20", "roi")},
+        })
+
+        # Modo ligero: solo las dos series numéricas, sin etiquetas ni layout de plotly
+        chart_df = pd.DataFrame({
+            "Meses": [f"{m:02d} meses" for m in meses_lista],
+            "Base (sin M40)": [pension_base] * len(meses_lista),
+            "Con M40": pensiones_con_m40
+        })
+
+    with medir("comparativa.figura"):
+        fig = go.Figure(data=[
+            go.Bar(
+                name='Base (sin M40)',
+                x=[f"{m} meses" for m in meses_lista],
+                y=chart_df["Base (sin M40)"],
+                marker_color='#999999',
+                text=[f"${pension_base:,.0f}" for _ in meses_lista],
+                textposition='outside'
+            ),
+            go.Bar(
+                name='Con M40',
+                x=[f"{m} meses" for m in meses_lista],
+                y=chart_df["Con M40"],
+                marker_color='#0066b3',
+                text=[f"${p:,.0f}" for p in pensiones_con_m40],
+                textposition='outside'
+            )
+        ])
+
+        fig.update_layout(
+            barmode='group',
+            title="Pensión mensual con y sin Modalidad 40",
+            xaxis_title="Meses en M40",
+            yaxis_title="Pensión mensual ($)",
+            yaxis_tickformat="$,.0f",
+            height=500,
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+        )
+
+    with medir("comparativa.serializar"):
+        especificacion = fig.to_json()
+
+    return {'pension_base': pension_base, 'tabla': tabla, 'serie': chart_df, 'figura': especificacion}
+
+# ============================================
+# DATOS DEL CLIENTE
+# ============================================
+
+# Un solo juego de entradas para las tres pestañas
+st.subheader("👤 Datos del cliente")
+
+def cargar_historial():
+    """Llena semanas y salario promedio con el historial semanal subido
+
+    El historial se guarda para que Modalidad 40 use el promedio exacto al
+    terminar de aportar en vez del ponderado.
+    """
+    archivo = st.session_state.get('historial')
+    if archivo is None:
+        st.session_state.pop('historial_cliente', None)
+        st.session_state.pop('historial_id', None)
+        return
+    import pandas as pd
+    from simulador_imss.historial import columnas_historial, Historial
+    try:
+        semana, salario, cliente = columnas_historial(pd.read_csv(archivo))
+        h = Historial(semana, salario, cliente, en_numeros=True)
+        if len(h) > 1:
+            # La pestaña es de un cliente: tomar uno en silencio daría los números de otro
+            raise ValueError(f"El archivo trae {len(h)} clientes; sube el historial de uno solo "
+                             "(para varios: python -m simulador_imss.historial)")
+    except (ValueError, KeyError) as e:
+        st.session_state['historial_error'] = str(e)
+        st.session_state.pop('historial_cliente', None)
+        st.session_state.pop('historial_id', None)
+        return
+    st.session_state.pop('historial_error', None)
+    st.session_state['historial_cliente'] = h
+    st.session_state['historial_id'] = archivo.file_id
+    st.session_state['sem'] = min(int(h.semanas_cotizadas[0]), 3000)
+    st.session_state['sal'] = min(round(float(h.promedio(st.session_state.get('reglas'))[0]), 2), 10000.0)
+
+with st.expander("📄 Cargar historial de semanas cotizadas (CSV)"):
+    st.file_uploader("Columnas semana y salario, o fecha_alta, fecha_baja y salario", type="csv",
+                     key="historial", on_change=cargar_historial)
+    if 'historial_error' in st.session_state:
+        st.error(st.session_state['historial_error'])
+    st.caption("Se calculan las semanas cotizadas y el promedio exacto de las últimas 250 semanas; "
+               "Modalidad 40 usa el promedio exacto al terminar de aportar")
+
+col1, col2 = st.columns(2)
+
+with col1:
+    edad_actual = st.number_input("Edad actual", min_value=40, max_value=65, value=55, step=1, key="edad")
+    semanas_hoy = st.number_input("Semanas cotizadas a la fecha", min_value=0, max_value=3000, value=1315, step=1, key="sem")
+    salario_promedio = st.number_input("Salario promedio últimos 5 años ($)", min_value=0.0, max_value=10000.0, value=965.25, step=10.0, key="sal")
+
+with col2:
+    edad_retiro = st.selectbox("Edad de retiro", [60, 61, 62, 63, 64, 65], index=0, key="retiro")
+    asignacion_esposa = st.checkbox("¿Con asignación por esposa?", value=True, key="esposa")
+    salario_m40 = st.number_input("Salario a cotizar en M40 ($)", min_value=0.0, max_value=20000.0, value=2932.0, step=100.0, key="sal_m40")
+
+# Escenario de la sesión: al cambiar una entrada solo se recalcula lo que depende de ella
+escenario = st.session_state.setdefault('escenario', Escenario())
+escenario.actualizar(semanas=semanas_hoy, salario=salario_promedio, edad_actual=edad_actual, edad_retiro=edad_retiro,
+                     esposa=asignacion_esposa, salario_m40=salario_m40, reglas=reglas,
+                     historial=st.session_state.get('historial_cliente'))
 
 # ============================================
 # PESTAÑAS
 # ============================================
 
-tab1, tab2, tab3 = st.tabs(["📋 Calculadora Base", "📈 Modalidad 40", "📊 Comparativa"])
+# Formato solo de presentación: las tablas llevan números, así que ordenar y exportar usan los valores reales
+FORMATO_COLUMNAS = {
+    "cliente": st.column_config.TextColumn("Cliente"),
+    "meses": st.column_config.NumberColumn("Meses", format="%d"),
+    "semanas": st.column_config.NumberColumn("Semanas", format="%d"),
+    "salario": st.column_config.NumberColumn("Salario", format="dollar"),
+    "edad_actual": st.column_config.NumberColumn("Edad", format="%d"),
+    "edad_retiro": st.column_config.NumberColumn("Retiro", format="%d"),
+    "esposa": st.column_config.CheckboxColumn("Esposa"),
+    "salario_m40": st.column_config.NumberColumn("Salario M40", format="dollar"),
+    "meses_m40": st.column_config.NumberColumn("Meses M40", format="%d"),
+    "reglas": st.column_config.TextColumn("Reglas"),
+    "base": st.column_config.NumberColumn("Pensión Base", format="$%,.0f"),
+    "con_m40": st.column_config.NumberColumn("Pensión con M40", format="$%,.0f"),
+    "incremento": st.column_config.NumberColumn("Incremento", format="$%,.0f"),
+    "inversion": st.column_config.NumberColumn("Inversión", format="$%,.0f"),
+    "recuperacion_meses": st.column_config.NumberColumn("Recuperación", format="%.1f meses"),
+    "utilidad_20": st.column_config.NumberColumn("Utilidad 20a", format="$%,.0f"),
+    "roi": st.column_config.NumberColumn("ROI", format="%d%%"),
+    "nuevo_promedio": st.column_config.NumberColumn("Nuevo promedio", format="dollar"),
+    "clientes": st.column_config.NumberColumn("Clientes", format="%,d"),
+    "inversion_total": st.column_config.NumberColumn("Inversión total", format="$%,.0f"),
+    "roi_mediana": st.column_config.NumberColumn("ROI mediano", format="%d%%"),
+    "con_m40_media": st.column_config.NumberColumn("Pensión media con M40", format="$%,.0f"),
+    "incremento_total": st.column_config.NumberColumn("Incremento total", format="$%,.0f"),
+}
+
+tab1, tab2, tab3, tab4 = st.tabs(["📋 Calculadora Base", "📈 Modalidad 40", "📊 Comparativa", "💼 Cartera"])
 
 # ========== PESTAÑA 1: CALCULADORA BASE ==========
 with tab1:
-    st.subheader("Datos personales")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        edad_actual = st.number_input("Edad actual", min_value=40, max_value=65, value=55, step=1, key="edad1")
-        semanas_hoy = st.number_input("Semanas cotizadas a la fecha", min_value=0, max_value=3000, value=1315, step=1, key="sem1")
-        salario_promedio = st.number_input("Salario promedio últimos 5 años ($)", min_value=0.0, max_value=10000.0, value=965.25, step=10.0, key="sal1")
-    
-    with col2:
-        edad_retiro = st.selectbox("Edad de retiro", [60, 61, 62, 63, 64, 65], index=0, key="retiro1")
-        asignacion_esposa = st.checkbox("¿Con asignación por esposa?", value=True, key="esposa1")
-        inflacion = st.slider("Inflación estimada anual (%)", 0.0, 10.0, 4.0, key="inf1") / 100
+    st.subheader("Pensión base")
+    
+    inflacion = st.slider("Inflación estimada anual (%)", 0.0, 10.0, 4.0, key="inf1") / 100
+    
+    # Modo estocástico: trayectorias de inflación y salario en lugar de un solo factor
+    estocastico = st.checkbox("🎲 Simular incertidumbre (Monte Carlo)", value=False, key="mc1")
+    if estocastico:
+        col_mc1, col_mc2 = st.columns(2)
+        with col_mc1:
+            vol_inflacion = st.slider("Volatilidad de la inflación (pp)", 0.0, 5.0, 1.5, key="mc_vol_inf") / 100
+            trayectorias = st.select_slider("Trayectorias", [10000, 20000, 50000, 100000], value=50000, key="mc_n")
+        with col_mc2:
+            crec_salario = st.slider("Crecimiento real del salario (%)", -3.0, 5.0, 0.0, key="mc_crec") / 100
+            vol_salario = st.slider("Volatilidad del salario (pp)", 0.0, 5.0, 2.0, key="mc_vol_sal") / 100
+        semilla = st.number_input("Semilla (reproducible)", min_value=0, max_value=2**31 - 1, value=2024, step=1, key="mc_semilla")
     
     if st.button("Calcular pensión base", type="primary", use_container_width=True, key="btn1"):
         with st.spinner("Calculando..."):
-            base = calcular_pension(semanas_hoy, salario_promedio, edad_actual, edad_retiro, asignacion_esposa)
+            with medir("base.motor"):
+                base = escenario.valor('base')
             
             st.divider()
             col_r1, col_r2, col_r3 = st.columns([1, 2, 1])
@@ -284,27 +392,71 @@ with tab1:
                 factor_inflacion = (1 + inflacion) ** años_para_retiro
                 pension_inflacion = base['mensual'] * factor_inflacion
                 st.info(f"📈 Con inflación del {inflacion*100:.1f}% anual: ${pension_inflacion:,.2f} mensuales (pesos de hoy)")
+            
+            if estocastico:
+                import numpy as np
+                import plotly.graph_objects as go
+                from simulador_imss.montecarlo import simular_pension
+                with medir("base.montecarlo"):
+                    mc = simular_pension(semanas_hoy, salario_promedio, edad_actual, edad_retiro, asignacion_esposa,
+                                         inflacion=inflacion, volatilidad_inflacion=vol_inflacion,
+                                         crecimiento_salario=crec_salario, volatilidad_salario=vol_salario,
+                                         trayectorias=trayectorias, semilla=semilla, reglas=reglas)
+                p_real = mc['percentiles_real']
+                
+                st.markdown("**🎲 Pensión mensual en pesos de hoy (Monte Carlo)**")
+                col_p10, col_p50, col_p90 = st.columns(3)
+                with col_p10:
+                    st.metric("Escenario bajo (P10)", f"${p_real[10]:,.0f}")
+                with col_p50:
+                    st.metric("Mediana (P50)", f"${p_real[50]:,.0f}")
+                with col_p90:
+                    st.metric("Escenario alto (P90)", f"${p_real[90]:,.0f}")
+                
+                # Se agrupa en el servidor: al navegador solo viajan las barras
+                with medir("base.plotly"):
+                    conteos, bordes = np.histogram(mc['real'], bins=60)
+                    fig_mc = go.Figure(go.Bar(x=(bordes[:-1] + bordes[1:]) / 2, y=conteos, width=np.diff(bordes),
+                                              marker_color='#0066b3', name='Trayectorias'))
+                    for pct, valor in p_real.items():
+                        fig_mc.add_vline(x=valor, line_dash="dash", line_color="#00a86b", annotation_text=f"P{pct}")
+                    fig_mc.update_layout(
+                        title="Distribución de la pensión mensual (pesos de hoy)",
+                        xaxis_title="Pensión mensual ($)",
+                        yaxis_title="Trayectorias",
+                        xaxis_tickformat="$,.0f",
+                        height=350,
+                        showlegend=False
+                    )
+                    st.plotly_chart(fig_mc, use_container_width=True)
+                
+                p_nominal = mc['percentiles_nominal']
+                st.caption(f"{trayectorias:,} trayectorias | En pesos del año de retiro: "
+                           f"P10 ${p_nominal[10]:,.0f} · P50 ${p_nominal[50]:,.0f} · P90 ${p_nominal[90]:,.0f}")
 
 # ========== PESTAÑA 2: MODALIDAD 40 ==========
 with tab2:
     st.subheader("Análisis de Modalidad 40")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        edad_m40 = st.number_input("Edad actual", min_value=40, max_value=65, value=55, step=1, key="edad2")
-        semanas_m40 = st.number_input("Semanas cotizadas", min_value=0, max_value=3000, value=1315, step=1, key="sem2")
-        salario_actual = st.number_input("Salario promedio ($)", min_value=0.0, max_value=10000.0, value=965.25, step=10.0, key="sal2")
-    
-    with col2:
-        edad_retiro2 = st.selectbox("Edad de retiro", [60,61,62,63,64,65], index=0, key="retiro2")
-        esposa2 = st.checkbox("¿Con asignación por esposa?", value=True, key="esposa2")
-        salario_m40 = st.number_input("Salario a cotizar en M40 ($)", min_value=0.0, max_value=20000.0, value=2932.0, step=100.0, key="sal_m40")
-        meses_m40 = st.selectbox("Meses en M40", [6,12,18,24,30,36,42,48], index=0, key="meses")
+    meses_m40 = st.selectbox("Meses en M40", [6,12,18,24,30,36,42,48], index=0, key="meses")
+    escenario.actualizar(meses_m40=meses_m40)
+    
+    # Flujo mensual descontado: aportaciones a la tasa de cada año y pensión indexada hasta la esperanza de vida
+    descontado = st.checkbox("📉 Evaluar con flujo descontado (VPN / TIR)", value=False, key="vpn2")
+    if descontado:
+        col_f1, col_f2, col_f3 = st.columns(3)
+        with col_f1:
+            tasa_descuento2 = st.slider("Tasa de descuento anual (%)", 0.0, 20.0, 8.0, key="tasa2") / 100
+        with col_f2:
+            inflacion2 = st.slider("Inflación anual (%)", 0.0, 10.0, 4.0, key="inf2") / 100
+        with col_f3:
+            esperanza2 = st.slider("Esperanza de vida", 65, 100, 80, key="vida2")
+        escenario.actualizar(inflacion=inflacion2, tasa_descuento=tasa_descuento2, esperanza_vida=esperanza2)
     
     if st.button("Calcular Modalidad 40", type="primary", use_container_width=True, key="btn2"):
         with st.spinner("Analizando..."):
-            res = calcular_mod40(semanas_m40, salario_actual, edad_m40, edad_retiro2, salario_m40, meses_m40, esposa2)
+            with medir("mod40.motor"):
+                res = escenario.valor('mod40')
             
             st.divider()
             
@@ -343,92 +495,295 @@ with tab2:
                 st.metric("Utilidad 20 años", f"${res['utilidad_20']:,.0f}")
             
             st.caption(f"ROI: {res['roi']}% | Nuevo salario promedio: ${res['nuevo_promedio']:,.2f}")
+            
+            if descontado:
+                with medir("mod40.flujo"):
+                    flujo = escenario.valor('flujo')
+                col_v1, col_v2, col_v3 = st.columns(3)
+                with col_v1:
+                    st.metric("VPN (pesos de hoy)", f"${flujo['vpn']:,.0f}")
+                with col_v2:
+                    st.metric("TIR anual", "—" if math.isnan(flujo['tir']) else f"{flujo['tir']*100:.1f}%")
+                with col_v3:
+                    recuperacion = flujo['recuperacion_descontada_meses']
+                    st.metric("Recuperación descontada", "Nunca" if math.isnan(recuperacion) else f"{recuperacion:.0f} meses")
+                st.caption(f"Aportado ${flujo['aportado']:,.0f} | Cobrado hasta los {esperanza2} años: "
+                           f"${flujo['cobrado']:,.0f} (nominal, indexado {inflacion2*100:.1f}% anual)")
 
 # ========== PESTAÑA 3: COMPARATIVA ==========
 with tab3:
     st.subheader("Comparativa de escenarios Modalidad 40")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        edad_comp = st.number_input("Edad actual", min_value=40, max_value=65, value=55, step=1, key="edad3")
-        semanas_comp = st.number_input("Semanas cotizadas", min_value=0, max_value=3000, value=1315, step=1, key="sem3")
-        salario_comp = st.number_input("Salario promedio ($)", min_value=0.0, max_value=10000.0, value=965.25, step=10.0, key="sal3")
-    
-    with col2:
-        edad_retiro3 = st.selectbox("Edad de retiro", [60,61,62,63,64,65], index=0, key="retiro3")
-        esposa3 = st.checkbox("¿Con asignación por esposa?", value=True, key="esposa3")
-        salario_tope = st.number_input("Salario M40 ($)", min_value=0.0, max_value=20000.0, value=2932.0, step=100.0, key="tope3")
-    
+    ligera3 = st.toggle("📉 Gráfica ligera (solo datos, para conexiones lentas)", value=False, key="ligera3")
+
     if st.button("Comparar todos los escenarios", type="primary", use_container_width=True, key="btn3"):
+        # Desde el clic la comparativa sigue a las entradas en cada rerun
+        st.session_state['comparativa3'] = True
+
+    if st.session_state.get('comparativa3'):
         with st.spinner("Generando comparativa..."):
+            entradas = escenario.entradas
+            clave = tuple(entradas[k] for k in ('semanas', 'salario', 'edad_actual', 'edad_retiro', 'esposa',
+                                                'salario_m40', 'reglas', 'año_inicio_m40', 'meses_comparativa'))
+            # El historial entra por su archivo: el objeto no sirve como clave de st.cache_data
+            clave += (st.session_state.get('historial_id'),)
+            with medir("comparativa.motor"):
+                pension_base, filas = escenario.valor('base')['mensual'], escenario.valor('comparativa')
+            comparativa = comparativa_cacheada(clave, pension_base, filas)
+        pension_base = comparativa['pension_base']
+
+        st.divider()
+        st.dataframe(comparativa['tabla'], column_config=FORMATO_COLUMNAS, use_container_width=True, hide_index=True)
+
+        # Gráfica de barras side by side
+        st.subheader("📊 Comparativa: Base vs Con M40")
+        with medir("comparativa.plotly"):
+            if ligera3:
+                st.bar_chart(comparativa['serie'], x="Meses", y=["Base (sin M40)", "Con M40"], stack=False,
+                             color=["#999999", "#0066b3"], height=400)
+            else:
+                import plotly.io as pio
+                st.plotly_chart(pio.from_json(comparativa['figura']), use_container_width=True)
+
+        st.info(f"💡 **Pensión base sin M40:** ${pension_base:,.0f} mensuales")
+
+    # Reporte para el cliente: se genera en segundo plano y queda en caché por escenario
+    st.divider()
+    st.subheader("📄 Reporte para el cliente")
+
+    col_r1, col_r2 = st.columns([3, 1])
+    with col_r1:
+        nombre3 = st.text_input("Nombre del cliente", value="", key="nombre3")
+    with col_r2:
+        st.write("")
+        preparar3 = st.button("📄 Preparar reporte", use_container_width=True, key="btn_rep3")
+
+    if preparar3:
+        from simulador_imss.reportes import FORMATOS, GENERADOR, escenario_reporte
+        escenario3 = escenario_reporte(semanas_hoy, salario_promedio, edad_actual, edad_retiro, asignacion_esposa,
+                                       salario_m40, reglas=reglas, nombre=nombre3,
+                                       historial=st.session_state.get('historial_cliente'))
+        with medir("reporte.solicitud"):
+            st.session_state['reporte3'] = {formato: GENERADOR.solicitar(escenario3, formato) for formato in FORMATOS}
+
+    if 'reporte3' in st.session_state:
+        futuros = st.session_state['reporte3']
+
+        @st.fragment(run_every=0.5)
+        def esperar_reporte():
+            # Solo se sondea este fragmento; al terminar, un rerun completo muestra las descargas
+            if all(f.done() for f in futuros.values()):
+                st.rerun()
+            st.caption("⏳ Generando reporte...")
+
+        if not all(f.done() for f in futuros.values()):
+            esperar_reporte()
+        else:
+            archivo = "reporte_" + (re.sub(r"[^A-Za-z0-9]+", "_", nombre3).strip("_") or "cliente")
+            col_d1, col_d2 = st.columns(2)
+            for col, formato, mime in ((col_d1, "pdf", "application/pdf"),
+                                       (col_d2, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")):
+                futuro = futuros[formato]
+                if futuro.exception() is not None:
+                    col.error(f"❌ No se pudo generar el {formato.upper()}: {futuro.exception()}")
+                    continue
+                col.download_button(f"⬇️ Descargar {formato.upper()}", futuro.result(), file_name=f"{archivo}.{formato}",
+                                    mime=mime, on_click="ignore", use_container_width=True, key=f"desc_{formato}3")
+
+    # Mejor plan dentro de un presupuesto (meses 1-60, salario hasta el tope, retiro 60-65)
+    st.divider()
+    st.subheader("🎯 Mejor plan con presupuesto")
+    
+    col_o1, col_o2 = st.columns(2)
+    with col_o1:
+        presupuesto3 = st.number_input("Inversión máxima ($)", min_value=0.0, max_value=5000000.0, value=300000.0, step=10000.0, key="presupuesto3")
+    with col_o2:
+        objetivo3 = st.selectbox("Optimizar", ["Pensión mensual", "Utilidad 20 años", "ROI"], index=0, key="objetivo3")
+    
+    if st.button("Buscar mejor plan", use_container_width=True, key="btn_opt3"):
+        from simulador_imss.optimizador import optimizar_mod40
+        objetivos = {"Pensión mensual": "pension", "Utilidad 20 años": "utilidad", "ROI": "roi"}
+        with medir("optimizador.motor"):
+            plan = optimizar_mod40(semanas_hoy, salario_promedio, edad_actual, asignacion_esposa,
+                                   presupuesto=presupuesto3, objetivo=objetivos[objetivo3], reglas=reglas,
+                                   historial=st.session_state.get('historial_cliente'))
+        
+        if plan is None:
+            st.warning("⚠️ Ningún plan de Modalidad 40 cabe en ese presupuesto")
+        else:
+            col_p1, col_p2, col_p3 = st.columns(3)
+            with col_p1:
+                st.metric("Meses en M40", f"{plan['meses_m40']}")
+            with col_p2:
+                st.metric("Salario M40", f"${plan['salario_m40']:,.2f}")
+            with col_p3:
+                st.metric("Edad de retiro", f"{plan['edad_retiro']}")
             
-            base = calcular_pension(semanas_comp, salario_comp, edad_comp, edad_retiro3, esposa3)
-            pension_base = base['mensual']
-            
-            meses_lista = [6,12,18,24,30,36,42,48]
-            resultados = []
-            pensiones_con_m40 = []
-            
-            for meses in meses_lista:
-                r = calcular_mod40(semanas_comp, salario_comp, edad_comp, edad_retiro3, salario_tope, meses, esposa3)
-                pensiones_con_m40.append(r['con_m40'])
-                resultados.append({
-                    "Meses": f"{meses}",
-                    "Pensión Base": f"${pension_base:,.0f}",
-                    "Pensión con M40": f"${r['con_m40']:,.0f}",
-                    "Incremento": f"${r['incremento']:,.0f}",
-                    "Inversión": f"${r['inversion']:,.0f}",
-                    "Recuperación": f"{r['recuperacion_meses']:.0f} meses",
-                    "Utilidad 20a": f"${r['utilidad_20']:,.0f}",
-                    "ROI": f"{r['roi']}%"
-                })
-            
-            st.divider()
-            df = pd.DataFrame(resultados)
-            st.dataframe(df, use_container_width=True, hide_index=True)
-            
-            # Gráfica de barras side by side
-            st.subheader("📊 Comparativa: Base vs Con M40")
-            
-            chart_df = pd.DataFrame({
-                "Meses": [f"{m} meses" for m in meses_lista],
-                "Base (sin M40)": [pension_base] * len(meses_lista),
-                "Con M40": pensiones_con_m40
-            })
-            
-            fig = go.Figure(data=[
-                go.Bar(
-                    name='Base (sin M40)',
-                    x=chart_df["Meses"],
-                    y=chart_df["Base (sin M40)"],
-                    marker_color='#999999',
-                    text=[f"${pension_base:,.0f}" for _ in meses_lista],
-                    textposition='outside'
-                ),
-                go.Bar(
-                    name='Con M40',
-                    x=chart_df["Meses"],
-                    y=chart_df["Con M40"],
-                    marker_color='#0066b3',
-                    text=[f"${p:,.0f}" for p in pensiones_con_m40],
-                    textposition='outside'
-                )
-            ])
+            col_p4, col_p5, col_p6 = st.columns(3)
+            with col_p4:
+                st.metric("Pensión con M40", f"${plan['con_m40']:,.0f}")
+            with col_p5:
+                st.metric("Inversión total", f"${plan['inversion']:,.0f}")
+            with col_p6:
+                st.metric("Utilidad 20 años", f"${plan['utilidad_20']:,.0f}")
             
-            fig.update_layout(
-                barmode='group',
-                title="Pensión mensual con y sin Modalidad 40",
+            st.caption(f"ROI: {plan['roi']:.0f}% | Incremento mensual: ${plan['incremento']:,.2f}")
+
+    # Búsqueda inversa: cuánto hay que pagar para llegar a una pensión mensual
+    st.divider()
+    st.subheader("🎯 Plan más barato para una pensión meta")
+
+    col_m1, col_m2 = st.columns(2)
+    with col_m1:
+        meta3 = st.number_input("Pensión mensual deseada ($)", min_value=0.0, max_value=500000.0, value=30000.0, step=1000.0, key="meta3")
+    with col_m2:
+        retiro_max3 = st.selectbox("Retirarse a más tardar a los", [60, 61, 62, 63, 64, 65], index=5, key="retiro_max3")
+
+    if st.button("Calcular plan", use_container_width=True, key="btn_meta3"):
+        from simulador_imss.optimizador import meta_mod40
+        with medir("meta.motor"):
+            plan_meta = meta_mod40(semanas_hoy, salario_promedio, edad_actual, meta3, asignacion_esposa,
+                                   edades_retiro=range(60, retiro_max3 + 1), reglas=reglas,
+                                   historial=st.session_state.get('historial_cliente'))
+
+        if plan_meta is None:
+            st.warning("⚠️ Ni con el tope de salario y 60 meses se llega a esa pensión")
+        elif plan_meta['meses_m40'] == 0:
+            st.success(f"✅ No necesitas Modalidad 40: retirándote a los {plan_meta['edad_retiro']} años "
+                       f"tu pensión base de ${plan_meta['con_m40']:,.2f} ya llega a la meta")
+        else:
+            col_q1, col_q2, col_q3, col_q4 = st.columns(4)
+            with col_q1:
+                st.metric("Meses en M40", f"{plan_meta['meses_m40']}")
+            with col_q2:
+                st.metric("Salario M40", f"${plan_meta['salario_m40']:,.2f}")
+            with col_q3:
+                st.metric("Edad de retiro", f"{plan_meta['edad_retiro']}")
+            with col_q4:
+                st.metric("Inversión total", f"${plan_meta['inversion']:,.0f}")
+            st.caption(f"Pensión con M40: ${plan_meta['con_m40']:,.2f} | Recuperación: {plan_meta['recuperacion_meses']:.1f} meses")
+
+    # Mapa de sensibilidad: salario M40 (desde el salario actual hasta el tope) × meses 1-60
+    st.divider()
+    if st.checkbox("🌡️ Mostrar mapa de sensibilidad", value=False, key="mapa3"):
+        import plotly.graph_objects as go
+        from simulador_imss.sensibilidad import METRICAS, rejilla_mod40
+        col_s1, col_s2 = st.columns(2)
+        with col_s1:
+            metrica3 = st.selectbox("Métrica", list(METRICAS), format_func=METRICAS.get, key="metrica3")
+        with col_s2:
+            alto3 = st.slider("Alto de la gráfica", 300, 900, 500, step=50, key="alto3")
+        
+        # La rejilla se guarda por entradas: cambiar métrica o tamaño no recalcula
+        with medir("sensibilidad.motor"):
+            rejilla = rejilla_mod40(semanas_hoy, salario_promedio, edad_actual, edad_retiro, asignacion_esposa, reglas=reglas,
+                                    historial=st.session_state.get('historial_cliente'))
+        
+        with medir("sensibilidad.plotly"):
+            fig_mapa = go.Figure(go.Heatmap(
+                x=rejilla['meses'],
+                y=rejilla['salarios'],
+                z=rejilla[metrica3],
+                colorscale='Blues',
+                colorbar=dict(title=METRICAS[metrica3]),
+                hovertemplate="Meses: %{x}<br>Salario M40: $%{y:,.2f}<br>" + METRICAS[metrica3] + ": %{z:,.1f}<extra></extra>"
+            ))
+            fig_mapa.update_layout(
+                title=f"{METRICAS[metrica3]} por salario y meses en M40",
                 xaxis_title="Meses en M40",
-                yaxis_title="Pensión mensual ($)",
+                yaxis_title="Salario M40 ($)",
                 yaxis_tickformat="$,.0f",
-                height=500,
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                height=alto3
             )
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
-            st.info(f"💡 **Pensión base sin M40:** ${pension_base:,.0f} mensuales")
+            st.plotly_chart(fig_mapa, use_container_width=True)
+
+# ========== PESTAÑA 4: CARTERA ==========
+with tab4:
+    st.subheader("Cartera de clientes")
+    st.caption("CSV o Parquet con semanas, salario, edad_actual y edad_retiro por cliente; "
+               "opcionales: cliente, esposa, salario_m40, meses_m40, reglas y año_inicio_m40")
+
+    col_c1, col_c2 = st.columns([3, 1])
+    with col_c1:
+        archivo4 = st.file_uploader("Archivo de clientes", type=["csv", "parquet"], key="cartera4_archivo")
+    with col_c2:
+        meses4 = st.number_input("Meses M40 si no trae plan", min_value=1, max_value=60, value=24, step=1, key="meses4")
+
+    cartera = None
+    if archivo4 is not None:
+        from simulador_imss.cartera import calcular_cartera, filtrar, leer_cartera, pagina_ordenada, resumen, resumen_por
+        # Se calcula una vez por archivo: filtrar, ordenar o cambiar de página solo toca la cartera ya calculada
+        clave4 = (archivo4.file_id, reglas, meses4)
+        guardada = st.session_state.get('cartera4')
+        if guardada is None or guardada[0] != clave4:
+            with st.spinner("Calculando cartera..."), medir("cartera.motor"):
+                try:
+                    guardada = (clave4, calcular_cartera(leer_cartera(archivo4, archivo4.name), meses_m40=meses4,
+                                                         reglas=reglas))
+                except (ValueError, KeyError) as e:
+                    guardada = (clave4, str(e))
+            st.session_state['cartera4'] = guardada
+        cartera = guardada[1]
+        if isinstance(cartera, str):
+            st.error(f"❌ {cartera}")
+            cartera = None
+
+    if cartera is not None:
+        with medir("cartera.filtros"):
+            col_f1, col_f2, col_f3 = st.columns(3)
+            with col_f1:
+                texto4 = st.text_input("Buscar cliente", key="buscar4")
+            with col_f2:
+                edad_min = int(cartera["edad_actual"].min())
+                edad_max = max(int(cartera["edad_actual"].max()), edad_min + 1)
+                edades4 = st.slider("Edad actual", edad_min, edad_max, (edad_min, edad_max), key="edades4")
+            with col_f3:
+                roi_min4 = st.number_input("ROI mínimo (%)", value=0.0, step=100.0, key="roi_min4")
+            retiros4 = st.multiselect("Edad de retiro", sorted(cartera["edad_retiro"].dropna().unique().astype(int)),
+                                      key="retiros4")
+
+            vista = filtrar(cartera, rangos={'edad_actual': edades4, 'roi': (roi_min4 or None, None)}, texto=texto4,
+                            valores={'edad_retiro': retiros4} if retiros4 else None)
+            totales = resumen(vista)
+
+        col_r1, col_r2, col_r3, col_r4 = st.columns(4)
+        with col_r1:
+            st.metric("Clientes", f"{totales['clientes']:,}")
+        with col_r2:
+            st.metric("Inversión total", f"${totales['inversion_total']:,.0f}")
+        with col_r3:
+            st.metric("ROI mediano", f"{totales['roi_mediana']:,.0f}%" if totales['clientes'] else "—")
+        with col_r4:
+            st.metric("Pensión media con M40", f"${totales['con_m40_media']:,.0f}" if totales['clientes'] else "—")
+
+        # Orden y página: solo la página visible viaja al navegador
+        ordenables = [c for c in FORMATO_COLUMNAS if c in cartera]
+        col_o1, col_o2, col_o3, col_o4 = st.columns(4)
+        with col_o1:
+            orden4 = st.selectbox("Ordenar por", ordenables, index=ordenables.index("roi"),
+                                  format_func=lambda c: FORMATO_COLUMNAS[c]["label"], key="orden4")
+        with col_o2:
+            descendente4 = st.toggle("Descendente", value=True, key="descendente4")
+        with col_o3:
+            tamano4 = st.selectbox("Filas por página", [25, 50, 100, 200], index=1, key="tamano4")
+        with col_o4:
+            pagina4 = st.number_input("Página", min_value=1, value=1, step=1, key="pagina4")
+
+        with medir("cartera.pagina"):
+            pagina, paginas = pagina_ordenada(vista, orden4, not descendente4, pagina4, tamano4)
+            st.dataframe(pagina, column_config=FORMATO_COLUMNAS, use_container_width=True, hide_index=True)
+        st.caption(f"Página {min(pagina4, paginas)} de {paginas:,} · {len(vista):,} de {len(cartera):,} clientes")
+
+        st.download_button("⬇️ Descargar vista filtrada (CSV)", lambda: vista.to_csv(index=False).encode("utf-8"),
+                           file_name="cartera.csv", mime="text/csv", on_click="ignore", key="desc_cartera4")
+
+        st.divider()
+        agrupables = [c for c in ("edad_retiro", "edad_actual", "meses_m40", "reglas", "esposa") if c in cartera]
+        grupo4 = st.selectbox("Resumen por", agrupables, format_func=lambda c: FORMATO_COLUMNAS[c]["label"],
+                              key="grupo4")
+        with medir("cartera.resumen"):
+            st.dataframe(resumen_por(vista, grupo4), column_config=FORMATO_COLUMNAS, use_container_width=True,
+                         hide_index=True)
 
 # ========== PIE DE PÁGINA ==========
 st.divider()
@@ -456,38 +811,79 @@ with st.expander("⚙️ Admin (protegido)"):
         
         with col_a1:
             st.markdown("**📊 Estado actual:**")
-            # Verificar si existe el archivo de licencias
-            if 'ARCHIVO_LICENCIAS' in dir() and os.path.exists(ARCHIVO_LICENCIAS):
-                with open(ARCHIVO_LICENCIAS, "r") as f:
-                    datos = json.load(f)
+            datos = ALMACEN_LICENCIAS.exportar()
+            if datos:
                 st.info(f"📁 Licencias registradas: {len(datos)}")
                 
-                # Botón de descarga
-                with open(ARCHIVO_LICENCIAS, "rb") as f:
-                    from datetime import datetime
-                    st.download_button(
-                        label="📥 Descargar licencias.json",
-                        data=f,
-                        file_name=f"licencias_{datetime.now().strftime('%Y%m%d')}.json",
-                        mime="application/json",
-                        use_container_width=True
-                    )
+                # Botón de descarga (mismo formato que el antiguo licencias_activas.json)
+                st.download_button(
+                    label="📥 Descargar licencias.json",
+                    data=json.dumps(datos, indent=2),
+                    file_name=f"licencias_{datetime.now().strftime('%Y%m%d')}.json",
+                    mime="application/json",
+                    use_container_width=True
+                )
             else:
-                st.warning("⚠️ No hay archivo de licencias aún")
+                st.warning("⚠️ No hay licencias registradas aún")
         
         with col_a2:
             st.markdown("**📝 Últimas activaciones:**")
-            if 'ARCHIVO_LICENCIAS' in dir() and os.path.exists(ARCHIVO_LICENCIAS):
-                with open(ARCHIVO_LICENCIAS, "r") as f:
-                    datos = json.load(f)
-                if datos:
-                    # Mostrar las últimas 5
-                    items = list(datos.items())[-5:]
-                    for codigo, maquinas in items:
-                        st.markdown(f"- **{codigo}**: {len(maquinas)} máquina(s)")
-                else:
-                    st.markdown("*Sin datos*")
+            if datos:
+                # Mostrar las últimas 5
+                items = list(datos.items())[-5:]
+                for codigo, maquinas in items:
+                    st.markdown(f"- **{codigo}**: {len(maquinas)} máquina(s)")
             else:
                 st.markdown("*Sin activaciones*")
+        
+        st.markdown("**⚡ Caché de cálculos:**")
+        stats_cache = CACHE.estadisticas()
+        st.caption(f"Aciertos: {stats_cache['aciertos']:,} | Fallos: {stats_cache['fallos']:,} | "
+                   f"Tasa: {stats_cache['tasa_aciertos']*100:.0f}% | Entradas: {stats_cache['entradas']:,}/{stats_cache['maximo']:,}")
+        # En disco: los contadores son de este proceso, las entradas y el tamaño del archivo compartido
+        cache_disco = persistente.obtener_cache()
+        if cache_disco is not None:
+            stats_disco = cache_disco.estadisticas()
+            st.caption(f"En disco: Aciertos: {stats_disco['aciertos']:,} | Fallos: {stats_disco['fallos']:,} | "
+                       f"Entradas: {stats_disco['entradas']:,} | "
+                       f"{stats_disco['bytes'] / 2**20:,.1f}/{stats_disco['maximo_bytes'] / 2**20:,.0f} MB | "
+                       f"Errores: {stats_disco['errores']:,}")
+        else:
+            st.caption("En disco: desactivada (SIMULADOR_CACHE_DB=0)")
+        
+        # Tiempos por sección: activarlo aquí aplica a todas las sesiones del proceso
+        st.markdown("**⏱️ Instrumentación:**")
+        activa = st.toggle("Medir tiempos por sección", value=instrumentacion.ACTIVO, key="instrumentacion")
+        if activa != instrumentacion.ACTIVO:
+            instrumentacion.activar(activa)
+        
+        lentas = instrumentacion.mas_lentas(10)
+        if lentas:
+            import pandas as pd
+            st.dataframe(pd.DataFrame([{
+                "Sección": seccion,
+                "Llamadas": datos['conteo'],
+                "Total (s)": round(datos['suma'], 3),
+                "Promedio (ms)": round(datos['promedio'] * 1000, 1),
+                "p95 (ms)": round(datos['p95'] * 1000, 1),
+                "Máximo (ms)": round(datos['maximo'] * 1000, 1),
+            } for seccion, datos in lentas]), use_container_width=True, hide_index=True)
+            
+            col_i1, col_i2, col_i3 = st.columns(3)
+            with col_i1:
+                st.download_button("📥 Prometheus", instrumentacion.prometheus(), file_name="metricas.prom",
+                                   mime="text/plain", on_click="ignore", use_container_width=True)
+            with col_i2:
+                st.download_button("📥 JSON", json.dumps(instrumentacion.instantanea(), indent=2), file_name="metricas.json",
+                                   mime="application/json", on_click="ignore", use_container_width=True)
+            with col_i3:
+                if st.button("🗑️ Reiniciar", use_container_width=True, key="reiniciar_metricas"):
+                    instrumentacion.reiniciar()
+                    st.rerun()
+        else:
+            st.caption("Sin mediciones todavía" if instrumentacion.ACTIVO else "Desactivada (SIMULADOR_METRICAS=1 o el interruptor)")
     elif password != "":
         st.error("❌ Contraseña incorrecta")
+
+if instrumentacion.ACTIVO:
+    instrumentacion.registrar("rerun", time.perf_counter() - inicio_rerun)
@@ -0,0 +1,331 @@
+"""Micro-benchmarks del motor de pensión
+
+Mide calcular_pension, calcular_mod40, el ciclo completo de la pestaña
+Comparativa, VPN/TIR del flujo mensual y los caminos en lote/vectorizados a varios tamaños (de 1 a
+10 millones de escenarios). Cada corrida se agrega como una línea JSON a
+benchmarks/historial.jsonl y se compara contra la mejor corrida anterior
+de la misma máquina: si algún caso baja más del umbral, termina con
+código 1.
+
+Uso:
+    python benchmarks/benchmark_motor.py
+    python benchmarks/benchmark_motor.py --tamanos 1 1000 1000000 10000000 --procesos 8
+    python benchmarks/benchmark_motor.py --umbral 0.15 --sin-guardar
+    python benchmarks/benchmark_motor.py --filtro importtime --sin-guardar
+    python benchmarks/benchmark_motor.py --sin-nucleo     # todo en NumPy aunque numba esté instalado
+
+También mide el arranque en frío de la app con `python -X importtime`: los
+imports de nivel superior de Simulador_Pro_v8.py (lo que carga la pantalla
+de licencia, que no debe traer NumPy, pandas ni plotly) y todos los imports
+de la app (una sesión que usa todas las pestañas).
+
+Con numba instalado, los casos en lote grandes usan el núcleo compilado
+(simulador_imss/nucleo.py, precalentado fuera de la medición) y los casos
+*/lote_numpy/* miden el mismo cálculo en NumPy para comparar.
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import numpy as np
+import pandas as pd
+
+from simulador_imss import lote, motor, persistente
+from simulador_imss.cartera import calcular_cartera, filtrar, pagina_ordenada, resumen, resumen_por
+from simulador_imss.flujos import evaluar_mod40_lote
+from simulador_imss.lote import calcular_pension_lote, calcular_mod40_lote
+from simulador_imss.montecarlo import simular_pension
+from simulador_imss.optimizador import meta_mod40, meta_mod40_lote, optimizar_mod40
+from simulador_imss.sensibilidad import _rejilla
+
+HISTORIAL = RAIZ / "benchmarks" / "historial.jsonl"
+APP = RAIZ / "Simulador_Pro_v8.py"
+TAMANOS = (1, 100, 10_000, 1_000_000)
+UMBRAL = 0.20
+
+# Arranque en frío: corridas por medición (se toma la mejor) y módulos que la pantalla de licencia no debe cargar
+CORRIDAS_IMPORTTIME = 3
+# (plotly.graph_objects no cuenta: Streamlit lo importa y es un stub diferido)
+MODULOS_PESADOS = ("numpy", "pandas", "pyarrow", "numba")
+
+# Las funciones escalares se miden con a lo más este número de llamadas
+MAX_LLAMADAS_ESCALARES = 100_000
+MESES_LISTA = [6, 12, 18, 24, 30, 36, 42, 48]
+
+# ============================================
+# UTILIDADES
+# ============================================
+
+def medir(funcion, repeticiones=3, minimo=0.2):
+    """Mejor tiempo por ejecución (s): repite hasta acumular `minimo` segundos, `repeticiones` veces"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        vueltas, inicio = 0, time.perf_counter()
+        while True:
+            funcion()
+            vueltas += 1
+            transcurrido = time.perf_counter() - inicio
+            if transcurrido >= minimo:
+                break
+        mejor = min(mejor, transcurrido / vueltas)
+    return mejor
+
+def escenarios(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return {
+        "semanas": rng.integers(500, 2500, n).astype(np.float64),
+        "salario": np.round(rng.uniform(200, 3000, n), 2),
+        "edad_actual": rng.integers(45, 60, n).astype(np.float64),
+        "edad_retiro": rng.integers(60, 66, n).astype(np.float64),
+        "salario_m40": np.full(n, 2932.0),
+        "meses_m40": rng.integers(6, 49, n).astype(np.float64),
+        "esposa": rng.integers(0, 2, n).astype(bool),
+    }
+
+# ============================================
+# CASOS
+# ============================================
+
+def sin_nucleo(funcion, datos):
+    lote.NUCLEO = False
+    try:
+        return funcion(datos)
+    finally:
+        lote.NUCLEO = True
+
+def casos(tamanos, procesos):
+    """Genera (nombre, escenarios, función) para cada caso y tamaño"""
+    for n in tamanos:
+        datos = escenarios(n)
+        filas = [tuple(datos[c][i].item() for c in datos) for i in range(min(n, MAX_LLAMADAS_ESCALARES))]
+
+        def pension_escalar(filas=filas):
+            for s, sal, ea, er, _, _, esp in filas:
+                motor.calcular_pension(s, sal, ea, er, esp)
+
+        def mod40_escalar(filas=filas):
+            for fila in filas:
+                motor.calcular_mod40(*fila)
+
+        yield f"calcular_pension/escalar/{n}", len(filas), pension_escalar
+        yield f"calcular_mod40/escalar/{n}", len(filas), mod40_escalar
+        yield f"calcular_pension/lote/{n}", n, lambda datos=datos: calcular_pension_lote(datos)
+        yield f"calcular_mod40/lote/{n}", n, lambda datos=datos: calcular_mod40_lote(datos)
+        if lote.NUCLEO and n >= lote.NUCLEO_MINIMO_FILAS:
+            yield f"calcular_pension/lote_numpy/{n}", n, lambda datos=datos: sin_nucleo(calcular_pension_lote, datos)
+            yield f"calcular_mod40/lote_numpy/{n}", n, lambda datos=datos: sin_nucleo(calcular_mod40_lote, datos)
+
+        if procesos > 1 and n >= 1_000_000:
+            from simulador_imss.paralelo import CalculadorParalelo
+            calculador = CalculadorParalelo(procesos)
+            # Se arranca el pool fuera de la medición
+            calculador.calcular_mod40(escenarios(calculador.tamano_bloque + 1))
+            yield f"calcular_mod40/paralelo{procesos}/{n}", n, lambda datos=datos: calculador.calcular_mod40(datos)
+            calculador.cerrar()
+
+    # Pestaña Comparativa: pensión base + 8 escenarios de meses_lista
+    def comparativa_escalar():
+        motor.calcular_pension(1315, 965.25, 55, 60, True)
+        for meses in MESES_LISTA:
+            motor.calcular_mod40(1315, 965.25, 55, 60, 2932.0, meses, True)
+
+    def comparativa_lote():
+        calcular_mod40_lote(semanas=1315, salario=965.25, edad_actual=55, edad_retiro=60,
+                            salario_m40=2932.0, meses_m40=np.asarray(MESES_LISTA), esposa=True)
+
+    def rejilla():
+        _rejilla.cache_clear()
+        _rejilla(1315.0, 965.25, 55.0, 60.0, True, 2932.0, 167, tuple(range(1, 61)))
+
+    yield "comparativa/escalar", 1, comparativa_escalar
+    yield "comparativa/lote", 1, comparativa_lote
+    yield "optimizador/1", 1, lambda: optimizar_mod40(1315, 965.25, 55, True, presupuesto=300_000)
+    yield "meta/1", 1, lambda: meta_mod40(1315, 965.25, 55, 30_000)
+    metas = dict(escenarios(5_000), meta=np.linspace(10_000, 60_000, 5_000))
+    yield "meta_lote/5000", 5_000, lambda: meta_mod40_lote(metas)
+    yield "rejilla_sensibilidad/10020", 10_020, rejilla
+    yield "montecarlo/50000", 50_000, lambda: simular_pension(1315, 965.25, 55, 60, semilla=1)
+    # Cartera: un rerun de la pestaña (filtro, página ordenada y resúmenes) sobre 100k clientes ya calculados
+    cartera = calcular_cartera(pd.DataFrame(escenarios(100_000)))
+
+    def cartera_rerun():
+        vista = filtrar(cartera, rangos={'edad_actual': (50, 58), 'roi': (1000, None)})
+        pagina_ordenada(vista, 'inversion', ascendente=False, numero=3)
+        resumen(vista)
+        resumen_por(vista, 'edad_retiro')
+
+    yield "cartera_rerun/100000", 100_000, cartera_rerun
+    flujos = escenarios(5_000)
+    yield "flujos_vpn_tir/5000", 5_000, lambda: evaluar_mod40_lote(flujos)
+
+    # Aciertos de la caché en disco (lo que ve otro proceso o un reinicio): leer y deserializar
+    disco = persistente.CachePersistente(os.path.join(tempfile.mkdtemp(), "cache.db"))
+    entradas = {
+        "comparativa": lambda: [{'meses': m, **motor.calcular_mod40(1315, 965.25, 55, 60, 2932.75, m)}
+                                for m in range(6, 49, 6)],
+        "rejilla": lambda: _rejilla.__wrapped__(1315.0, 965.25, 55.0, 60.0, True, 2932.0, 167, tuple(range(1, 61))),
+        "montecarlo": lambda: simular_pension(1315, 965.25, 55, 60, semilla=1),
+    }
+    for nombre, calcular in entradas.items():
+        disco.obtener((nombre,), calcular)
+        yield f"persistente/{nombre}", 1, lambda nombre=nombre: disco.obtener((nombre,), None)
+
+# ============================================
+# ARRANQUE EN FRÍO (-X importtime)
+# ============================================
+
+def importaciones_app(ruta=APP):
+    """(imports de nivel superior, todos los imports) de la app como código, leídos de su AST
+
+    Los de nivel superior son lo que corre antes de verificar la licencia;
+    el resto son los imports diferidos de las pestañas.
+    """
+    arbol = ast.parse(Path(ruta).read_text(encoding="utf-8"))
+    inicio = [ast.unparse(n) for n in arbol.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    diferidos = [ast.unparse(n) for n in ast.walk(arbol)
+                 if isinstance(n, (ast.Import, ast.ImportFrom)) and ast.unparse(n) not in inicio]
+    return "\n".join(inicio), "\n".join(inicio + list(dict.fromkeys(diferidos)))
+
+def importtime(codigo):
+    """Mejor de CORRIDAS_IMPORTTIME procesos nuevos: (segundos, {paquete raíz: segundos}, módulos cargados)"""
+    mejor = None
+    for _ in range(CORRIDAS_IMPORTTIME):
+        proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=RAIZ, capture_output=True,
+                                 text=True, env={**os.environ, "PYTHONPATH": str(RAIZ)})
+        if proceso.returncode != 0:
+            raise RuntimeError(proceso.stderr.strip().splitlines()[-1])
+        por_paquete, modulos = {}, set()
+        for linea in proceso.stderr.splitlines():
+            if not linea.startswith("import time:") or "cumulative" in linea:
+                continue
+            _, acumulado, nombre = linea[len("import time:"):].split("|")
+            modulos.add(nombre.strip())
+            # Solo los de primer nivel (un espacio de sangría) para no contar dos veces
+            if not nombre.startswith("  "):
+                raiz = nombre.strip().split(".")[0]
+                por_paquete[raiz] = por_paquete.get(raiz, 0.0) + int(acumulado) / 1e6
+        total = sum(por_paquete.values())
+        if mejor is None or total < mejor[0]:
+            mejor = (total, por_paquete, modulos)
+    return mejor
+
+def medir_arranque(filtro=""):
+    """Casos importtime/licencia e importtime/completo con el desglose por paquete"""
+    resultados = {}
+    for nombre, codigo in zip(("importtime/licencia", "importtime/completo"), importaciones_app()):
+        if filtro not in nombre:
+            continue
+        segundos, por_paquete, modulos = importtime(codigo)
+        resultados[nombre] = {"escenarios": 1, "segundos": segundos, "escenarios_por_segundo": 1 / segundos,
+                              "paquetes": {p: round(t, 4) for p, t in por_paquete.items()}}
+        mayores = sorted(por_paquete.items(), key=lambda par: -par[1])[:6]
+        print(f"{nombre:<40} {len(modulos):>12,} {segundos * 1000:>10.1f}ms   "
+              + ", ".join(f"{p} {t * 1000:.0f}ms" for p, t in mayores))
+        if nombre == "importtime/licencia":
+            pesados = [m for m in MODULOS_PESADOS if m in modulos]
+            if pesados:
+                print(f"   ⚠️ la pantalla de licencia carga {', '.join(pesados)}")
+    return resultados
+
+# ============================================
+# HISTORIAL Y REGRESIONES
+# ============================================
+
+def cargar_historial(ruta):
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, "r") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+def buscar_regresiones(resultados, historial, maquina, umbral, nucleo=False):
+    """Casos cuyo rendimiento cae más de `umbral` contra el mejor previo de esta máquina
+
+    Solo cuentan corridas con el mismo ajuste del núcleo compilado; las
+    anteriores a ese campo se corrieron sin él.
+    """
+    mejores = {}
+    for corrida in historial:
+        if corrida.get("maquina") != maquina or bool(corrida.get("nucleo", False)) != bool(nucleo):
+            continue
+        for nombre, r in corrida["resultados"].items():
+            mejores[nombre] = max(mejores.get(nombre, 0), r["escenarios_por_segundo"])
+
+    regresiones = []
+    for nombre, r in resultados.items():
+        if nombre in mejores and r["escenarios_por_segundo"] < mejores[nombre] * (1 - umbral):
+            regresiones.append((nombre, r["escenarios_por_segundo"], mejores[nombre]))
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del motor de pensión")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS), help="número de escenarios por caso")
+    parser.add_argument("--procesos", type=int, default=1, help="también medir el modo multiproceso (n >= 1M)")
+    parser.add_argument("--umbral", type=float, default=UMBRAL, help="caída máxima tolerada (0.20 = 20%%)")
+    parser.add_argument("--historial", default=str(HISTORIAL), help="archivo JSONL de resultados")
+    parser.add_argument("--sin-guardar", action="store_true", help="no agregar esta corrida al historial")
+    parser.add_argument("--filtro", default="", help="solo casos cuyo nombre contenga este texto")
+    parser.add_argument("--sin-importtime", action="store_true", help="no medir el arranque en frío de la app")
+    parser.add_argument("--sin-nucleo", action="store_true", help="no usar el núcleo compilado aunque haya numba")
+    args = parser.parse_args(argv)
+
+    # Los casos miden el cálculo, no la caché en disco de una corrida anterior
+    persistente.activar(None)
+
+    if args.sin_nucleo:
+        lote.NUCLEO = False
+    elif lote.precalentar_nucleo(en_segundo_plano=False) is not None:
+        import numba
+        print(f"núcleo compilado activo (numba {numba.__version__}) desde {lote.NUCLEO_MINIMO_FILAS:,} filas\n")
+
+    maquina = platform.node()
+    resultados = {}
+    print(f"{'caso':<40} {'escenarios':>12} {'tiempo':>12} {'escenarios/s':>16}")
+    for nombre, n, funcion in casos(args.tamanos, args.procesos):
+        if args.filtro not in nombre:
+            continue
+        segundos = medir(funcion)
+        resultados[nombre] = {"escenarios": n, "segundos": segundos, "escenarios_por_segundo": n / segundos}
+        print(f"{nombre:<40} {n:>12,} {segundos * 1000:>10.3f}ms {n / segundos:>16,.0f}")
+
+    if not args.sin_importtime:
+        print(f"\n{'arranque en frío':<40} {'módulos':>12} {'tiempo':>12}   más lentos")
+        resultados.update(medir_arranque(args.filtro))
+
+    historial = cargar_historial(args.historial)
+    regresiones = buscar_regresiones(resultados, historial, maquina, args.umbral, lote.NUCLEO)
+
+    if not args.sin_guardar:
+        corrida = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "maquina": maquina,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "nucleo": bool(lote.NUCLEO),
+            "resultados": resultados,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.historial)), exist_ok=True)
+        with open(args.historial, "a") as f:
+            f.write(json.dumps(corrida) + "\n")
+
+    if regresiones:
+        print(f"\n❌ {len(regresiones)} regresión(es) mayores a {args.umbral:.0%}:")
+        for nombre, actual, mejor in regresiones:
+            print(f"   {nombre}: {actual:,.0f}/s contra {mejor:,.0f}/s ({actual / mejor - 1:+.0%})")
+        return 1
+    print("\n✅ Sin regresiones")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
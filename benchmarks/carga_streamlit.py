@@ -0,0 +1,166 @@
+"""Prueba de carga de Simulador_Pro_v8.py con sesiones concurrentes
+
+Cada usuario simulado es una sesión de streamlit.testing (AppTest) dentro
+del mismo proceso, igual que las sesiones reales comparten un servidor:
+abre la app, activa la licencia en la barra lateral y recorre las tres
+pestañas (pensión base, Modalidad 40, comparativa y mejor plan) varias
+veces. Para cada nivel de concurrencia se reportan p50/p95/p99 de la
+latencia por rerun y la memoria; el último nivel con p95 por debajo del
+límite es la capacidad estimada de un proceso.
+
+AppTest usa un runtime global, así que los reruns se ejecutan de uno en
+uno detrás de un candado. Eso equivale a un proceso de Streamlit limitado
+por el GIL: la latencia medida de cada usuario incluye la espera en la
+cola más el tiempo del propio rerun.
+
+Uso:
+    python benchmarks/carga_streamlit.py
+    python benchmarks/carga_streamlit.py --usuarios 1 10 25 50 --iteraciones 3 --pausa 0.5 --salida carga.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from streamlit.testing.v1 import AppTest
+
+SCRIPT = RAIZ / "Simulador_Pro_v8.py"
+CODIGO_DEMO = "DEMO-CLIENTE"
+USUARIOS = (1, 5, 10, 25)
+LIMITE_P95 = 1.0
+PAUSA = 0.1
+
+# El runtime de AppTest es global: un rerun a la vez (como el GIL de un proceso)
+_candado_runtime = threading.Lock()
+
+# Botones de cada recorrido por las pestañas
+RECORRIDO = (
+    ("base", "btn1"),
+    ("mod40", "btn2"),
+    ("comparativa", "btn3"),
+    ("mejor_plan", "btn_opt3"),
+)
+
+def _rerun(at, latencias, paso):
+    inicio = time.perf_counter()
+    with _candado_runtime:
+        at.run()
+    latencias.append((paso, time.perf_counter() - inicio))
+    if at.exception:
+        raise RuntimeError(f"Excepción en el paso {paso}: {at.exception[0].value}")
+
+def sesion(script, iteraciones, barrera=None, pausa=0.0):
+    """Una sesión completa; devuelve [(paso, segundos), ...]
+
+    `pausa` es el tiempo que el asesor tarda entre clics (s).
+    """
+    latencias = []
+    at = AppTest.from_file(str(script), default_timeout=120)
+    if barrera is not None:
+        barrera.wait()
+
+    _rerun(at, latencias, "inicio")
+    at.sidebar.text_input[0].input(CODIGO_DEMO)
+    at.sidebar.button[0].click()
+    _rerun(at, latencias, "licencia")
+
+    for _ in range(iteraciones):
+        for paso, boton in RECORRIDO:
+            time.sleep(pausa)
+            at.button(key=boton).click()
+            _rerun(at, latencias, paso)
+    return latencias
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def memoria_sesion(script, iteraciones):
+    """Pico de memoria Python (MB) de una sesión aislada, con tracemalloc"""
+    tracemalloc.start()
+    try:
+        sesion(script, iteraciones)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+def nivel(script, usuarios, iteraciones, pausa):
+    """Corre `usuarios` sesiones a la vez y resume sus latencias"""
+    barrera = threading.Barrier(usuarios)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=usuarios) as pool:
+        sesiones = list(pool.map(lambda _: sesion(script, iteraciones, barrera, pausa), range(usuarios)))
+    total = time.perf_counter() - inicio
+
+    todas = [s for lat in sesiones for _, s in lat]
+    por_paso = {}
+    for lat in sesiones:
+        for paso, s in lat:
+            por_paso.setdefault(paso, []).append(s)
+    return {
+        "usuarios": usuarios,
+        "reruns": len(todas),
+        "reruns_por_segundo": len(todas) / total,
+        "p50": percentil(todas, 50),
+        "p95": percentil(todas, 95),
+        "p99": percentil(todas, 99),
+        "max": max(todas),
+        "p95_por_paso": {paso: percentil(v, 95) for paso, v in por_paso.items()},
+        "mediana_por_paso": {paso: statistics.median(v) for paso, v in por_paso.items()},
+        # ru_maxrss está en KB en Linux
+        "rss_max_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la app Streamlit con sesiones concurrentes")
+    parser.add_argument("--script", default=str(SCRIPT), help="app a probar")
+    parser.add_argument("--usuarios", type=int, nargs="+", default=list(USUARIOS), help="niveles de concurrencia")
+    parser.add_argument("--iteraciones", type=int, default=2, help="recorridos de las pestañas por sesión")
+    parser.add_argument("--pausa", type=float, default=PAUSA, help="segundos entre clics de cada usuario")
+    parser.add_argument("--limite-p95", type=float, default=LIMITE_P95, help="p95 aceptable por rerun (s)")
+    parser.add_argument("--salida", help="guardar el resumen en este archivo JSON")
+    args = parser.parse_args(argv)
+
+    script = Path(args.script).resolve()
+    salida = Path(args.salida).resolve() if args.salida else None
+    # La app escribe su registro de licencias en el directorio actual: usar uno temporal
+    os.chdir(tempfile.mkdtemp(prefix="carga_simulador_"))
+
+    # Calentamiento: importaciones y primera activación de la licencia
+    sesion(script, 1)
+    mb_sesion = memoria_sesion(script, args.iteraciones)
+    print(f"Memoria pico por sesión (aislada): {mb_sesion:.1f} MB\n")
+
+    print(f"{'usuarios':>8} {'reruns':>7} {'reruns/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'RSS MB':>8}")
+    niveles = []
+    for usuarios in args.usuarios:
+        r = nivel(script, usuarios, args.iteraciones, args.pausa)
+        niveles.append(r)
+        print(f"{usuarios:>8} {r['reruns']:>7} {r['reruns_por_segundo']:>9.1f} {r['p50']:>7.3f}s "
+              f"{r['p95']:>7.3f}s {r['p99']:>7.3f}s {r['max']:>7.3f}s {r['rss_max_mb']:>8.0f}")
+
+    capacidad = max((r["usuarios"] for r in niveles if r["p95"] <= args.limite_p95), default=0)
+    lento = max(niveles[-1]["p95_por_paso"].items(), key=lambda kv: kv[1])
+    print(f"\nCapacidad estimada con p95 ≤ {args.limite_p95}s: {capacidad} usuarios concurrentes")
+    print(f"Paso más lento con {niveles[-1]['usuarios']} usuarios: {lento[0]} (p95 {lento[1]:.3f}s)")
+
+    if salida:
+        with open(salida, "w") as f:
+            json.dump({"memoria_sesion_mb": mb_sesion, "limite_p95": args.limite_p95, "pausa": args.pausa,
+                       "capacidad": capacidad, "niveles": niveles}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
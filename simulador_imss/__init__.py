@@ -0,0 +1,20 @@
+"""Simulador de pensión IMSS Ley 73 - motor de cálculo importable
+
+Este paquete no depende de Streamlit, pandas ni plotly. Las funciones
+vectorizadas (NumPy) se cargan solo cuando se piden.
+"""
+
+from .motor import FACTOR_POR_EDAD, TOPE_SALARIO_M40, calcular_pension, calcular_mod40
+from .parametros import REGLAS, VERSION_DEFECTO, Reglas, obtener_reglas
+
+_LOTE = ("calcular_pension_lote", "calcular_mod40_lote")
+
+def __getattr__(nombre):
+    # Carga diferida: importar el paquete no debe importar NumPy
+    if nombre in _LOTE:
+        from . import lote
+        return getattr(lote, nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+__all__ = ["FACTOR_POR_EDAD", "TOPE_SALARIO_M40", "calcular_pension", "calcular_mod40",
+           "REGLAS", "VERSION_DEFECTO", "Reglas", "obtener_reglas", *_LOTE]
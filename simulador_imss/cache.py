@@ -0,0 +1,130 @@
+"""Caché en memoria (LRU) de los resultados del motor
+
+Una sola caché por proceso, compartida por todas las sesiones de Streamlit
+del mismo servidor. La comparativa completa también se busca en la caché
+en disco (persistente.py), compartida con los demás procesos y reinicios,
+antes de calcularla. Una pensión o un M40 sueltos se quedan solo en
+memoria: calcularlos cuesta menos que leerlos de SQLite. Se usa igual que
+el motor:
+
+    from simulador_imss.cache import calcular_pension, calcular_mod40, comparativa, CACHE
+    CACHE.estadisticas()  # {'aciertos': ..., 'fallos': ..., ...}
+"""
+
+import threading
+from collections import OrderedDict
+
+from . import motor, persistente
+from .parametros import obtener_reglas
+
+MAXIMO_ENTRADAS = 10_000
+
+class CacheLRU:
+    """Diccionario acotado con desalojo LRU y contadores de aciertos/fallos"""
+
+    def __init__(self, maximo=MAXIMO_ENTRADAS):
+        if maximo <= 0:
+            raise ValueError("maximo debe ser mayor que cero")
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener(self, clave, calcular):
+        """Devuelve el valor de `clave`; si no existe lo calcula con calcular() y lo guarda"""
+        with self._candado:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+
+        # Se calcula fuera del candado para no bloquear otras sesiones
+        valor = calcular()
+
+        with self._candado:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+        return valor
+
+    def descartar(self, clave):
+        with self._candado:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._candado:
+            self._datos.clear()
+            self.aciertos = self.fallos = self.desalojos = 0
+
+    def estadisticas(self):
+        with self._candado:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+                'entradas': len(self._datos),
+                'maximo': self.maximo,
+            }
+
+    def __len__(self):
+        return len(self._datos)
+
+CACHE = CacheLRU()
+
+# ============================================
+# MOTOR CON CACHÉ
+# ============================================
+
+def calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa=True, reglas=None):
+    reglas = obtener_reglas(reglas)
+    clave = ('pension', semanas, salario, edad_actual, edad_retiro, bool(esposa), reglas.version)
+    base = CACHE.obtener(clave, lambda: motor.calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa,
+                                                               reglas))
+    # Copia para que quien llama no altere lo guardado
+    return dict(base)
+
+def calcular_mod40(semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa=True,
+                   reglas=None, año_inicio=None, base=None, promedio_m40=None):
+    """`base` es el calcular_pension de las mismas entradas si ya se tiene; si no, se pide a la caché
+
+    `promedio_m40` es el de motor.calcular_mod40 (p. ej. de un historial).
+    """
+    reglas = obtener_reglas(reglas)
+    clave = ('mod40', semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, bool(esposa),
+             reglas.version, año_inicio, promedio_m40)
+
+    def calcular():
+        pension = base or calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa, reglas)
+        return motor.calcular_mod40(semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa,
+                                    base=pension, reglas=reglas, año_inicio=año_inicio, promedio_m40=promedio_m40)
+
+    return dict(CACHE.obtener(clave, calcular))
+
+def comparativa(semanas, salario, edad_actual, edad_retiro, salario_m40, meses_lista, esposa=True, reglas=None,
+                año_inicio=None, base=None, promedios_m40=None):
+    """[{'meses': m, **calcular_mod40(..., m, ...)} por cada m de meses_lista], guardada como un solo resultado
+
+    `base` como en calcular_mod40; `promedios_m40` trae un promedio_m40 por
+    cada elemento de meses_lista.
+    """
+    reglas = obtener_reglas(reglas)
+    meses_lista = tuple(meses_lista)
+    promedios_m40 = (None,) * len(meses_lista) if promedios_m40 is None else tuple(promedios_m40)
+    clave = ('comparativa', semanas, salario, edad_actual, edad_retiro, salario_m40, meses_lista, bool(esposa),
+             reglas.version, año_inicio, promedios_m40)
+
+    def calcular():
+        return [{'meses': meses, **calcular_mod40(semanas, salario, edad_actual, edad_retiro, salario_m40, meses,
+                                                  esposa, reglas, año_inicio, base, promedio)}
+                for meses, promedio in zip(meses_lista, promedios_m40)]
+
+    # En disco la clave lleva las reglas completas: versión y huella de su contenido
+    filas = CACHE.obtener(clave, lambda: persistente.obtener((*clave, reglas), calcular))
+    return [dict(fila) for fila in filas]
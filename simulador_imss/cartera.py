@@ -0,0 +1,159 @@
+"""Cartera de clientes de un asesor: todos calculados de una vez, con filtros, orden y páginas
+
+Los resultados se quedan como columnas numéricas (el formato de pesos y
+porcentajes es solo de presentación), así que filtrar, ordenar y agrupar
+son operaciones vectorizadas sobre la cartera completa y a la interfaz solo
+llega la página visible.
+
+    cartera = calcular_cartera(leer_cartera("clientes.csv"), meses_m40=24)
+    vista = filtrar(cartera, rangos={'edad_actual': (50, 58)}, texto="garcía")
+    pagina, paginas = pagina_ordenada(vista, 'roi', ascendente=False, numero=1)
+    resumen(vista), resumen_por(vista, 'edad_retiro')
+
+Columnas requeridas: semanas, salario, edad_actual, edad_retiro. Opcionales:
+cliente (nombre o clave), esposa, salario_m40 (por defecto el tope),
+meses_m40, reglas y año_inicio_m40, como en procesar.py.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .lote import calcular_mod40_lote
+from .parametros import obtener_reglas
+
+COLUMNAS_REQUERIDAS = ("semanas", "salario", "edad_actual", "edad_retiro")
+COLUMNAS_RESULTADO = ("base", "con_m40", "incremento", "inversion", "recuperacion_meses", "utilidad_20", "roi",
+                      "nuevo_promedio")
+
+MESES_M40 = 24
+TAMANO_PAGINA = 50
+
+# Valores aceptados en la columna esposa (en minúsculas); vacío = True
+ESPOSA_SI = ("true", "1", "1.0", "si", "sí", "s", "yes", "y", "verdadero", "v")
+ESPOSA_NO = ("false", "0", "0.0", "no", "n", "falso", "f")
+
+# ============================================
+# LECTURA Y CÁLCULO
+# ============================================
+
+def leer_cartera(archivo, nombre=None):
+    """DataFrame de un CSV o Parquet (ruta o archivo abierto; `nombre` da la extensión)"""
+    nombre = str(nombre or archivo)
+    if nombre.lower().endswith(".parquet"):
+        return pd.read_parquet(archivo)
+    return pd.read_csv(archivo)
+
+def _esposa(serie):
+    """Columna esposa como bool; astype(bool) leería "false", "no" o "0" como True"""
+    if serie.dtype == bool:
+        return serie
+    texto = serie.astype(str).str.strip().str.lower()
+    vacio = serie.isna() | (texto == "")
+    si, no = texto.isin(ESPOSA_SI), texto.isin(ESPOSA_NO)
+    invalidos = ~(vacio | si | no)
+    if invalidos.any():
+        ejemplos = ", ".join(repr(v) for v in serie[invalidos].unique()[:3])
+        raise ValueError(f"Valores no válidos en la columna esposa ({invalidos.sum()} filas): {ejemplos}")
+    return si | vacio
+
+def calcular_cartera(clientes, salario_m40=None, meses_m40=MESES_M40, reglas=None):
+    """Cartera con las columnas de calcular_mod40_lote agregadas, todo en tipos numéricos
+
+    `salario_m40` y `meses_m40` se usan para los clientes que no traen su
+    propio plan en el archivo. `reglas` aplica si el archivo no trae esa columna.
+    """
+    faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in clientes]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+    if "reglas" not in clientes:
+        clientes = clientes.assign(reglas=obtener_reglas(reglas).version)
+    tope = clientes["reglas"].map({v: obtener_reglas(v).tope_salario for v in clientes["reglas"].unique()})
+    cartera = pd.DataFrame({
+        "cliente": clientes["cliente"].astype(str) if "cliente" in clientes else np.arange(1, len(clientes) + 1),
+        **{c: pd.to_numeric(clientes[c], errors="coerce").astype(np.float64) for c in COLUMNAS_REQUERIDAS},
+        "esposa": _esposa(clientes["esposa"]) if "esposa" in clientes else True,
+        "salario_m40": pd.to_numeric(clientes["salario_m40"], errors="coerce").fillna(tope)
+                       if "salario_m40" in clientes else (tope if salario_m40 is None else float(salario_m40)),
+        "meses_m40": pd.to_numeric(clientes["meses_m40"], errors="coerce").fillna(meses_m40)
+                     if "meses_m40" in clientes else float(meses_m40),
+        "reglas": clientes["reglas"].astype("category"),
+    }, index=pd.RangeIndex(len(clientes)))
+    if "año_inicio_m40" in clientes:
+        cartera["año_inicio_m40"] = pd.to_numeric(clientes["año_inicio_m40"], errors="coerce")
+
+    datos = {c: cartera[c].to_numpy() for c in cartera if c not in ("cliente", "reglas")}
+    datos["reglas"] = cartera["reglas"].to_numpy(dtype=object)
+    resultado = calcular_mod40_lote(datos)
+    for campo in COLUMNAS_RESULTADO:
+        cartera[campo] = resultado[campo]
+    return cartera
+
+# ============================================
+# FILTROS, ORDEN Y PÁGINAS
+# ============================================
+
+def filtrar(cartera, rangos=None, texto=None, valores=None):
+    """Filas que cumplen todos los filtros; sin filtros devuelve la misma cartera
+
+    `rangos` es {columna: (mínimo, máximo)} con None para no acotar,
+    `valores` es {columna: [permitidos]} y `texto` se busca en la columna
+    cliente sin distinguir mayúsculas.
+    """
+    mascara = np.ones(len(cartera), dtype=bool)
+    for columna, (minimo, maximo) in (rangos or {}).items():
+        serie = cartera[columna].to_numpy()
+        if minimo is not None:
+            mascara &= serie >= minimo
+        if maximo is not None:
+            mascara &= serie <= maximo
+    for columna, permitidos in (valores or {}).items():
+        mascara &= cartera[columna].isin(permitidos).to_numpy()
+    if texto:
+        mascara &= cartera["cliente"].astype(str).str.contains(texto, case=False, regex=False).to_numpy()
+    if mascara.all():
+        return cartera
+    return cartera[mascara]
+
+def pagina_ordenada(cartera, columna=None, ascendente=True, numero=1, tamano=TAMANO_PAGINA):
+    """(página `numero` de la cartera ordenada por `columna`, total de páginas); los vacíos van al final"""
+    paginas = max(1, -(-len(cartera) // tamano))
+    numero = min(max(1, int(numero)), paginas)
+    inicio = (numero - 1) * tamano
+    if columna is None:
+        return cartera.iloc[inicio:inicio + tamano], paginas
+    valores = cartera[columna].to_numpy()
+    if valores.dtype.kind in "fiub":
+        clave = valores.astype(np.float64)
+        if not ascendente:
+            clave = -clave
+        # argsort manda los NaN al final en ambos sentidos
+        orden = np.argsort(clave, kind="stable")
+    else:
+        orden = np.argsort(valores.astype(str), kind="stable")
+        if not ascendente:
+            orden = orden[::-1]
+    return cartera.iloc[orden[inicio:inicio + tamano]], paginas
+
+# ============================================
+# RESÚMENES
+# ============================================
+
+def resumen(cartera):
+    """Totales de la cartera: clientes, inversión total, ROI mediano, pensión media con M40 e incremento total"""
+    return {
+        'clientes': len(cartera),
+        'inversion_total': float(cartera["inversion"].sum()),
+        'roi_mediana': float(cartera["roi"].median()) if len(cartera) else float("nan"),
+        'con_m40_media': float(cartera["con_m40"].mean()) if len(cartera) else float("nan"),
+        'incremento_total': float(cartera["incremento"].sum()),
+    }
+
+def resumen_por(cartera, columna):
+    """Los mismos totales por cada valor de `columna`, en una sola agrupación vectorizada"""
+    return (cartera.groupby(columna, observed=True, sort=True)
+            .agg(clientes=("cliente", "size"),
+                 inversion_total=("inversion", "sum"),
+                 roi_mediana=("roi", "median"),
+                 con_m40_media=("con_m40", "mean"),
+                 incremento_total=("incremento", "sum"))
+            .reset_index())
@@ -0,0 +1,171 @@
+"""Escenario compartido con recálculo incremental
+
+Un solo juego de entradas para todo el simulador y un grafo de cálculo:
+cada resultado declara de qué entradas o resultados depende. Al cambiar una
+entrada solo se descartan los resultados que dependen de ella (directa o
+indirectamente), y se recalculan cuando alguien los pide.
+
+    esc = Escenario(semanas=1315, salario=965.25, edad_actual=55, edad_retiro=60)
+    esc.valor('mod40')
+    esc.actualizar(meses_m40=24)   # descarta 'mod40' y 'flujo'; 'base' sigue calculada
+    esc.valor('mod40')             # reutiliza la base
+
+'mod40' y 'comparativa' reciben el valor de 'base', así que las tres
+pestañas comparten una sola pensión base. Los nodos calculan con las
+cachés de cache.py: otra sesión, otro proceso del servidor o el mismo
+servidor tras reiniciar no repiten el cálculo de las mismas entradas. Los
+resultados se comparten, no se copian: no deben modificarse.
+"""
+
+from collections import Counter
+
+from . import cache
+from .parametros import obtener_reglas
+
+MESES_COMPARATIVA = (6, 12, 18, 24, 30, 36, 42, 48)
+
+# Entradas y su valor por defecto; None en los parámetros de M40 y del flujo es el de las reglas / de flujos.py
+ENTRADAS = {
+    'semanas': 1315,
+    'salario': 965.25,
+    'edad_actual': 55,
+    'edad_retiro': 60,
+    'esposa': True,
+    'reglas': None,
+    'salario_m40': None,
+    'meses_m40': 6,
+    'año_inicio_m40': None,
+    # Historial de historial.py (un cliente): da el promedio exacto al terminar M40 en vez del ponderado
+    'historial': None,
+    'meses_comparativa': MESES_COMPARATIVA,
+    'inflacion': None,
+    'tasa_descuento': None,
+    'esperanza_vida': None,
+}
+
+# ============================================
+# NODOS DEL GRAFO
+# ============================================
+
+def _salario_m40(e):
+    return obtener_reglas(e['reglas']).tope_salario if e['salario_m40'] is None else e['salario_m40']
+
+def _promedio_m40(e, meses):
+    if e['historial'] is None:
+        return None
+    return float(e['historial'].promedio_m40(_salario_m40(e), meses, e['reglas'])[0])
+
+def _base(e):
+    return cache.calcular_pension(e['semanas'], e['salario'], e['edad_actual'], e['edad_retiro'], e['esposa'],
+                                  reglas=e['reglas'])
+
+def _mod40_meses(e, meses):
+    # La pensión base del nodo 'base': no se vuelve a pedir a la caché
+    return cache.calcular_mod40(e['semanas'], e['salario'], e['edad_actual'], e['edad_retiro'], _salario_m40(e),
+                                meses, e['esposa'], reglas=e['reglas'], año_inicio=e['año_inicio_m40'],
+                                base=e['base'], promedio_m40=_promedio_m40(e, meses))
+
+def _mod40(e):
+    return _mod40_meses(e, e['meses_m40'])
+
+def _comparativa(e):
+    # Una sola entrada en las cachés (y en disco) para toda la tabla
+    return cache.comparativa(e['semanas'], e['salario'], e['edad_actual'], e['edad_retiro'], _salario_m40(e),
+                             e['meses_comparativa'], e['esposa'], reglas=e['reglas'], año_inicio=e['año_inicio_m40'],
+                             base=e['base'], promedios_m40=[_promedio_m40(e, m) for m in e['meses_comparativa']])
+
+def _flujo(e):
+    # NumPy solo si se pide el flujo descontado
+    from .flujos import evaluar_mod40
+    opciones = {k: e[k] for k in ('inflacion', 'tasa_descuento', 'esperanza_vida') if e[k] is not None}
+    return evaluar_mod40(e['semanas'], e['salario'], e['edad_actual'], e['edad_retiro'], _salario_m40(e),
+                         e['meses_m40'], e['esposa'], reglas=e['reglas'], año_inicio=e['año_inicio_m40'],
+                         promedio_m40=_promedio_m40(e, e['meses_m40']), **opciones)
+
+# nodo: (dependencias directas, función)
+NODOS = {
+    'base': (('semanas', 'salario', 'edad_actual', 'edad_retiro', 'esposa', 'reglas'), _base),
+    'mod40': (('base', 'salario_m40', 'meses_m40', 'año_inicio_m40', 'historial'), _mod40),
+    'comparativa': (('base', 'salario_m40', 'año_inicio_m40', 'historial', 'meses_comparativa'), _comparativa),
+    'flujo': (('mod40', 'inflacion', 'tasa_descuento', 'esperanza_vida'), _flujo),
+}
+
+def _alcance(nodo):
+    """Todo lo que un nodo puede leer: sus dependencias y las de ellas"""
+    alcance = set()
+    for dep in NODOS[nodo][0]:
+        alcance.add(dep)
+        if dep in NODOS:
+            alcance |= _alcance(dep)
+    return frozenset(alcance)
+
+_ALCANCE = {nodo: _alcance(nodo) for nodo in NODOS}
+
+# Entrada -> nodos que hay que descartar cuando cambia
+_AFECTADOS = {entrada: frozenset(n for n, alcance in _ALCANCE.items() if entrada in alcance) for entrada in ENTRADAS}
+
+# ============================================
+# ESCENARIO
+# ============================================
+
+class _Lector:
+    """Vista de un escenario para la función de un nodo: solo deja leer lo declarado"""
+
+    def __init__(self, escenario, nodo):
+        self._escenario = escenario
+        self._nodo = nodo
+
+    def __getitem__(self, nombre):
+        if nombre not in _ALCANCE[self._nodo]:
+            raise KeyError(f"El nodo {self._nodo!r} lee {nombre!r} sin declararlo como dependencia")
+        return self._escenario[nombre]
+
+class Escenario:
+    """Entradas compartidas más los resultados ya calculados que siguen vigentes"""
+
+    def __init__(self, **entradas):
+        self._entradas = dict(ENTRADAS, reglas=obtener_reglas(None).version)
+        self._valores = {}
+        # Veces que se calculó cada nodo
+        self.calculos = Counter()
+        self.actualizar(**entradas)
+
+    def actualizar(self, **entradas):
+        """Cambia entradas; devuelve el conjunto de resultados descartados"""
+        descartados = set()
+        for nombre, valor in entradas.items():
+            if nombre not in ENTRADAS:
+                raise TypeError(f"Entrada desconocida: {nombre!r}")
+            if nombre == 'reglas':
+                valor = obtener_reglas(valor).version
+            elif nombre == 'meses_comparativa':
+                valor = tuple(valor)
+            if self._entradas[nombre] == valor:
+                continue
+            self._entradas[nombre] = valor
+            for nodo in _AFECTADOS[nombre]:
+                if self._valores.pop(nodo, None) is not None:
+                    descartados.add(nodo)
+        return descartados
+
+    def valor(self, nodo):
+        """Resultado de un nodo; solo se calcula si alguna dependencia cambió"""
+        if nodo not in self._valores:
+            if nodo not in NODOS:
+                raise KeyError(f"Nodo desconocido: {nodo!r} (hay {', '.join(NODOS)})")
+            self._valores[nodo] = NODOS[nodo][1](_Lector(self, nodo))
+            self.calculos[nodo] += 1
+        return self._valores[nodo]
+
+    def vigente(self, nodo):
+        """True si el nodo ya está calculado con las entradas actuales"""
+        return nodo in self._valores
+
+    @property
+    def entradas(self):
+        return dict(self._entradas)
+
+    def __getitem__(self, nombre):
+        if nombre in self._entradas:
+            return self._entradas[nombre]
+        return self.valor(nombre)
@@ -0,0 +1,202 @@
+"""Flujo de efectivo mensual de Modalidad 40: VPN, TIR y recuperación descontada
+
+Cada escenario es una fila de flujos mensuales desde hoy (mes 0):
+- aportaciones M40 (negativas) durante meses_m40, a la tasa del año de
+  cada mes según las reglas; su suma es la `inversion` de calcular_mod40
+- cobro del incremento de pensión (positivo) desde el retiro hasta la
+  esperanza de vida, indexado cada año con la inflación
+
+Todo es matricial (escenarios × meses). La TIR se resuelve para todos los
+escenarios a la vez con Newton acotado por bisección: la secuencia es
+negativa y luego positiva, así que el VPN es monótono en la tasa y la raíz
+es única.
+"""
+
+import numpy as np
+
+from .lote import calcular_mod40_lote, costo_m40_lote, _columna
+from .parametros import obtener_reglas
+
+INFLACION = 0.04
+TASA_DESCUENTO = 0.08
+ESPERANZA_VIDA = 80
+
+# Escenarios por paso (la matriz de flujos es escenarios × meses)
+ESCENARIOS_POR_PASO = 2_000
+
+# Búsqueda de la TIR mensual
+TIR_MINIMA = -0.5
+TIR_MAXIMA = 1.0
+TOLERANCIA_TIR = 1e-12
+ITERACIONES_TIR = 100
+
+# ============================================
+# FLUJOS
+# ============================================
+
+def flujos_mod40(datos=None, *, semanas=None, salario=None, edad_actual=None, edad_retiro=None,
+                 salario_m40=None, meses_m40=None, esposa=True, inflacion=INFLACION,
+                 esperanza_vida=ESPERANZA_VIDA, reglas=None, año_inicio=None, promedio_m40=None):
+    """Matriz de flujos mensuales (escenarios × meses) y el resultado de calcular_mod40_lote
+
+    Devuelve 'flujos' más 'inicio_pension' (mes del primer cobro), las
+    sumas nominales 'aportado' y 'cobrado' y los campos de
+    calcular_mod40_lote, todos como columnas. `promedio_m40` es el de
+    calcular_mod40_lote (NaN o None = ponderado).
+    """
+    columnas = [
+        _columna(datos, "semanas", semanas),
+        _columna(datos, "salario", salario),
+        _columna(datos, "edad_actual", edad_actual),
+        _columna(datos, "edad_retiro", edad_retiro),
+        _columna(datos, "salario_m40", salario_m40),
+        _columna(datos, "meses_m40", meses_m40),
+        _columna(datos, "esposa", esposa),
+        _columna(datos, "inflacion", inflacion),
+        _columna(datos, "esperanza_vida", esperanza_vida),
+        _columna(datos, "promedio_m40", np.nan if promedio_m40 is None else promedio_m40),
+    ]
+    (semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa, inflacion, esperanza_vida,
+     promedio_m40) = (np.ravel(c) for c in np.broadcast_arrays(*columnas))
+    res = calcular_mod40_lote(semanas=semanas, salario=salario, edad_actual=edad_actual, edad_retiro=edad_retiro,
+                              salario_m40=salario_m40, meses_m40=meses_m40, esposa=esposa,
+                              reglas=reglas, año_inicio=año_inicio, promedio_m40=promedio_m40)
+
+    # La pensión empieza al retiro, o al terminar de aportar si eso es después
+    meses_retiro = np.round(np.maximum(0, edad_retiro - edad_actual) * 12)
+    inicio_pension = np.maximum(meses_retiro, np.ceil(meses_m40))
+    fin = np.maximum(inicio_pension, np.round((esperanza_vida - edad_actual) * 12))
+    horizonte = int(fin.max()) if fin.size else 0
+    t = np.arange(horizonte, dtype=np.float64)
+
+    # Costo del mes t = costo acumulado hasta t+1 menos hasta t (acepta meses fraccionarios)
+    m = meses_m40[:, None]
+    costo = costo_m40_lote(np.minimum(t + 1, m), reglas, año_inicio) - costo_m40_lote(np.minimum(t, m), reglas, año_inicio)
+    aportaciones = salario_m40[:, None] * costo
+
+    cobra = (t >= inicio_pension[:, None]) & (t < fin[:, None])
+    indexacion = (1 + inflacion[:, None]) ** np.floor(t / 12)
+    cobros = np.where(cobra, res['incremento'][:, None] * indexacion, 0.0)
+
+    return {'flujos': cobros - aportaciones, 'inicio_pension': inicio_pension,
+            'aportado': aportaciones.sum(axis=1), 'cobrado': cobros.sum(axis=1), **res}
+
+# ============================================
+# INDICADORES
+# ============================================
+
+def _mensual(tasa_anual):
+    return (1 + np.asarray(tasa_anual, dtype=np.float64)) ** (1 / 12) - 1
+
+def vpn(flujos, tasa_anual):
+    """Valor presente (mes 0) de cada fila de flujos mensuales a una tasa anual"""
+    flujos = np.atleast_2d(flujos)
+    t = np.arange(flujos.shape[1])
+    descuento = (1 + _mensual(tasa_anual)).reshape(-1, 1) ** -t
+    return (flujos * descuento).sum(axis=1)
+
+def tir(flujos):
+    """TIR anual de cada fila de flujos mensuales; NaN si no hay cambio de signo
+
+    Newton con respaldo de bisección sobre la tasa mensual, para todas las
+    filas a la vez.
+    """
+    flujos = np.atleast_2d(np.asarray(flujos, dtype=np.float64))
+    n = flujos.shape[0]
+    t = np.arange(flujos.shape[1], dtype=np.float64)
+
+    def valor_y_derivada(r, filas):
+        v = (1 + r)[:, None] ** -t
+        f = flujos[filas]
+        return (f * v).sum(axis=1), (-t * f * v / (1 + r)[:, None]).sum(axis=1)
+
+    todas = np.arange(n)
+    bajo = np.full(n, TIR_MINIMA)
+    alto = np.full(n, TIR_MAXIMA)
+    with np.errstate(over="ignore", invalid="ignore"):
+        f_bajo, _ = valor_y_derivada(bajo, todas)
+        f_alto, _ = valor_y_derivada(alto, todas)
+        # Con aportaciones primero y cobros después, VPN(bajo) > 0 > VPN(alto)
+        valida = (f_bajo > 0) & (f_alto < 0)
+
+        r = np.where(valida, 0.01, np.nan)
+        activas = np.flatnonzero(valida)
+        for _ in range(ITERACIONES_TIR):
+            if not activas.size:
+                break
+            actual = r[activas]
+            f, df = valor_y_derivada(actual, activas)
+            # Mantener el intervalo [bajo, alto] que contiene la raíz
+            positivo = f > 0
+            bajo[activas] = np.where(positivo, actual, bajo[activas])
+            alto[activas] = np.where(positivo, alto[activas], actual)
+            paso = actual - f / df
+            fuera = ~np.isfinite(paso) | (paso <= bajo[activas]) | (paso >= alto[activas])
+            nuevo = np.where(fuera, (bajo[activas] + alto[activas]) / 2, paso)
+            r[activas] = nuevo
+            activas = activas[np.abs(nuevo - actual) > TOLERANCIA_TIR * (1 + np.abs(nuevo))]
+    return (1 + r) ** 12 - 1
+
+def recuperacion_descontada(flujos, tasa_anual):
+    """Primer mes en que el flujo descontado acumulado deja de ser negativo (NaN si nunca)"""
+    flujos = np.atleast_2d(flujos)
+    t = np.arange(flujos.shape[1])
+    acumulado = np.cumsum(flujos * (1 + _mensual(tasa_anual)).reshape(-1, 1) ** -t, axis=1)
+    # Solo después de haber aportado algo: el mes 0 sin aportaciones no cuenta como recuperado
+    invertido = np.cumsum(flujos < 0, axis=1) > 0
+    recuperado = (acumulado >= 0) & invertido
+    mes = recuperado.argmax(axis=1).astype(np.float64)
+    return np.where(recuperado.any(axis=1), mes, np.nan)
+
+# ============================================
+# EVALUACIÓN
+# ============================================
+
+def evaluar_mod40_lote(datos=None, *, semanas=None, salario=None, edad_actual=None, edad_retiro=None,
+                       salario_m40=None, meses_m40=None, esposa=True, inflacion=INFLACION,
+                       tasa_descuento=TASA_DESCUENTO, esperanza_vida=ESPERANZA_VIDA, reglas=None, año_inicio=None,
+                       promedio_m40=None):
+    """VPN, TIR y recuperación descontada para cada escenario, junto con los campos de calcular_mod40
+
+    'vpn' está en pesos de hoy a `tasa_descuento` anual; 'tir' es anual;
+    'recuperacion_descontada_meses' cuenta desde hoy. 'aportado' y
+    'cobrado' son las sumas nominales de aportaciones y cobros.
+    """
+    columnas = [
+        _columna(datos, "semanas", semanas),
+        _columna(datos, "salario", salario),
+        _columna(datos, "edad_actual", edad_actual),
+        _columna(datos, "edad_retiro", edad_retiro),
+        _columna(datos, "salario_m40", salario_m40),
+        _columna(datos, "meses_m40", meses_m40),
+        _columna(datos, "esposa", esposa),
+        _columna(datos, "inflacion", inflacion),
+        _columna(datos, "tasa_descuento", tasa_descuento),
+        _columna(datos, "esperanza_vida", esperanza_vida),
+        _columna(datos, "promedio_m40", np.nan if promedio_m40 is None else promedio_m40),
+    ]
+    columnas = [np.ravel(c) for c in np.broadcast_arrays(*columnas)]
+    reglas = obtener_reglas(reglas)
+
+    pasos = []
+    for i in range(0, len(columnas[0]), ESCENARIOS_POR_PASO):
+        s, sal, ea, er, sm, mm, esp, inf, tasa, vida, prom = (c[i:i + ESCENARIOS_POR_PASO] for c in columnas)
+        proyeccion = flujos_mod40(semanas=s, salario=sal, edad_actual=ea, edad_retiro=er, salario_m40=sm,
+                                  meses_m40=mm, esposa=esp, inflacion=inf, esperanza_vida=vida,
+                                  reglas=reglas, año_inicio=año_inicio, promedio_m40=prom)
+        flujos = proyeccion.pop('flujos')
+        proyeccion.update({
+            'vpn': vpn(flujos, tasa),
+            'tir': tir(flujos),
+            'recuperacion_descontada_meses': recuperacion_descontada(flujos, tasa),
+        })
+        pasos.append(proyeccion)
+    if not pasos:
+        return {}
+    return {k: np.concatenate([p[k] for p in pasos]) for k in pasos[0]}
+
+def evaluar_mod40(semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa=True, **opciones):
+    """evaluar_mod40_lote para un solo escenario, como dict de floats"""
+    res = evaluar_mod40_lote(semanas=semanas, salario=salario, edad_actual=edad_actual, edad_retiro=edad_retiro,
+                             salario_m40=salario_m40, meses_m40=meses_m40, esposa=esposa, **opciones)
+    return {k: v[0].item() for k, v in res.items()}
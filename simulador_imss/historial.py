@@ -0,0 +1,332 @@
+"""Promedio exacto de las últimas 250 semanas a partir del historial de cotización
+
+El historial es semana por semana (el reporte de semanas cotizadas del
+IMSS), con huecos y cambios de salario. Para cada cliente se guarda el
+salario de cada semana de calendario (0 = no cotizó) y la suma acumulada de
+las semanas cotizadas, así que el promedio de las últimas 250 semanas
+cotizadas antes de cualquier fecha, con o sin las semanas de M40 al final,
+sale de dos consultas: O(1) por fecha de inicio.
+
+    h = leer_historial("semanas.csv")           # uno o varios clientes
+    h.promedio()                                 # promedio actual de cada cliente
+    b = h.barrido_m40(salario_m40=2932.75, meses_m40=24)   # todas las fechas de inicio
+    calcular_mod40_lote(..., promedio_m40=b['promedio_con_m40'])
+
+Formatos de CSV (columna opcional 'cliente' para varios clientes):
+    semana, salario                   una fila por semana; salario 0 o vacío = sin cotizar
+    fecha_alta, fecha_baja, salario   un periodo por fila (movimientos afiliatorios)
+
+Uso:
+    python -m simulador_imss.historial semanas.csv resumen.csv --salario-m40 2932.75 --meses 24
+    python -m simulador_imss.historial semanas.csv barrido.csv --meses 24 --todas
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from .parametros import obtener_reglas
+
+# Semanas numeradas desde el lunes 1970-01-05 (el 1970-01-01 fue jueves)
+_LUNES = 4
+
+CLIENTES_POR_BLOQUE = 500
+# Filas del CSV por lectura en historiales_por_bloque
+FILAS_POR_LECTURA = 1_000_000
+
+def numero_semana(fechas):
+    """Número de semana (lunes a domingo) de una fecha o arreglo de fechas"""
+    fechas = np.asarray(fechas, dtype="datetime64[D]")
+    if np.isnat(fechas).any():
+        # NaT sería el mínimo de int64: un rango de calendario imposible
+        raise ValueError("Hay fechas vacías o inválidas en el historial")
+    return (fechas.astype(np.int64) - _LUNES) // 7
+
+def fecha_semana(numeros):
+    """Lunes de cada número de semana"""
+    return (np.asarray(numeros, dtype=np.int64) * 7 + _LUNES).astype("datetime64[D]")
+
+# ============================================
+# HISTORIAL
+# ============================================
+
+class Historial:
+    """Historial semanal de uno o varios clientes, precompilado para promedios O(1)
+
+    `semana` son fechas (o números de semana si `en_numeros`), `salario` el
+    salario diario de cada semana y `cliente` el identificador de cada fila
+    (None = un solo cliente). Si una semana aparece dos veces (dos patrones)
+    se toma el salario mayor.
+    """
+
+    def __init__(self, semana, salario, cliente=None, en_numeros=False):
+        semana = np.asarray(semana) if en_numeros else numero_semana(semana)
+        semana = semana.astype(np.int64)
+        salario = np.nan_to_num(np.asarray(salario, dtype=np.float64), nan=0.0)
+        if cliente is None:
+            cliente = np.zeros(len(semana), dtype=np.int64)
+        self.clientes, grupo = np.unique(np.asarray(cliente), return_inverse=True)
+        n_clientes = len(self.clientes)
+
+        # Rango de calendario de cada cliente: de su primera a su última semana
+        self.primera = np.full(n_clientes, np.iinfo(np.int64).max)
+        ultima = np.full(n_clientes, np.iinfo(np.int64).min)
+        np.minimum.at(self.primera, grupo, semana)
+        np.maximum.at(ultima, grupo, semana)
+        largo = ultima - self.primera + 1
+        # Semanas de calendario de todos los clientes, uno tras otro
+        self.inicio = np.concatenate(([0], np.cumsum(largo)))
+        self.salarios = np.zeros(self.inicio[-1])
+        np.maximum.at(self.salarios, self.inicio[grupo] + semana - self.primera[grupo], salario)
+
+        cotizada = self.salarios > 0
+        # cotizadas_antes[p]: semanas cotizadas antes de la posición de calendario p
+        self.cotizadas_antes = np.concatenate(([0], np.cumsum(cotizada)))
+        # acumulado[k]: suma de los primeros k salarios cotizados (todos los clientes en orden)
+        self.acumulado = np.concatenate(([0.0], np.cumsum(self.salarios[cotizada])))
+
+    def __len__(self):
+        return len(self.clientes)
+
+    @property
+    def semanas_cotizadas(self):
+        return np.diff(self.cotizadas_antes[self.inicio])
+
+    def _suma_ultimas(self, k, j):
+        """Suma de las últimas j semanas cotizadas antes del índice k; j fraccionario toma parte de una semana"""
+        x = k - j
+        f = np.floor(x).astype(np.intp)
+        siguiente = np.minimum(f + 1, len(self.acumulado) - 1)
+        return self.acumulado[k] - (self.acumulado[f] + (x - f) * (self.acumulado[siguiente] - self.acumulado[f]))
+
+    def _coeficientes(self, k, disponibles, semanas_m40, r):
+        """Sin M40 y (ordenada, pendiente) del promedio con M40 = ordenada + pendiente * salario_m40"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            previas = np.minimum(r.semanas_promedio, disponibles)
+            sin_m40 = self._suma_ultimas(k, previas) / previas
+
+            m = np.minimum(semanas_m40, r.semanas_promedio)
+            previas = np.minimum(r.semanas_promedio - m, disponibles)
+            ordenada = self._suma_ultimas(k, previas) / (m + previas)
+            pendiente = m / (m + previas)
+        # Menos de los meses mínimos de M40 no cambian el promedio (igual que calcular_mod40)
+        corto = semanas_m40 < r.meses_minimos_m40 * 52 / 12
+        return sin_m40, np.where(corto, sin_m40, ordenada), np.where(corto, 0.0, pendiente)
+
+    def _promedios(self, posicion, cliente, salario_m40, semanas_m40, reglas):
+        """Promedio sin y con M40 si M40 empieza en la posición de calendario `posicion`"""
+        k = self.cotizadas_antes[posicion]
+        disponibles = k - self.cotizadas_antes[self.inicio[cliente]]
+        sin_m40, ordenada, pendiente = self._coeficientes(k, disponibles, semanas_m40, obtener_reglas(reglas))
+        return sin_m40, ordenada + pendiente * salario_m40
+
+    def promedio(self, reglas=None):
+        """Promedio actual de las últimas 250 semanas cotizadas de cada cliente"""
+        cliente = np.arange(len(self))
+        return self._promedios(self.inicio[1:], cliente, 0.0, 0.0, reglas)[0]
+
+    def promedio_m40(self, salario_m40, meses_m40, reglas=None):
+        """Promedio de cada cliente si M40 empieza después de su última semana"""
+        cliente = np.arange(len(self))
+        semanas_m40 = np.asarray(meses_m40, dtype=np.float64) / 12 * 52
+        return self._promedios(self.inicio[1:], cliente, np.asarray(salario_m40, dtype=np.float64),
+                               semanas_m40, reglas)[1]
+
+    def coeficientes_m40(self, meses_m40, reglas=None):
+        """(ordenada, pendiente) de promedio_m40 = ordenada + pendiente * salario_m40, por cliente y meses
+
+        Matrices (clientes × meses_m40) con M40 después de la última semana,
+        los mismos números que usa promedio_m40: con ellas el optimizador, la
+        búsqueda inversa y la rejilla de sensibilidad despejan o barren el
+        salario M40 sin volver al historial.
+        """
+        r = obtener_reglas(reglas)
+        semanas_m40 = np.atleast_1d(np.asarray(meses_m40, dtype=np.float64)) / 12 * 52
+        k = self.cotizadas_antes[self.inicio[1:]][:, None]
+        disponibles = k - self.cotizadas_antes[self.inicio[:-1]][:, None]
+        _, ordenada, pendiente = self._coeficientes(k, disponibles, semanas_m40, r)
+        return np.broadcast_to(ordenada, pendiente.shape), pendiente
+
+    def barrido_m40(self, salario_m40=None, meses_m40=None, reglas=None):
+        """Promedios para cada fecha de inicio posible de M40, de todos los clientes
+
+        Una fila por (cliente, semana de inicio), de la primera semana del
+        historial a la siguiente de la última; empezar M40 en una semana deja
+        fuera del promedio lo cotizado desde esa semana. `salario_m40` (por
+        defecto el tope) y `meses_m40` aceptan un valor por cliente.
+        """
+        r = obtener_reglas(reglas)
+        n = len(self)
+        filas = np.diff(self.inicio) + 1
+        cliente = np.repeat(np.arange(n), filas)
+        desplazamiento = np.arange(filas.sum()) - np.repeat(np.cumsum(filas) - filas, filas)
+        posicion = self.inicio[cliente] + desplazamiento
+
+        salario_m40 = np.broadcast_to(np.asarray(r.tope_salario if salario_m40 is None else salario_m40,
+                                                 dtype=np.float64), (n,))[cliente]
+        semanas_m40 = np.broadcast_to(np.asarray(meses_m40, dtype=np.float64) / 12 * 52, (n,))[cliente]
+        sin_m40, con_m40 = self._promedios(posicion, cliente, salario_m40, semanas_m40, r)
+        return {
+            'cliente': self.clientes[cliente],
+            'inicio': fecha_semana(self.primera[cliente] + desplazamiento),
+            'semanas_previas': self.cotizadas_antes[posicion] - self.cotizadas_antes[self.inicio[cliente]],
+            'promedio_sin_m40': sin_m40,
+            'promedio_con_m40': con_m40,
+        }
+
+# ============================================
+# LECTURA
+# ============================================
+
+def _fechas(columna):
+    """Fechas ISO (2024-01-08) o como las da el IMSS (08/01/2024); ValueError con la fila si falta alguna"""
+    fechas = pd.to_datetime(columna, format="ISO8601", errors="coerce")
+    faltan = fechas.isna() & columna.notna()
+    if faltan.any():
+        fechas[faltan] = pd.to_datetime(columna[faltan], format="%d/%m/%Y", errors="coerce")
+    malas = fechas.isna().to_numpy()
+    if malas.any():
+        fila = columna.index[malas.argmax()]
+        valor = columna.iloc[malas.argmax()]
+        # Con el índice de read_csv la fila de datos i está en la línea i + 2 (después del encabezado)
+        donde = f"línea {fila + 2} del CSV" if isinstance(fila, (int, np.integer)) else f"fila {fila!r}"
+        raise ValueError(f"{columna.name} vacía o inválida en la {donde}"
+                         f"{'' if pd.isna(valor) else f': {valor!r}'} ({malas.sum()} filas así)")
+    return fechas.to_numpy().astype("datetime64[D]")
+
+def columnas_historial(df):
+    """(semana en números, salario, cliente) de un DataFrame semanal o por periodos"""
+    cliente = df["cliente"].to_numpy() if "cliente" in df else None
+    salario = pd.to_numeric(df["salario"], errors="coerce").to_numpy(dtype=np.float64)
+    if "semana" in df:
+        return numero_semana(_fechas(df["semana"])), salario, cliente
+    if "fecha_alta" in df and "fecha_baja" in df:
+        alta = numero_semana(_fechas(df["fecha_alta"]))
+        baja = numero_semana(_fechas(df["fecha_baja"]))
+        if (baja < alta).any():
+            raise ValueError("Hay periodos con fecha_baja anterior a fecha_alta")
+        # Un periodo se expande a todas sus semanas
+        semanas = baja - alta + 1
+        fila = np.repeat(np.arange(len(df)), semanas)
+        semana = alta[fila] + np.arange(semanas.sum()) - np.repeat(np.cumsum(semanas) - semanas, semanas)
+        return semana, salario[fila], None if cliente is None else cliente[fila]
+    raise ValueError("El historial necesita las columnas semana y salario, o fecha_alta, fecha_baja y salario")
+
+def leer_historial(ruta):
+    """Historial de un CSV (uno o varios clientes)"""
+    semana, salario, cliente = columnas_historial(pd.read_csv(ruta))
+    return Historial(semana, salario, cliente, en_numeros=True)
+
+def _inicios(ids):
+    """Fila donde empieza cada cliente de una columna con sus filas juntas"""
+    return np.concatenate(([0], np.flatnonzero(ids[1:] != ids[:-1]) + 1))
+
+def _registrar(cliente, vistos):
+    if cliente in vistos:
+        raise ValueError(f"Las filas del cliente {cliente!r} no vienen juntas: ordena el historial por cliente")
+    vistos.add(cliente)
+
+def _bloque(df):
+    semana, salario, cliente = columnas_historial(df)
+    return Historial(semana, salario, cliente, en_numeros=True)
+
+def historiales_por_bloque(ruta, clientes_por_bloque=CLIENTES_POR_BLOQUE, filas_por_lectura=FILAS_POR_LECTURA):
+    """Historiales de a lo más `clientes_por_bloque` clientes, leyendo el CSV por partes
+
+    En memoria solo hay una lectura de `filas_por_lectura` filas y el bloque
+    en curso (más los identificadores de cliente ya vistos), no el archivo.
+    Las filas de cada cliente deben venir juntas, como en el reporte del
+    IMSS; si un cliente reaparece más abajo es ValueError. Sin columna
+    cliente el archivo es un solo historial y se lee completo.
+    """
+    if "cliente" not in pd.read_csv(ruta, nrows=0).columns:
+        yield leer_historial(ruta)
+        return
+    vistos = set()
+    pendiente, registrados = None, 0   # clientes aún sin entregar; los primeros `registrados` ya se revisaron
+    for lectura in pd.read_csv(ruta, chunksize=filas_por_lectura):
+        if pendiente is not None:
+            # Sin reiniciar el índice: los errores citan la línea del archivo
+            lectura = pd.concat([pendiente, lectura])
+        ids = lectura["cliente"].to_numpy()
+        inicios = _inicios(ids)
+        # Los completos son todos menos el último, que puede seguir en la siguiente lectura
+        for cliente in ids[inicios[registrados:-1]].tolist():
+            _registrar(cliente, vistos)
+        registrados = len(inicios) - 1
+        while registrados >= clientes_por_bloque:
+            corte = inicios[clientes_por_bloque]
+            yield _bloque(lectura.iloc[:corte])
+            lectura = lectura.iloc[corte:]
+            inicios = inicios[clientes_por_bloque:] - corte
+            registrados -= clientes_por_bloque
+        pendiente = lectura
+    if pendiente is not None and len(pendiente):
+        _registrar(pendiente["cliente"].iloc[-1], vistos)
+        yield _bloque(pendiente)
+
+# ============================================
+# LÍNEA DE COMANDOS
+# ============================================
+
+def resumen(h, salario_m40=None, meses_m40=None, reglas=None):
+    """Por cliente: semanas cotizadas, promedio actual, promedio con M40 al final y la mejor fecha de inicio
+
+    La mejor fecha es la de mayor promedio con M40 entre las que ya llenan
+    las 250 semanas (o todo lo cotizado, si no alcanza): la mejor semana
+    para dejar de cotizar con patrón y pasar a M40.
+    """
+    r = obtener_reglas(reglas)
+    b = h.barrido_m40(salario_m40, meses_m40, r)
+    filas = np.diff(h.inicio) + 1
+    fin = np.cumsum(filas)
+    semanas_m40 = np.broadcast_to(np.asarray(meses_m40, dtype=np.float64) / 12 * 52, (len(h),))
+    necesarias = np.minimum(np.ceil(r.semanas_promedio - np.minimum(semanas_m40, r.semanas_promedio)),
+                            h.semanas_cotizadas)
+    valores = np.nan_to_num(b['promedio_con_m40'], nan=-np.inf)
+    valores[b['semanas_previas'] < np.repeat(necesarias, filas)] = -np.inf
+    mejor = np.array([a + np.argmax(valores[a:z]) for a, z in zip(fin - filas, fin)], dtype=np.intp)
+    return pd.DataFrame({
+        'cliente': h.clientes,
+        'semanas_cotizadas': h.semanas_cotizadas,
+        'promedio_250': h.promedio(reglas),
+        'promedio_con_m40': b['promedio_con_m40'][fin - 1],
+        'mejor_inicio': b['inicio'][mejor],
+        'mejor_promedio_con_m40': b['promedio_con_m40'][mejor],
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulador_imss.historial",
+                                     description="Promedio de 250 semanas y barrido de fechas de inicio de M40")
+    parser.add_argument("entrada", help="CSV del historial (semanal o por periodos)")
+    parser.add_argument("salida", help="CSV de salida")
+    parser.add_argument("--salario-m40", type=float, default=None, help="salario diario en M40 (por defecto el tope)")
+    parser.add_argument("--meses", type=float, default=24, help="meses en M40")
+    parser.add_argument("--reglas", default=None, help="versión de reglas")
+    parser.add_argument("--todas", action="store_true", help="una fila por cliente y fecha de inicio")
+    parser.add_argument("--bloque", type=int, default=CLIENTES_POR_BLOQUE, help="clientes por bloque")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    clientes = fechas = 0
+    try:
+        for i, h in enumerate(historiales_por_bloque(args.entrada, args.bloque)):
+            if args.todas:
+                tabla = pd.DataFrame(h.barrido_m40(args.salario_m40, args.meses, args.reglas))
+            else:
+                tabla = resumen(h, args.salario_m40, args.meses, args.reglas)
+            tabla.to_csv(args.salida, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            clientes += len(h)
+            fechas += h.inicio[-1] + len(h)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    segundos = time.perf_counter() - inicio
+    print(f"✅ {clientes:,} clientes, {fechas:,} fechas de inicio en {segundos:.1f} s → {args.salida}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
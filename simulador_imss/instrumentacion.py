@@ -0,0 +1,193 @@
+"""Medición opcional de tiempos por sección, exportable a Prometheus y JSON
+
+Desactivada por defecto: medir() devuelve entonces un contexto vacío
+compartido, así que dejar las mediciones en el código casi no cuesta.
+Se activa con la variable de entorno SIMULADOR_METRICAS=1 o con activar().
+
+    from simulador_imss.instrumentacion import medir
+    with medir("motor.mod40"):
+        res = calcular_mod40(...)
+
+Cada sección acumula un histograma con cubetas fijas (como los de
+Prometheus), la suma, el conteo y el máximo. prometheus() da el formato de
+texto de Prometheus e instantanea() un dict para JSON; con
+SIMULADOR_METRICAS_ARCHIVO=ruta.json ambos se escriben cada EXPORTAR_CADA
+segundos (ruta.json y ruta.prom).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+VARIABLE_ACTIVAR = "SIMULADOR_METRICAS"
+VARIABLE_ARCHIVO = "SIMULADOR_METRICAS_ARCHIVO"
+EXPORTAR_CADA = 15
+
+# Límites superiores de las cubetas (segundos); la última es +Inf
+CUBETAS = (0.00001, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+NOMBRE_METRICA = "simulador_seccion_segundos"
+
+ACTIVO = os.environ.get(VARIABLE_ACTIVAR, "") not in ("", "0")
+
+_NULO = nullcontext()
+
+# ============================================
+# HISTOGRAMAS
+# ============================================
+
+class Histograma:
+    """Tiempos de una sección: conteo por cubeta, suma y máximo"""
+
+    __slots__ = ("conteos", "suma", "total", "maximo")
+
+    def __init__(self):
+        self.conteos = [0] * len(CUBETAS)
+        self.suma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        i = 0
+        while segundos > CUBETAS[i]:
+            i += 1
+        self.conteos[i] += 1
+        self.suma += segundos
+        self.total += 1
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def cuantil(self, q):
+        """Cuantil estimado con interpolación lineal dentro de la cubeta (como histogram_quantile)"""
+        if not self.total:
+            return 0.0
+        objetivo = q * self.total
+        acumulado = 0
+        for i, conteo in enumerate(self.conteos):
+            if acumulado + conteo >= objetivo and conteo:
+                inferior = CUBETAS[i - 1] if i else 0.0
+                superior = min(CUBETAS[i], self.maximo)
+                return inferior + (superior - inferior) * (objetivo - acumulado) / conteo
+            acumulado += conteo
+        return self.maximo
+
+class _Medicion:
+    __slots__ = ("seccion", "inicio")
+
+    def __init__(self, seccion):
+        self.seccion = seccion
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        # También cuenta si la sección termina con excepción (p. ej. st.rerun)
+        registrar(self.seccion, time.perf_counter() - self.inicio)
+        return False
+
+_histogramas = {}
+_candado = threading.Lock()
+
+def medir(seccion):
+    """Contexto que mide la sección si la instrumentación está activa"""
+    if not ACTIVO:
+        return _NULO
+    return _Medicion(seccion)
+
+def registrar(seccion, segundos):
+    with _candado:
+        histograma = _histogramas.get(seccion)
+        if histograma is None:
+            histograma = _histogramas[seccion] = Histograma()
+        histograma.registrar(segundos)
+
+def activar(activo=True):
+    global ACTIVO
+    ACTIVO = bool(activo)
+    if ACTIVO:
+        iniciar_exportador()
+
+def reiniciar():
+    with _candado:
+        _histogramas.clear()
+
+# ============================================
+# EXPORTACIÓN
+# ============================================
+
+def instantanea():
+    """{sección: conteo, suma, promedio, p50, p95, p99, máximo y cubetas}, en segundos"""
+    with _candado:
+        secciones = {}
+        for seccion, h in sorted(_histogramas.items()):
+            secciones[seccion] = {
+                'conteo': h.total,
+                'suma': h.suma,
+                'promedio': h.suma / h.total,
+                'p50': h.cuantil(0.50),
+                'p95': h.cuantil(0.95),
+                'p99': h.cuantil(0.99),
+                'maximo': h.maximo,
+                'cubetas': {("+Inf" if l == float("inf") else repr(l)): c for l, c in zip(CUBETAS, h.conteos)},
+            }
+    return {'activo': ACTIVO, 'generado': time.time(), 'secciones': secciones}
+
+def mas_lentas(n=10, por="suma"):
+    """Las n secciones con mayor `por` (suma, p95, maximo, ...): [(sección, datos), ...]"""
+    secciones = instantanea()['secciones']
+    return sorted(secciones.items(), key=lambda s: s[1][por], reverse=True)[:n]
+
+def _etiqueta(texto):
+    return texto.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus():
+    """Histogramas en el formato de texto de Prometheus (versión 0.0.4)"""
+    lineas = [f"# HELP {NOMBRE_METRICA} Tiempo por sección del simulador.",
+              f"# TYPE {NOMBRE_METRICA} histogram"]
+    with _candado:
+        for seccion, h in sorted(_histogramas.items()):
+            s = _etiqueta(seccion)
+            acumulado = 0
+            for limite, conteo in zip(CUBETAS, h.conteos):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                lineas.append(f'{NOMBRE_METRICA}_bucket{{seccion="{s}",le="{le}"}} {acumulado}')
+            lineas.append(f'{NOMBRE_METRICA}_sum{{seccion="{s}"}} {h.suma!r}')
+            lineas.append(f'{NOMBRE_METRICA}_count{{seccion="{s}"}} {h.total}')
+    return "\n".join(lineas) + "\n"
+
+def exportar(ruta):
+    """Escribe ruta (JSON) y la misma ruta con .prom; reemplazo atómico para que nadie lea a medias"""
+    ruta = Path(ruta)
+    for destino, texto in ((ruta, json.dumps(instantanea(), indent=2)), (ruta.with_suffix(".prom"), prometheus())):
+        temporal = destino.with_name(destino.name + ".tmp")
+        temporal.write_text(texto, encoding="utf-8")
+        os.replace(temporal, destino)
+
+_exportador = None
+
+def iniciar_exportador(ruta=None, cada=EXPORTAR_CADA):
+    """Hilo que exporta cada `cada` segundos (ruta por defecto: SIMULADOR_METRICAS_ARCHIVO); uno por proceso"""
+    global _exportador
+    ruta = ruta or os.environ.get(VARIABLE_ARCHIVO)
+    if not ruta or _exportador is not None:
+        return _exportador
+
+    def ciclo():
+        while True:
+            time.sleep(cada)
+            try:
+                exportar(ruta)
+            except OSError:
+                pass
+
+    _exportador = threading.Thread(target=ciclo, name="exportador-metricas", daemon=True)
+    _exportador.start()
+    return _exportador
+
+if ACTIVO:
+    iniciar_exportador()
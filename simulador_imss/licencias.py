@@ -0,0 +1,169 @@
+"""Registro de máquinas por licencia en SQLite (WAL)
+
+Reemplaza licencias_activas.json: la búsqueda por código usa la llave
+primaria, el registro de una máquina nueva se revisa y se inserta dentro
+de una sola transacción (dos activaciones simultáneas ya no se pisan) y
+las lecturas se sirven de una caché en memoria que se invalida cuando
+este u otro proceso escribe.
+
+Si existe el licencias_activas.json anterior se importa la primera vez.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import threading
+from datetime import datetime
+
+ARCHIVO_BD = "licencias_activas.db"
+ARCHIVO_JSON = "licencias_activas.json"
+
+@functools.lru_cache(maxsize=None)
+def get_machine_id():
+    """Genera un identificador único para la máquina (se calcula una vez por proceso)"""
+    machine_info = f"{platform.node()}-{platform.processor()}-{os.name}"
+    return hashlib.md5(machine_info.encode()).hexdigest()[:10]
+
+class AlmacenLicencias:
+    """Máquinas autorizadas por código de licencia"""
+
+    def __init__(self, ruta=ARCHIVO_BD, migrar_desde=ARCHIVO_JSON):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._candado = threading.Lock()
+        self._cache = {}
+        self._generacion = 0
+
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS maquinas (
+                    codigo TEXT NOT NULL,
+                    machine_id TEXT NOT NULL,
+                    registrada TEXT NOT NULL,
+                    PRIMARY KEY (codigo, machine_id)
+                ) WITHOUT ROWID
+            """)
+        if migrar_desde and os.path.exists(migrar_desde):
+            self._migrar(migrar_desde)
+
+    def _conexion(self):
+        # sqlite3 no comparte conexiones entre hilos: una por hilo
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+            self._local.version = None
+        return conexion
+
+    def _validar_cache(self, conexion):
+        # data_version cambia cuando otra conexión (u otro proceso) confirma cambios
+        version = conexion.execute("PRAGMA data_version").fetchone()[0]
+        if self._local.version is not None and version != self._local.version:
+            self._invalidar()
+        self._local.version = version
+
+    def _invalidar(self):
+        with self._candado:
+            self._cache.clear()
+            self._generacion += 1
+
+    def _migrar(self, archivo):
+        """Importa el JSON anterior ({codigo: [machine_id, ...]}) sin duplicar"""
+        with open(archivo, "r") as f:
+            estado = json.load(f)
+        ahora = datetime.now().isoformat(timespec="seconds")
+        conexion = self._conexion()
+        with conexion:
+            conexion.executemany(
+                "INSERT OR IGNORE INTO maquinas (codigo, machine_id, registrada) VALUES (?, ?, ?)",
+                [(codigo, machine_id, ahora) for codigo, maquinas in estado.items() for machine_id in maquinas]
+            )
+        self._invalidar()
+
+    def maquinas(self, codigo):
+        """Máquinas registradas para un código (tupla, en orden de registro)"""
+        conexion = self._conexion()
+        self._validar_cache(conexion)
+        with self._candado:
+            if codigo in self._cache:
+                return self._cache[codigo]
+            generacion = self._generacion
+
+        maquinas = tuple(m for (m,) in conexion.execute(
+            "SELECT machine_id FROM maquinas WHERE codigo = ? ORDER BY registrada, machine_id", (codigo,)))
+
+        with self._candado:
+            # Si alguien escribió mientras leíamos, no guardar un valor viejo
+            if generacion == self._generacion:
+                self._cache[codigo] = maquinas
+        return maquinas
+
+    def registrar_maquina(self, codigo, machine_id, max_maquinas):
+        """Revisa y registra la máquina de forma atómica
+
+        Devuelve (autorizada, nueva, total): autorizada si ya estaba o si
+        había lugar; nueva si se registró en esta llamada.
+        """
+        maquinas = self.maquinas(codigo)
+        if machine_id in maquinas:
+            return True, False, len(maquinas)
+
+        conexion = self._conexion()
+        # BEGIN IMMEDIATE toma el candado de escritura antes de contar
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            existe = conexion.execute(
+                "SELECT 1 FROM maquinas WHERE codigo = ? AND machine_id = ?", (codigo, machine_id)).fetchone()
+            total = conexion.execute("SELECT COUNT(*) FROM maquinas WHERE codigo = ?", (codigo,)).fetchone()[0]
+            if existe:
+                resultado = (True, False, total)
+            elif total < max_maquinas:
+                conexion.execute(
+                    "INSERT INTO maquinas (codigo, machine_id, registrada) VALUES (?, ?, ?)",
+                    (codigo, machine_id, datetime.now().isoformat(timespec="seconds")))
+                resultado = (True, True, total + 1)
+            else:
+                resultado = (False, False, total)
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        if resultado[1]:
+            self._invalidar()
+        return resultado
+
+    def liberar_maquina(self, codigo, machine_id):
+        """Quita una máquina de un código; devuelve True si existía"""
+        conexion = self._conexion()
+        with conexion:
+            borradas = conexion.execute(
+                "DELETE FROM maquinas WHERE codigo = ? AND machine_id = ?", (codigo, machine_id)).rowcount
+        self._invalidar()
+        return borradas > 0
+
+    def exportar(self):
+        """Estado completo con el mismo formato que licencias_activas.json"""
+        estado = {}
+        for codigo, machine_id in self._conexion().execute(
+                "SELECT codigo, machine_id FROM maquinas ORDER BY registrada, codigo, machine_id"):
+            estado.setdefault(codigo, []).append(machine_id)
+        return estado
+
+    def total_codigos(self):
+        return self._conexion().execute("SELECT COUNT(DISTINCT codigo) FROM maquinas").fetchone()[0]
+
+_almacenes = {}
+_candado_almacenes = threading.Lock()
+
+def obtener_almacen(ruta=ARCHIVO_BD):
+    """Almacén compartido por todo el proceso para una ruta"""
+    with _candado_almacenes:
+        if ruta not in _almacenes:
+            _almacenes[ruta] = AlmacenLicencias(ruta)
+        return _almacenes[ruta]
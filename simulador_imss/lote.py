@@ -0,0 +1,285 @@
+"""Cálculo en lote (vectorizado con NumPy) equivalente al motor escalar"""
+
+import importlib.util
+import os
+import threading
+
+import numpy as np
+
+from .parametros import MESES_TABLA, REGLAS, obtener_reglas
+
+# ============================================
+# TABLAS PRECOMPILADAS
+# ============================================
+
+class _Tablas:
+    """Arreglos NumPy de una versión de reglas para consultas vectorizadas"""
+
+    def __init__(self, reglas):
+        self.reglas = reglas
+        edades = sorted(reglas.factor_por_edad)
+        self.edad_min = edades[0]
+        # Factor por edad indexado por (edad_retiro - edad_min)
+        self.factor_edad = np.array([reglas.factor_por_edad.get(e, reglas.factor_edad_otro)
+                                     for e in range(edades[0], edades[-1] + 1)])
+        self.limites_vsm = np.array(reglas.limites_vsm)
+        self.pct_cuantia = np.array(reglas.pct_cuantia)
+        self.pct_incremento = np.array(reglas.pct_incremento)
+        self.costo_mensual = np.array(reglas.costo_mensual)
+        self.costo_acumulado = np.array(reglas.costo_acumulado)
+
+# Todas las versiones se compilan una vez al importar
+_TABLAS = {version: _Tablas(r) for version, r in REGLAS.items()}
+
+def _tablas(reglas=None):
+    r = obtener_reglas(reglas)
+    tablas = _TABLAS.get(r.version)
+    if tablas is None or tablas.reglas is not r:
+        tablas = _Tablas(r)
+    return tablas
+
+# ============================================
+# NÚCLEO COMPILADO OPCIONAL (nucleo.py, requiere numba)
+# ============================================
+
+# Lotes desde este tamaño van al núcleo compilado; False lo desactiva en el proceso
+NUCLEO = importlib.util.find_spec("numba") is not None and os.environ.get("SIMULADOR_SIN_JIT", "") in ("", "0")
+NUCLEO_MINIMO_FILAS = 4_096
+
+def _nucleo():
+    """Módulo nucleo (se importa hasta que hace falta) o None si no está disponible o activo"""
+    global NUCLEO
+    if not NUCLEO:
+        return None
+    try:
+        from . import nucleo
+    except ImportError:
+        NUCLEO = False
+        return None
+    return nucleo
+
+def _calculo(columnas, numpy, compilado):
+    """La función de NumPy o, para lotes grandes con numba disponible, la del núcleo compilado"""
+    if NUCLEO and np.broadcast(*columnas).size >= NUCLEO_MINIMO_FILAS:
+        nucleo = _nucleo()
+        if nucleo is not None:
+            return getattr(nucleo, compilado)
+    return numpy
+
+def _precalentar():
+    nucleo = _nucleo()
+    if nucleo is not None:
+        nucleo.precalentar()
+
+def precalentar_nucleo(en_segundo_plano=True):
+    """Importa y carga (o compila) el núcleo para que el primer lote grande no espere
+
+    Devuelve el hilo que lo hace, o None si el núcleo no está activo; sin
+    `en_segundo_plano` espera a que termine.
+    """
+    if not NUCLEO:
+        return None
+    hilo = threading.Thread(target=_precalentar, name="precalentar-nucleo", daemon=True)
+    hilo.start()
+    if not en_segundo_plano:
+        hilo.join()
+    return hilo
+
+# ============================================
+# CÁLCULO EN LOTE (VECTORIZADO)
+# ============================================
+
+def _columna(datos, nombre, valor=None):
+    """Obtiene una columna como arreglo float64 (acepta dict de arreglos o DataFrame)"""
+    if datos is not None and nombre in datos:
+        valor = datos[nombre]
+    if valor is None:
+        raise KeyError(f"Falta la columna '{nombre}'")
+    return np.asarray(valor, dtype=np.float64)
+
+def _redondear(x, decimales):
+    """Redondeo idéntico a round() de Python, elemento por elemento"""
+    escala = 10.0 ** decimales
+    y = x * escala
+    entero = np.rint(y)
+    # Solo los casos a medio camino pueden diferir de round(); se resuelven en Python
+    cerca = np.abs(np.abs(y - entero) - 0.5) <= np.abs(y) * 1e-15
+    resultado = entero / escala
+    if cerca.any():
+        resultado[cerca] = [round(v, decimales) for v in x[cerca].tolist()]
+    return resultado
+
+def _factor_edad_lote(edad_retiro, t):
+    """Equivalente vectorizado de Reglas.factor_edad(edad_retiro)"""
+    indice = edad_retiro - t.edad_min
+    valido = (indice >= 0) & (indice < len(t.factor_edad)) & (indice == np.floor(indice))
+    return np.where(valido, t.factor_edad[np.where(valido, indice, 0).astype(np.intp)], t.reglas.factor_edad_otro)
+
+def _porcentajes_lote(salario, t):
+    """Equivalente vectorizado de Reglas.porcentajes(salario)"""
+    if len(t.limites_vsm) == 1:
+        return t.pct_cuantia[0], t.pct_incremento[0]
+    grupo = np.searchsorted(t.limites_vsm, salario / t.reglas.salario_minimo_vigente, side="left")
+    return t.pct_cuantia[grupo], t.pct_incremento[grupo]
+
+def _costo_m40_lote(meses, año_inicio, t):
+    """Equivalente vectorizado de Reglas.costo_m40: dos consultas a la tabla por fila"""
+    r = t.reglas
+    año_inicio = np.where(np.isnan(año_inicio), r.año_inicio_m40, año_inicio)
+    fila = np.clip(año_inicio - r.primer_año_m40, 0, len(t.costo_acumulado) - 1).astype(np.intp)
+    with np.errstate(invalid="ignore"):
+        k = np.clip(np.floor(meses), 0, MESES_TABLA).astype(np.intp)
+    costo = t.costo_acumulado[fila, k] + (meses - k) * t.costo_mensual[fila, np.minimum(k, MESES_TABLA - 1)]
+    return np.where(meses > 0, costo, 0.0)
+
+def costo_m40_lote(meses, reglas=None, año_inicio=None):
+    """Inversión por cada peso de salario diario M40 para un arreglo de meses"""
+    meses = np.asarray(meses, dtype=np.float64)
+    año_inicio = np.asarray(np.nan if año_inicio is None else año_inicio, dtype=np.float64)
+    meses, año_inicio = np.broadcast_arrays(meses, año_inicio)
+    return _costo_m40_lote(meses, año_inicio, _tablas(reglas))
+
+def _por_reglas(calcular, columnas, reglas):
+    """Llama calcular(columnas, tablas); si `reglas` es una columna, una vez por versión"""
+    versiones = np.asarray(reglas, dtype=object)
+    if versiones.ndim == 0:
+        return calcular(columnas, _tablas(versiones.item()))
+    *columnas, versiones = np.broadcast_arrays(*columnas, versiones)
+    if versiones.size == 0:
+        return calcular(columnas, _tablas())
+    resultado = {}
+    for version in set(versiones.ravel().tolist()):
+        filas = versiones == version
+        parte = calcular([c[filas] for c in columnas], _tablas(version))
+        for campo, valores in parte.items():
+            if campo not in resultado:
+                resultado[campo] = np.empty(versiones.shape, dtype=np.result_type(valores))
+            resultado[campo][filas] = valores
+    return resultado
+
+def calcular_pension_lote(datos=None, *, semanas=None, salario=None, edad_actual=None, edad_retiro=None, esposa=True,
+                          reglas=None):
+    """Versión vectorizada de calcular_pension: recibe arreglos (o un DataFrame) y devuelve columnas
+
+    `reglas` es una versión para todo el lote o una columna con la versión de cada fila.
+    """
+    if datos is not None and "reglas" in datos:
+        reglas = np.asarray(datos["reglas"], dtype=object)
+    columnas = [
+        _columna(datos, "semanas", semanas),
+        _columna(datos, "salario", salario),
+        _columna(datos, "edad_actual", edad_actual),
+        _columna(datos, "edad_retiro", edad_retiro),
+        _columna(datos, "esposa", esposa),
+    ]
+    return _por_reglas(_calculo(columnas, _pension_lote, "pension"), columnas, reglas)
+
+def _pension_lote(columnas, t):
+    semanas, salario, edad_actual, edad_retiro, esposa = np.broadcast_arrays(*columnas)
+    esposa = esposa.astype(bool)
+    r = t.reglas
+    
+    FACTOR_EDAD = _factor_edad_lote(edad_retiro, t)
+    PCT_CUANTIA, PCT_INCREMENTO = _porcentajes_lote(salario, t)
+    PCT_ESPOSA = np.where(esposa, r.pct_esposa, 0.0)
+    
+    años_para_retiro = np.maximum(0, edad_retiro - edad_actual)
+    semanas_60 = semanas + (52 * años_para_retiro)
+    
+    cuantia_basica_anual = salario * PCT_CUANTIA * 365
+    años_despues_500 = np.maximum(0, (semanas_60 - r.semanas_minimas) / 52)
+    incrementos_anuales = salario * PCT_INCREMENTO * 365 * años_despues_500
+    
+    cuantia_total_anual = cuantia_basica_anual + incrementos_anuales
+    total_con_asignacion = cuantia_total_anual + cuantia_total_anual * PCT_ESPOSA
+    cuantia_base_total = total_con_asignacion + total_con_asignacion * r.decreto_fox
+    
+    pension_anual = cuantia_base_total * FACTOR_EDAD
+    pension_mensual = pension_anual / 12
+    
+    return {
+        'mensual': _redondear(pension_mensual, 2),
+        'anual': _redondear(pension_anual, 2),
+        'semanas_60': _redondear(semanas_60, 0),
+        'factor_edad': FACTOR_EDAD
+    }
+
+def calcular_mod40_lote(datos=None, *, semanas=None, salario=None, edad_actual=None, edad_retiro=None,
+                        salario_m40=None, meses_m40=None, esposa=True, reglas=None, año_inicio=None,
+                        promedio_m40=None):
+    """Versión vectorizada de calcular_mod40: mismos campos que el dict, uno por columna
+
+    `reglas` es una versión para todo el lote o una columna con la versión
+    de cada fila; la columna opcional 'año_inicio_m40' elige las tasas y
+    'promedio_m40' da el promedio exacto al terminar M40 (NaN = ponderado).
+    """
+    if datos is not None and "reglas" in datos:
+        reglas = np.asarray(datos["reglas"], dtype=object)
+    columnas = [
+        _columna(datos, "semanas", semanas),
+        _columna(datos, "salario", salario),
+        _columna(datos, "edad_actual", edad_actual),
+        _columna(datos, "edad_retiro", edad_retiro),
+        _columna(datos, "salario_m40", salario_m40),
+        _columna(datos, "meses_m40", meses_m40),
+        _columna(datos, "esposa", esposa),
+        # NaN = año de inicio por defecto de la versión
+        _columna(datos, "año_inicio_m40", np.nan if año_inicio is None else año_inicio),
+        _columna(datos, "promedio_m40", np.nan if promedio_m40 is None else promedio_m40),
+    ]
+    return _por_reglas(_calculo(columnas, _mod40_lote, "mod40"), columnas, reglas)
+
+def _mod40_lote(columnas, t):
+    semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa, año_inicio, promedio_m40 = (
+        np.broadcast_arrays(*columnas))
+    esposa = esposa.astype(bool)
+    r = t.reglas
+    
+    años_para_retiro = np.maximum(0, edad_retiro - edad_actual)
+    
+    inversion = salario_m40 * _costo_m40_lote(meses_m40, año_inicio, t)
+    
+    semanas_m40 = (meses_m40 / 12) * 52
+    semanas_totales = semanas + (52 * años_para_retiro) + semanas_m40
+    
+    SEMANAS_PROMEDIO = r.semanas_promedio
+    semanas_ponderadas = np.minimum(semanas_m40, SEMANAS_PROMEDIO)
+    semanas_previas = SEMANAS_PROMEDIO - semanas_ponderadas
+    promedio_ponderado = np.where(
+        semanas_previas > 0,
+        ((salario * semanas_previas) + (salario_m40 * semanas_ponderadas)) / SEMANAS_PROMEDIO,
+        salario_m40
+    )
+    promedio_ponderado = np.where(np.isnan(promedio_m40), promedio_ponderado, promedio_m40)
+    nuevo_promedio = np.where(meses_m40 >= r.meses_minimos_m40, promedio_ponderado, salario)
+    
+    FACTOR_EDAD = _factor_edad_lote(edad_retiro, t)
+    PCT_CUANTIA, PCT_INCREMENTO = _porcentajes_lote(nuevo_promedio, t)
+    PCT_ESPOSA = np.where(esposa, r.pct_esposa, 0.0)
+    
+    años_despues_500 = np.maximum(0, (semanas_totales - r.semanas_minimas) / 52)
+    
+    pension_anual = (
+        ((nuevo_promedio * PCT_CUANTIA * 365) +
+         (nuevo_promedio * PCT_INCREMENTO * 365 * años_despues_500)) *
+        (1 + PCT_ESPOSA) * (1 + r.decreto_fox) * FACTOR_EDAD * r.ajuste_final_m40
+    )
+    
+    pension_mensual = pension_anual / 12
+    base = _pension_lote([semanas, salario, edad_actual, edad_retiro, esposa], t)
+    incremento = pension_mensual - base['mensual']
+    ganancia_20 = incremento * 12 * 20
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roi = np.where(inversion > 0, _redondear((ganancia_20 / inversion) * 100, 0), 0.0)
+    
+    return {
+        'base': base['mensual'],
+        'con_m40': _redondear(pension_mensual, 2),
+        'incremento': _redondear(incremento, 2),
+        'inversion': _redondear(inversion, 2),
+        'recuperacion_meses': _redondear(inversion / np.maximum(1, incremento), 1),
+        'utilidad_20': _redondear(ganancia_20 - inversion, 2),
+        'roi': roi,
+        'nuevo_promedio': _redondear(nuevo_promedio, 2)
+    }
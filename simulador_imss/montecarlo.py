@@ -0,0 +1,71 @@
+"""Proyección Monte Carlo de la pensión base con inflación y salario inciertos
+
+Cada trayectoria simula, año por año hasta el retiro:
+- inflación anual ~ Normal(inflacion, volatilidad_inflacion)
+- crecimiento real del salario ~ Normal(crecimiento_salario, volatilidad_salario)
+
+El salario nominal al retiro es salario * Π(1 + inflación)(1 + crecimiento),
+topado en 25 UMA, y la UMA se actualiza con la inflación. Todas las
+trayectorias pasan juntas por calcular_pension_lote. La pensión se reporta
+en pesos nominales del año de retiro y en pesos de hoy (real), que es la
+nominal dividida entre el índice de precios de su trayectoria.
+
+Con `semilla` el resultado es reproducible y se guarda en la caché en disco
+(persistente.py): la misma simulación no se repite en otro proceso.
+"""
+
+import numpy as np
+
+from . import persistente
+from .lote import calcular_pension_lote
+from .parametros import obtener_reglas
+
+TRAYECTORIAS = 50_000
+PERCENTILES = (10, 50, 90)
+
+def simular_pension(semanas, salario, edad_actual, edad_retiro, esposa=True,
+                    inflacion=0.04, volatilidad_inflacion=0.015,
+                    crecimiento_salario=0.0, volatilidad_salario=0.02,
+                    trayectorias=TRAYECTORIAS, semilla=None, tope_salario=None, reglas=None):
+    """Distribución de la pensión mensual; `semilla` hace el resultado reproducible
+
+    Devuelve 'real' y 'nominal' (un valor por trayectoria), sus percentiles
+    P10/P50/P90 en 'percentiles_real' / 'percentiles_nominal' y el índice
+    de precios de cada trayectoria en 'precios'. `tope_salario` por defecto
+    es el tope de 25 UMA de las reglas.
+    """
+    if trayectorias <= 0:
+        raise ValueError("trayectorias debe ser mayor que cero")
+    reglas = obtener_reglas(reglas)
+    if tope_salario is None:
+        tope_salario = reglas.tope_salario
+    argumentos = (semanas, salario, edad_actual, edad_retiro, esposa, inflacion, volatilidad_inflacion,
+                  crecimiento_salario, volatilidad_salario, trayectorias, semilla, tope_salario, reglas)
+    if semilla is None:
+        return _simular(*argumentos)
+    # La secuencia aleatoria de una semilla puede cambiar entre versiones de NumPy
+    return persistente.obtener(('montecarlo', np.__version__, *argumentos), lambda: _simular(*argumentos))
+
+def _simular(semanas, salario, edad_actual, edad_retiro, esposa, inflacion, volatilidad_inflacion,
+             crecimiento_salario, volatilidad_salario, trayectorias, semilla, tope_salario, reglas):
+    años = int(max(0, edad_retiro - edad_actual))
+    rng = np.random.default_rng(semilla)
+
+    tasas_inflacion = rng.normal(inflacion, volatilidad_inflacion, (trayectorias, años))
+    tasas_salario = rng.normal(crecimiento_salario, volatilidad_salario, (trayectorias, años))
+    precios = np.prod(1 + tasas_inflacion, axis=1)
+    salarios = np.prod((1 + tasas_inflacion) * (1 + tasas_salario), axis=1)
+
+    # El tope de 25 UMA sube con la inflación; el salario, con inflación y crecimiento real
+    salario_retiro = np.minimum(salario * salarios, tope_salario * precios)
+    nominal = calcular_pension_lote(semanas=semanas, salario=salario_retiro, edad_actual=edad_actual,
+                                    edad_retiro=edad_retiro, esposa=esposa, reglas=reglas)['mensual']
+    real = nominal / precios
+
+    return {
+        'real': real,
+        'nominal': nominal,
+        'precios': precios,
+        'percentiles_real': dict(zip(PERCENTILES, np.percentile(real, PERCENTILES).tolist())),
+        'percentiles_nominal': dict(zip(PERCENTILES, np.percentile(nominal, PERCENTILES).tolist())),
+    }
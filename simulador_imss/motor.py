@@ -0,0 +1,108 @@
+"""Motor de cálculo Ley 73 / Modalidad 40 (sin dependencias de interfaz)
+
+Los parámetros salen de simulador_imss/reglas; `reglas` elige la versión
+(nombre o Reglas) y None usa la versión por defecto.
+"""
+
+from .parametros import obtener_reglas
+
+# ============================================
+# FUNCIONES DE CÁLCULO
+# ============================================
+
+FACTOR_POR_EDAD = obtener_reglas().factor_por_edad
+
+# Tope de salario diario en Modalidad 40 (25 UMA)
+TOPE_SALARIO_M40 = obtener_reglas().tope_salario
+
+def calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa=True, reglas=None):
+    r = obtener_reglas(reglas)
+    FACTOR_EDAD = r.factor_edad(edad_retiro)
+    
+    PCT_CUANTIA, PCT_INCREMENTO = r.porcentajes(salario)
+    PCT_ESPOSA = r.pct_esposa if esposa else 0
+    DECRETO_FOX = r.decreto_fox
+    
+    años_para_retiro = max(0, edad_retiro - edad_actual)
+    semanas_60 = semanas + (52 * años_para_retiro)
+    
+    cuantia_basica_diaria = salario * PCT_CUANTIA
+    cuantia_basica_anual = cuantia_basica_diaria * 365
+    
+    incremento_diario = salario * PCT_INCREMENTO
+    años_despues_500 = max(0, (semanas_60 - r.semanas_minimas) / 52)
+    incrementos_anuales = incremento_diario * 365 * años_despues_500
+    
+    cuantia_total_anual = cuantia_basica_anual + incrementos_anuales
+    asignacion_anual = cuantia_total_anual * PCT_ESPOSA
+    total_con_asignacion = cuantia_total_anual + asignacion_anual
+    decreto_fox = total_con_asignacion * DECRETO_FOX
+    cuantia_base_total = total_con_asignacion + decreto_fox
+    
+    pension_anual = cuantia_base_total * FACTOR_EDAD
+    pension_mensual = pension_anual / 12
+    
+    return {
+        'mensual': round(pension_mensual, 2),
+        'anual': round(pension_anual, 2),
+        'semanas_60': round(semanas_60, 0),
+        'factor_edad': FACTOR_EDAD
+    }
+
+def calcular_mod40(semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa=True, base=None,
+                   reglas=None, año_inicio=None, promedio_m40=None):
+    """`base` acepta el resultado de calcular_pension ya calculado para no repetirlo
+
+    `año_inicio` es el año calendario en que empieza M40 (define las tasas).
+    `promedio_m40` es el promedio exacto de las últimas 250 semanas al terminar
+    M40 (p. ej. de historial.py); None lo estima ponderando salario y salario_m40.
+    """
+    r = obtener_reglas(reglas)
+    años_para_retiro = max(0, edad_retiro - edad_actual)
+    
+    # Costo acumulado precompilado por mes: sin ciclo por año
+    inversion = salario_m40 * r.costo_m40(meses_m40, año_inicio)
+    
+    semanas_m40 = (meses_m40 / 12) * 52
+    semanas_totales = semanas + (52 * años_para_retiro) + semanas_m40
+    
+    SEMANAS_PROMEDIO = r.semanas_promedio
+    if meses_m40 >= r.meses_minimos_m40 and promedio_m40 is not None:
+        nuevo_promedio = promedio_m40
+    elif meses_m40 >= r.meses_minimos_m40:
+        semanas_ponderadas = min(semanas_m40, SEMANAS_PROMEDIO)
+        semanas_previas = SEMANAS_PROMEDIO - semanas_ponderadas
+        nuevo_promedio = ((salario * semanas_previas) + (salario_m40 * semanas_ponderadas)) / SEMANAS_PROMEDIO if semanas_previas > 0 else salario_m40
+    else:
+        nuevo_promedio = salario
+    
+    FACTOR_EDAD = r.factor_edad(edad_retiro)
+    
+    PCT_CUANTIA, PCT_INCREMENTO = r.porcentajes(nuevo_promedio)
+    PCT_ESPOSA = r.pct_esposa if esposa else 0
+    DECRETO_FOX = r.decreto_fox
+    AJUSTE_FINAL = r.ajuste_final_m40
+    
+    años_despues_500 = max(0, (semanas_totales - r.semanas_minimas) / 52)
+    
+    pension_anual = (
+        ((nuevo_promedio * PCT_CUANTIA * 365) +
+         (nuevo_promedio * PCT_INCREMENTO * 365 * años_despues_500)) *
+        (1 + PCT_ESPOSA) * (1 + DECRETO_FOX) * FACTOR_EDAD * AJUSTE_FINAL
+    )
+    
+    pension_mensual = pension_anual / 12
+    if base is None:
+        base = calcular_pension(semanas, salario, edad_actual, edad_retiro, esposa, reglas=r)
+    incremento = pension_mensual - base['mensual']
+    
+    return {
+        'base': base['mensual'],
+        'con_m40': round(pension_mensual, 2),
+        'incremento': round(incremento, 2),
+        'inversion': round(inversion, 2),
+        'recuperacion_meses': round(inversion / max(1, incremento), 1),
+        'utilidad_20': round((incremento * 12 * 20) - inversion, 2),
+        'roi': round(((incremento * 12 * 20) / inversion) * 100, 0) if inversion > 0 else 0,
+        'nuevo_promedio': round(nuevo_promedio, 2)
+    }
@@ -0,0 +1,345 @@
+"""Núcleo compilado (numba) de calcular_pension_lote / calcular_mod40_lote
+
+Un solo ciclo por fila hace todo el cálculo: costo de M40 con la tabla
+precompilada, promedio ponderado de 250 semanas, grupo del Art. 167,
+pensión base y con M40, y el redondeo. No crea arreglos intermedios, solo
+las columnas de salida, y reparte las filas entre los núcleos (prange).
+
+Es opcional: lote.py lo usa solo para lotes grandes y solo si numba está
+instalado (SIMULADOR_SIN_JIT=1 lo desactiva); si no, el cálculo sigue en
+NumPy. Los resultados son idénticos: las filas con un redondeo a medio
+camino (donde round() de Python puede diferir) se recalculan con el camino
+de NumPy.
+
+El código compilado se guarda en disco (cache=True, en __pycache__ o en
+NUMBA_CACHE_DIR), así que solo el primer proceso compila;
+lote.precalentar_nucleo() lo carga o compila en un hilo al arrancar la app
+para que la primera consulta de una sesión no lo pague.
+
+    python -m simulador_imss.nucleo              # precalienta y verifica la paridad
+    python -m simulador_imss.nucleo --filas 1000000
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numba
+import numpy as np
+
+from .parametros import MESES_TABLA, REGLAS
+
+# TBB se queda colgado al salir si el primer cálculo paralelo corrió en otro hilo (como las sesiones de
+# Streamlit); OpenMP también admite llamadas desde varios hilos. NUMBA_THREADING_LAYER sigue mandando.
+if "NUMBA_THREADING_LAYER" not in os.environ:
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
+_compilar = numba.njit(cache=True, nogil=True)
+_compilar_paralelo = numba.njit(cache=True, nogil=True, parallel=True)
+
+# ============================================
+# FUNCIONES POR FILA
+# ============================================
+
+@_compilar
+def _redondear(x, escala, revisar, i):
+    """Como lote._redondear; los casos a medio camino marcan la fila para recalcularla"""
+    y = x * escala
+    entero = np.rint(y)
+    if abs(abs(y - entero) - 0.5) <= abs(y) * 1e-15:
+        revisar[i] = True
+    return entero / escala
+
+@_compilar
+def _valor(columna, i):
+    # Las columnas escalares llegan con un solo elemento
+    return columna[i] if columna.shape[0] > 1 else columna[0]
+
+@_compilar
+def _factor_edad(edad_retiro, factor_edad, edad_min, factor_otro):
+    indice = edad_retiro - edad_min
+    if indice >= 0 and indice < factor_edad.shape[0] and indice == np.floor(indice):
+        return factor_edad[int(indice)]
+    return factor_otro
+
+@_compilar
+def _grupo(salario, limites_vsm, salario_minimo):
+    if limites_vsm.shape[0] == 1:
+        return 0
+    grupo = np.searchsorted(limites_vsm, salario / salario_minimo)
+    return min(grupo, limites_vsm.shape[0] - 1)
+
+@_compilar
+def _pension_anual(semanas, salario, edad_actual, edad_retiro, esposa, factor, pct_cuantia, pct_incremento,
+                   limites_vsm, salario_minimo, semanas_minimas, pct_esposa, decreto_fox):
+    """(pensión anual, semanas_60) sin redondear, en el mismo orden de operaciones que lote._pension_lote"""
+    grupo = _grupo(salario, limites_vsm, salario_minimo)
+    años_para_retiro = max(0.0, edad_retiro - edad_actual)
+    semanas_60 = semanas + (52 * años_para_retiro)
+    cuantia_basica_anual = salario * pct_cuantia[grupo] * 365
+    años_despues_500 = max(0.0, (semanas_60 - semanas_minimas) / 52)
+    incrementos_anuales = salario * pct_incremento[grupo] * 365 * años_despues_500
+    cuantia_total_anual = cuantia_basica_anual + incrementos_anuales
+    total_con_asignacion = cuantia_total_anual + cuantia_total_anual * (pct_esposa if esposa else 0.0)
+    cuantia_base_total = total_con_asignacion + total_con_asignacion * decreto_fox
+    return cuantia_base_total * factor, semanas_60
+
+# ============================================
+# NÚCLEOS
+# ============================================
+
+@_compilar_paralelo
+def _nucleo_pension(n, semanas, salario, edad_actual, edad_retiro, esposa,
+                    factor_edad, edad_min, factor_otro, pct_cuantia, pct_incremento, limites_vsm, salario_minimo,
+                    semanas_minimas, pct_esposa, decreto_fox,
+                    mensual, anual, semanas_60, factor, revisar):
+    for i in numba.prange(n):
+        er = _valor(edad_retiro, i)
+        f = _factor_edad(er, factor_edad, edad_min, factor_otro)
+        a, s60 = _pension_anual(_valor(semanas, i), _valor(salario, i), _valor(edad_actual, i), er,
+                                _valor(esposa, i) != 0, f, pct_cuantia, pct_incremento, limites_vsm,
+                                salario_minimo, semanas_minimas, pct_esposa, decreto_fox)
+        mensual[i] = _redondear(a / 12, 100.0, revisar, i)
+        anual[i] = _redondear(a, 100.0, revisar, i)
+        semanas_60[i] = _redondear(s60, 1.0, revisar, i)
+        factor[i] = f
+
+@_compilar_paralelo
+def _nucleo_mod40(n, semanas, salario, edad_actual, edad_retiro, salario_m40, meses_m40, esposa, año_inicio,
+                  promedio_m40,
+                  factor_edad, edad_min, factor_otro, pct_cuantia, pct_incremento, limites_vsm, salario_minimo,
+                  semanas_minimas, semanas_promedio, pct_esposa, decreto_fox, ajuste_final, meses_minimos,
+                  costo_mensual, costo_acumulado, primer_año, año_defecto,
+                  base, con_m40, incremento, inversion, recuperacion, utilidad, roi, nuevo_promedio, revisar):
+    for i in numba.prange(n):
+        sem = _valor(semanas, i)
+        sal = _valor(salario, i)
+        ea = _valor(edad_actual, i)
+        er = _valor(edad_retiro, i)
+        s40 = _valor(salario_m40, i)
+        meses = _valor(meses_m40, i)
+        con_esposa = _valor(esposa, i) != 0
+
+        # Costo de M40: dos consultas a la tabla de la fila del año de inicio
+        costo = 0.0
+        if meses > 0:
+            año = _valor(año_inicio, i)
+            if np.isnan(año):
+                año = año_defecto
+            fila = int(min(max(año - primer_año, 0.0), costo_acumulado.shape[0] - 1))
+            k = int(min(max(np.floor(meses), 0.0), MESES_TABLA))
+            costo = costo_acumulado[fila, k] + (meses - k) * costo_mensual[fila, min(k, MESES_TABLA - 1)]
+        inv = s40 * costo
+
+        años_para_retiro = max(0.0, er - ea)
+        semanas_m40 = (meses / 12) * 52
+        semanas_totales = sem + (52 * años_para_retiro) + semanas_m40
+
+        ponderadas = min(semanas_m40, semanas_promedio)
+        previas = semanas_promedio - ponderadas
+        if previas > 0:
+            promedio = ((sal * previas) + (s40 * ponderadas)) / semanas_promedio
+        else:
+            promedio = s40
+        exacto = _valor(promedio_m40, i)
+        if not np.isnan(exacto):
+            promedio = exacto
+        nuevo = promedio if meses >= meses_minimos else sal
+
+        f = _factor_edad(er, factor_edad, edad_min, factor_otro)
+        grupo = _grupo(nuevo, limites_vsm, salario_minimo)
+        años_despues_500 = max(0.0, (semanas_totales - semanas_minimas) / 52)
+        pension_anual = (
+            ((nuevo * pct_cuantia[grupo] * 365) +
+             (nuevo * pct_incremento[grupo] * 365 * años_despues_500)) *
+            (1 + (pct_esposa if con_esposa else 0.0)) * (1 + decreto_fox) * f * ajuste_final
+        )
+        pension_mensual = pension_anual / 12
+
+        a, _ = _pension_anual(sem, sal, ea, er, con_esposa, f, pct_cuantia, pct_incremento, limites_vsm,
+                              salario_minimo, semanas_minimas, pct_esposa, decreto_fox)
+        b = _redondear(a / 12, 100.0, revisar, i)
+        inc = pension_mensual - b
+        ganancia_20 = inc * 12 * 20
+
+        base[i] = b
+        con_m40[i] = _redondear(pension_mensual, 100.0, revisar, i)
+        incremento[i] = _redondear(inc, 100.0, revisar, i)
+        inversion[i] = _redondear(inv, 100.0, revisar, i)
+        recuperacion[i] = _redondear(inv / max(1.0, inc), 10.0, revisar, i)
+        utilidad[i] = _redondear(ganancia_20 - inv, 100.0, revisar, i)
+        roi[i] = _redondear((ganancia_20 / inv) * 100, 1.0, revisar, i) if inv > 0 else 0.0
+        nuevo_promedio[i] = _redondear(nuevo, 100.0, revisar, i)
+
+# ============================================
+# INTERFAZ CON lote.py
+# ============================================
+
+def _solo_lectura(columna):
+    # Todas de solo lectura: numba compila una variante por combinación de banderas
+    vista = columna.view()
+    vista.flags.writeable = False
+    return vista
+
+def _columnas_planas(columnas):
+    """(forma, columnas 1-D): las escalares quedan de un elemento, las demás a la forma común"""
+    forma = np.broadcast_shapes(*(c.shape for c in columnas))
+    planas = [_solo_lectura(c.reshape(1) if c.size == 1 else
+                            np.ascontiguousarray(np.broadcast_to(c, forma)).reshape(-1))
+              for c in columnas]
+    return forma, planas
+
+def _recalcular(resultado, revisar, columnas, forma, calcular, t):
+    """Recalcula con NumPy las filas marcadas (redondeo a medio camino) para que coincidan con round()"""
+    if not revisar.any():
+        return resultado
+    filas = np.flatnonzero(revisar)
+    parte = calcular([np.broadcast_to(c, forma).reshape(-1)[filas] for c in columnas], t)
+    for campo, valores in parte.items():
+        resultado[campo].reshape(-1)[filas] = valores
+    return resultado
+
+def _tablas_nucleo(t):
+    r = t.reglas
+    return (t.factor_edad, float(t.edad_min), float(r.factor_edad_otro), t.pct_cuantia, t.pct_incremento,
+            t.limites_vsm, float(r.salario_minimo_vigente), float(r.semanas_minimas))
+
+def pension(columnas, t):
+    """Mismo contrato que lote._pension_lote(columnas, tablas)"""
+    from .lote import _pension_lote
+    r = t.reglas
+    forma, planas = _columnas_planas(columnas)
+    n = int(np.prod(forma))
+    salida = {campo: np.empty(forma) for campo in ('mensual', 'anual', 'semanas_60', 'factor_edad')}
+    revisar = np.zeros(n, dtype=np.bool_)
+    _nucleo_pension(n, *planas, *_tablas_nucleo(t), float(r.pct_esposa), float(r.decreto_fox),
+                    *(v.reshape(-1) for v in salida.values()), revisar)
+    return _recalcular(salida, revisar, columnas, forma, _pension_lote, t)
+
+def mod40(columnas, t):
+    """Mismo contrato que lote._mod40_lote(columnas, tablas)"""
+    from .lote import _mod40_lote
+    r = t.reglas
+    forma, planas = _columnas_planas(columnas)
+    n = int(np.prod(forma))
+    campos = ('base', 'con_m40', 'incremento', 'inversion', 'recuperacion_meses', 'utilidad_20', 'roi',
+              'nuevo_promedio')
+    salida = {campo: np.empty(forma) for campo in campos}
+    revisar = np.zeros(n, dtype=np.bool_)
+    _nucleo_mod40(n, *planas, *_tablas_nucleo(t), float(r.semanas_promedio), float(r.pct_esposa),
+                  float(r.decreto_fox), float(r.ajuste_final_m40), float(r.meses_minimos_m40),
+                  t.costo_mensual, t.costo_acumulado, float(r.primer_año_m40), float(r.año_inicio_m40),
+                  *(v.reshape(-1) for v in salida.values()), revisar)
+    return _recalcular(salida, revisar, columnas, forma, _mod40_lote, t)
+
+# ============================================
+# PRECALENTAMIENTO Y PARIDAD
+# ============================================
+
+_precalentado = threading.Event()
+_candado = threading.Lock()
+
+def precalentar():
+    """Carga (o compila la primera vez) el código de los núcleos; una sola vez por proceso"""
+    from .lote import _tablas
+    with _candado:
+        if _precalentado.is_set():
+            return
+        t = _tablas()
+        uno = np.ones(1)
+        pension([uno * 1315, uno * 965.25, uno * 55, uno * 60, uno], t)
+        mod40([uno * 1315, uno * 965.25, uno * 55, uno * 60, uno * 2932.75, uno * 24, uno, uno * np.nan,
+               uno * np.nan], t)
+        _precalentado.set()
+
+def escenarios_paridad(n, semilla=0):
+    """Escenarios aleatorios que cruzan los casos límite: grupos del Art. 167, meses cortos y fraccionarios,
+    edades fuera de la tabla, años de inicio fuera de la tabla y promedio exacto"""
+    rng = np.random.default_rng(semilla)
+    return {
+        "semanas": rng.integers(0, 2600, n).astype(np.float64),
+        "salario": np.round(rng.uniform(50, 3500, n), 2),
+        "edad_actual": rng.integers(40, 66, n).astype(np.float64),
+        "edad_retiro": rng.choice([59, 60, 61, 62, 63, 64, 65, 66, 60.5], n).astype(np.float64),
+        "salario_m40": np.round(rng.uniform(100, 3200, n), 2),
+        "meses_m40": np.where(rng.random(n) < 0.2, np.round(rng.uniform(0, 700, n), 1),
+                              rng.integers(0, 61, n)).astype(np.float64),
+        "esposa": rng.integers(0, 2, n).astype(np.float64),
+        "año_inicio_m40": rng.choice([np.nan, 2018, 2022, 2026, 2031, 2040], n),
+        "promedio_m40": np.where(rng.random(n) < 0.2, np.round(rng.uniform(100, 3200, n), 2), np.nan),
+    }
+
+def verificar_paridad(filas=20_000, escalares=500, semilla=0):
+    """Diferencias del núcleo contra lote (todas las filas) y contra motor.py (`escalares` filas), por versión
+
+    Devuelve una lista de (versión, función, campo, fila) que no coinciden; vacía si todo es idéntico.
+    """
+    from . import motor
+    from .lote import _mod40_lote, _pension_lote, _tablas
+
+    datos = escenarios_paridad(filas, semilla)
+    orden = ("semanas", "salario", "edad_actual", "edad_retiro", "salario_m40", "meses_m40", "esposa",
+             "año_inicio_m40", "promedio_m40")
+    columnas = [datos[c] for c in orden]
+    diferencias = []
+
+    def comparar(version, funcion, esperado, obtenido, filas):
+        for campo, valores in esperado.items():
+            distintas = ~((valores[filas] == obtenido[campo][filas])
+                          | (np.isnan(valores[filas]) & np.isnan(obtenido[campo][filas])))
+            diferencias.extend((version, funcion, campo, int(f)) for f in filas[distintas])
+
+    muestra = np.random.default_rng(semilla).choice(filas, min(escalares, filas), replace=False)
+    todas = np.arange(filas)
+    for version in REGLAS:
+        t = _tablas(version)
+        base = pension(columnas[:4] + [columnas[6]], t)
+        res = mod40(columnas, t)
+        comparar(version, "calcular_pension_lote", _pension_lote(columnas[:4] + [columnas[6]], t), base, todas)
+        comparar(version, "calcular_mod40_lote", _mod40_lote(columnas, t), res, todas)
+
+        escalar_base, escalar_m40 = {}, {}
+        for i in muestra.tolist():
+            fila = {c: datos[c][i].item() for c in orden}
+            año = None if np.isnan(fila["año_inicio_m40"]) else fila["año_inicio_m40"]
+            promedio = None if np.isnan(fila["promedio_m40"]) else fila["promedio_m40"]
+            argumentos = (fila["semanas"], fila["salario"], fila["edad_actual"], fila["edad_retiro"])
+            escalar_base[i] = motor.calcular_pension(*argumentos, bool(fila["esposa"]), reglas=version)
+            escalar_m40[i] = motor.calcular_mod40(*argumentos, fila["salario_m40"], fila["meses_m40"],
+                                                  bool(fila["esposa"]), reglas=version, año_inicio=año,
+                                                  promedio_m40=promedio)
+        for nombre, escalar, obtenido in (("calcular_pension", escalar_base, base),
+                                          ("calcular_mod40", escalar_m40, res)):
+            esperado = {campo: np.full(filas, np.nan) for campo in obtenido}
+            for i, valores in escalar.items():
+                for campo in obtenido:
+                    esperado[campo][i] = valores[campo]
+            comparar(version, nombre, esperado, obtenido, muestra)
+    return diferencias
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulador_imss.nucleo",
+                                     description="Precalienta el núcleo compilado y verifica que coincide con NumPy")
+    parser.add_argument("--filas", type=int, default=20_000, help="escenarios de la prueba de paridad")
+    parser.add_argument("--escalares", type=int, default=500, help="de ellos, cuántos contra motor.py")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    precalentar()
+    print(f"núcleo listo en {time.perf_counter() - inicio:.2f} s (hilos: {numba.get_num_threads()})")
+
+    inicio = time.perf_counter()
+    diferencias = verificar_paridad(args.filas, args.escalares)
+    print(f"paridad: {args.filas:,} escenarios por versión en {time.perf_counter() - inicio:.2f} s")
+    if diferencias:
+        print(f"❌ {len(diferencias)} diferencias, p. ej.:")
+        for diferencia in diferencias[:10]:
+            print("   ", diferencia)
+        return 1
+    print("✅ Idéntico a lote.py y motor.py")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""Optimizador de Modalidad 40: mejor plan con un presupuesto máximo
+
+Busca (meses_m40, salario_m40, edad_retiro) con el mejor ROI, utilidad a
+20 años o pensión mensual sin pasar del presupuesto de inversión.
+
+Dentro de un grupo del Art. 167 la pensión con M40 es lineal en
+salario_m40 y la inversión es salario_m40 * costo_por_peso(meses), así
+que ROI, utilidad y pensión son monótonas en el salario para cada (meses,
+edad). El óptimo siempre está en un extremo de un tramo: el salario
+mínimo, el máximo que permite el presupuesto o el cambio de grupo del
+Art. 167 (al centavo). Con una tabla de un solo grupo solo se evalúan 2
+salarios por cada (meses, edad), todos en una sola llamada a
+calcular_mod40_lote, y los números del plan son exactamente los de
+calcular_mod40.
+
+La búsqueda inversa (meta_mod40) usa la misma linealidad al revés: para
+llegar a una pensión meta, en cada grupo del Art. 167 el salario M40
+necesario sale de despejar la fórmula, sin probar salarios. Si la pensión
+sin M40 ya llega a la meta el plan es de 0 meses y 0 de inversión.
+
+Con `historial` (historial.py, un cliente por fila) el promedio al terminar
+M40 es el exacto del historial en vez del ponderado; sigue siendo lineal en
+salario_m40 (Historial.coeficientes_m40), así que todo lo anterior vale igual.
+"""
+
+import numpy as np
+
+from .lote import calcular_mod40_lote, calcular_pension_lote, costo_m40_lote, _columna, _factor_edad_lote, _tablas
+from .parametros import obtener_reglas
+
+OBJETIVOS = {"roi": "roi", "utilidad": "utilidad_20", "pension": "con_m40"}
+MESES = range(1, 61)
+# 0 meses = sin M40: la pensión base ya llega a la meta
+MESES_META = range(0, 61)
+EDADES_RETIRO = range(60, 66)
+
+# Clientes evaluados por paso en el modo lote (acota la memoria)
+CLIENTES_POR_PASO = 2_000
+# En la búsqueda inversa cada (meses, edad) se evalúa en todos los grupos del Art. 167
+CLIENTES_POR_PASO_META = 250
+
+def costo_por_peso(meses, reglas=None, año_inicio=None):
+    """Inversión total por cada peso de salario diario M40 (misma regla que calcular_mod40)"""
+    return costo_m40_lote(meses, reglas, año_inicio)
+
+def _coeficientes(historial, clientes, meses, reglas):
+    """Historial.coeficientes_m40 para los meses candidatos (None sin historial)"""
+    if historial is None:
+        return None
+    if len(historial) != clientes:
+        raise ValueError(f"El historial trae {len(historial)} clientes y hay {clientes}: debe ser uno por cliente")
+    return historial.coeficientes_m40(meses, reglas)
+
+def _optimizar_paso(semanas, salario, edad_actual, esposa, presupuesto, salario_min, campo, meses, edades, salario_max,
+                    reglas, año_inicio, coeficientes=None):
+    r = obtener_reglas(reglas)
+    # Límites entre grupos del Art. 167 en pesos de salario promedio
+    fronteras = np.array(r.limites_vsm[:-1]) * r.salario_minimo_vigente
+    # Candidatos: (meses, edad, extremo) con extremo 0 = salario mínimo, 1 = máximo alcanzable
+    # y, por cada frontera, el último centavo del grupo de abajo y el primero del de arriba
+    I, E, X = (a.ravel() for a in np.meshgrid(np.arange(len(meses)), edades, np.arange(2 + 2 * len(fronteras)),
+                                              indexing="ij"))
+    M = meses[I]
+    # Promedio exacto del historial: ordenada + pendiente * salario_m40 por cliente y candidato
+    ordenada, pendiente = (None, None) if coeficientes is None else (c[:, I] for c in coeficientes)
+    costo = costo_por_peso(M, r, año_inicio)
+
+    s_min = salario_min[:, None]
+    # Tope por presupuesto truncado a centavos para no pasarse
+    s_max = np.floor(np.minimum(salario_max, presupuesto[:, None] / costo) * 100) / 100
+    salario_m40 = np.where(X == 1, s_max, s_min)
+    if len(fronteras):
+        # salario_m40 con el que el nuevo promedio llega a la frontera (mismo ponderado que calcular_mod40)
+        ponderadas = np.minimum((M / 12) * 52, r.semanas_promedio)
+        previas = r.semanas_promedio - ponderadas
+        indice = np.maximum(X - 2, 0)
+        limite = fronteras[indice // 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if coeficientes is None:
+                frontera = np.where(previas > 0, (limite * r.semanas_promedio - salario[:, None] * previas) / ponderadas,
+                                    limite)
+            else:
+                frontera = (limite - ordenada) / pendiente
+        frontera = np.floor(frontera * 100) / 100 + (indice % 2) * 0.01
+        salario_m40 = np.where(X >= 2, np.clip(frontera, s_min, s_max), salario_m40)
+    factible = (s_max >= s_min) & (E >= edad_actual[:, None])
+
+    res = calcular_mod40_lote(semanas=semanas[:, None], salario=salario[:, None], edad_actual=edad_actual[:, None],
+                              edad_retiro=E, salario_m40=salario_m40, meses_m40=M, esposa=esposa[:, None],
+                              reglas=r, año_inicio=año_inicio,
+                              promedio_m40=None if coeficientes is None else ordenada + pendiente * salario_m40)
+    valor = np.where(factible, res[campo], -np.inf)
+    mejor = valor.argmax(axis=1)
+    filas = np.arange(len(semanas))
+    hay_plan = factible[filas, mejor]
+
+    plan = {
+        "salario_m40": salario_m40[filas, mejor],
+        "meses_m40": M[mejor].astype(np.float64),
+        "edad_retiro": E[mejor].astype(np.float64),
+    }
+    plan.update({k: v[filas, mejor] for k, v in res.items()})
+    for k in plan:
+        plan[k] = np.where(hay_plan, plan[k], np.nan)
+    plan["factible"] = hay_plan
+    return plan
+
+def optimizar_mod40_lote(datos=None, *, semanas=None, salario=None, edad_actual=None, esposa=True,
+                         presupuesto=np.inf, objetivo="roi", meses=MESES, edades_retiro=EDADES_RETIRO,
+                         salario_min=None, salario_max=None, reglas=None, año_inicio=None, historial=None):
+    """Mejor plan M40 para cada cliente; columnas del plan + 'factible' (NaN si no hay plan)
+
+    `presupuesto` puede ser un escalar o una columna. `salario_min` por
+    defecto es el salario promedio actual de cada cliente y `salario_max`
+    el tope de 25 UMA de las reglas. `historial` trae el historial de cada
+    cliente (en el mismo orden) para usar su promedio exacto con M40.
+    """
+    if objetivo not in OBJETIVOS:
+        raise ValueError(f"Objetivo desconocido: {objetivo!r} (usa {', '.join(OBJETIVOS)})")
+    columnas = [
+        _columna(datos, "semanas", semanas),
+        _columna(datos, "salario", salario),
+        _columna(datos, "edad_actual", edad_actual),
+        _columna(datos, "esposa", esposa),
+        _columna(datos, "presupuesto", presupuesto),
+    ]
+    semanas, salario, edad_actual, esposa, presupuesto = (np.ravel(c) for c in np.broadcast_arrays(*columnas))
+    salario_min = salario if salario_min is None else np.ravel(np.broadcast_to(salario_min, salario.shape))
+    meses = np.asarray(list(meses), dtype=np.float64)
+    edades = np.asarray(list(edades_retiro), dtype=np.float64)
+    reglas = obtener_reglas(reglas)
+    if salario_max is None:
+        salario_max = reglas.tope_salario
+    coeficientes = _coeficientes(historial, len(semanas), meses, reglas)
+
+    pasos = []
+    for i in range(0, len(semanas), CLIENTES_POR_PASO):
+        tramo = slice(i, i + CLIENTES_POR_PASO)
+        pasos.append(_optimizar_paso(semanas[tramo], salario[tramo], edad_actual[tramo], esposa[tramo],
+                                     presupuesto[tramo], salario_min[tramo], OBJETIVOS[objetivo],
+                                     meses, edades, salario_max, reglas, año_inicio,
+                                     None if coeficientes is None else [c[tramo] for c in coeficientes]))
+    if not pasos:
+        return {}
+    return {k: np.concatenate([p[k] for p in pasos]) for k in pasos[0]}
+
+def optimizar_mod40(semanas, salario, edad_actual, esposa=True, presupuesto=float("inf"), objetivo="roi", **opciones):
+    """Mejor plan M40 para un cliente como dict (None si nada cabe en el presupuesto)"""
+    plan = optimizar_mod40_lote(semanas=semanas, salario=salario, edad_actual=edad_actual, esposa=esposa,
+                                presupuesto=presupuesto, objetivo=objetivo, **opciones)
+    if not plan["factible"][0]:
+        return None
+    resultado = {k: v[0].item() for k, v in plan.items() if k != "factible"}
+    resultado["meses_m40"] = int(resultado["meses_m40"])
+    resultado["edad_retiro"] = int(resultado["edad_retiro"])
+    return resultado
+
+# ============================================
+# BÚSQUEDA INVERSA: PLAN MÁS BARATO PARA UNA PENSIÓN META
+# ============================================
+
+def _meta_paso(semanas, salario, edad_actual, esposa, meta, año_inicio, salario_min, meses, edades, salario_max,
+               reglas, sin_m40=True, coeficientes=None):
+    r = obtener_reglas(reglas)
+    t = _tablas(r)
+    # Candidatos ordenados por edad y luego por meses: en un empate de inversión gana el retiro más temprano
+    E, I = (a.ravel() for a in np.meshgrid(edades, np.arange(len(meses)), indexing="ij"))
+    M = meses[I]
+    semanas, salario, edad_actual, esposa, meta, año_inicio, s_min = (
+        c[:, None] for c in (semanas, salario, edad_actual, esposa, meta, año_inicio, salario_min))
+
+    # Pensión mensual = promedio * K, con K fijo dentro de cada grupo del Art. 167 (mismos factores que calcular_mod40)
+    años_para_retiro = np.maximum(0, E - edad_actual)
+    semanas_totales = semanas + 52 * años_para_retiro + (M / 12) * 52
+    años_despues_500 = np.maximum(0, (semanas_totales - r.semanas_minimas) / 52)
+    constante = (365 / 12 * (1 + np.where(esposa.astype(bool), r.pct_esposa, 0.0)) * (1 + r.decreto_fox)
+                 * _factor_edad_lote(E, t) * r.ajuste_final_m40)
+
+    # Promedio = (salario * previas + salario_m40 * ponderadas) / 250: lineal en salario_m40.
+    # Con historial la recta es la del promedio exacto
+    if coeficientes is None:
+        ponderadas = np.minimum((M / 12) * 52, r.semanas_promedio)
+        previas = r.semanas_promedio - ponderadas
+    else:
+        ordenada, pendiente = (c[:, I] for c in coeficientes)
+
+    def promedio_con(salario_m40):
+        if coeficientes is None:
+            return (salario * previas + salario_m40 * ponderadas) / r.semanas_promedio
+        return ordenada + pendiente * salario_m40
+
+    promedio_min = promedio_con(s_min)
+
+    # Menor promedio de cada grupo que llega a la meta; el primer grupo que lo logra da el salario más bajo.
+    # Se recorren del último al primero para que el más bajo sobrescriba a los demás
+    limites = t.limites_vsm * r.salario_minimo_vigente
+    inferiores = np.concatenate(([0.0], limites[:-1]))
+    promedio = np.full(años_despues_500.shape, np.inf)
+    for g in reversed(range(len(limites))):
+        if limites[g] < promedio_min.min():
+            break
+        K = constante * (t.pct_cuantia[g] + t.pct_incremento[g] * años_despues_500)
+        necesario = np.maximum(np.maximum(meta / K, inferiores[g]), promedio_min)
+        promedio = np.where(necesario <= limites[g], necesario, promedio)
+    posible = np.isfinite(promedio)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if coeficientes is None:
+            s = (promedio * r.semanas_promedio - salario * previas) / ponderadas
+        else:
+            s = (promedio - ordenada) / pendiente
+    # Al centavo hacia arriba; el margen evita que 1234.56000001 suba a 1234.57
+    s = np.where(s <= s_min, s_min, np.ceil(s * 100 - 1e-6) / 100)
+    # Menos de los meses mínimos: el salario M40 no cambia el promedio, basta el mínimo
+    corto = M < r.meses_minimos_m40
+    s = np.where(corto, s_min, s)
+    factible = (posible | corto) & (s <= salario_max) & (E >= edad_actual)
+
+    # El redondeo a centavos de con_m40 y el borde abierto de cada grupo se resuelven con un centavo más
+    pension = {}
+    for extra in (0.0, 0.01):
+        promedio = np.where(corto, salario, promedio_con(s + extra))
+        g = np.searchsorted(limites, promedio, side="left")
+        pension[extra] = promedio * constante * (t.pct_cuantia[g] + t.pct_incremento[g] * años_despues_500)
+    s = np.where(pension[0.0] >= meta - 0.005, s, s + 0.01)
+    factible &= (np.maximum(pension[0.0], pension[0.01]) >= meta - 0.005) & (s <= salario_max)
+    mejor = np.where(factible, s * costo_m40_lote(M, r, año_inicio), np.inf).argmin(axis=1)
+    filas = np.arange(len(semanas))
+
+    # Solo el plan elegido pasa por el motor: los números son exactamente los de calcular_mod40
+    def evaluar(salario_m40):
+        promedio_m40 = None
+        if coeficientes is not None:
+            promedio_m40 = ordenada[filas, mejor] + pendiente[filas, mejor] * salario_m40
+        return calcular_mod40_lote(semanas=semanas[:, 0], salario=salario[:, 0], edad_actual=edad_actual[:, 0],
+                                   edad_retiro=E[mejor], salario_m40=salario_m40, meses_m40=M[mejor],
+                                   esposa=esposa[:, 0], reglas=r, año_inicio=año_inicio[:, 0],
+                                   promedio_m40=promedio_m40)
+    salario_m40 = s[filas, mejor]
+    res = evaluar(salario_m40)
+    falta = res['con_m40'] < meta[:, 0]
+    if falta.any():
+        salario_m40 = np.where(falta, np.minimum(salario_m40 + 0.01, salario_max), salario_m40)
+        res = evaluar(salario_m40)
+    hay_plan = factible[filas, mejor] & (res['con_m40'] >= meta[:, 0])
+
+    plan = {
+        "salario_m40": salario_m40,
+        "meses_m40": M[mejor].astype(np.float64),
+        "edad_retiro": E[mejor].astype(np.float64),
+    }
+    plan.update(res)
+    for k in plan:
+        plan[k] = np.where(hay_plan, plan[k], np.nan)
+
+    if sin_m40:
+        # La pensión base (la misma de calcular_pension) en cada edad; la más temprana que llega gana
+        base = calcular_pension_lote(semanas=semanas, salario=salario, edad_actual=edad_actual, edad_retiro=edades,
+                                     esposa=esposa, reglas=r)["mensual"]
+        alcanza = (base >= meta) & (edades >= edad_actual)
+        basta = alcanza.any(axis=1)
+        edad = alcanza.argmax(axis=1)
+        base = base[filas, edad]
+        sin_plan = {"salario_m40": 0.0, "meses_m40": 0.0, "edad_retiro": edades[edad], "base": base,
+                    "con_m40": base, "incremento": 0.0, "inversion": 0.0, "recuperacion_meses": 0.0,
+                    "utilidad_20": 0.0, "roi": 0.0, "nuevo_promedio": salario[:, 0]}
+        for k, v in sin_plan.items():
+            plan[k] = np.where(basta, v, plan[k])
+        hay_plan = hay_plan | basta
+    plan["factible"] = hay_plan
+    return plan
+
+def meta_mod40_lote(datos=None, *, semanas=None, salario=None, edad_actual=None, esposa=True, meta=None,
+                    meses=MESES_META, edades_retiro=EDADES_RETIRO, salario_min=None, salario_max=None, reglas=None,
+                    año_inicio=None, historial=None):
+    """Plan M40 de menor inversión con el que con_m40 llega a `meta` (pensión mensual), por cliente
+
+    Mismas columnas (y `historial`) que optimizar_mod40_lote; 'año_inicio_m40'
+    puede ser una columna. Con varias edades de retiro
+    posibles la más tardía suele ser la más barata; `edades_retiro` acota la
+    búsqueda a las que el cliente acepta. Con 0 en `meses` (por defecto)
+    el plan es de 0 meses cuando la pensión base ya llega a la meta.
+    """
+    columnas = [
+        _columna(datos, "semanas", semanas),
+        _columna(datos, "salario", salario),
+        _columna(datos, "edad_actual", edad_actual),
+        _columna(datos, "esposa", esposa),
+        _columna(datos, "meta", meta),
+        _columna(datos, "año_inicio_m40", np.nan if año_inicio is None else año_inicio),
+    ]
+    semanas, salario, edad_actual, esposa, meta, año_inicio = (np.ravel(c) for c in np.broadcast_arrays(*columnas))
+    salario_min = salario if salario_min is None else np.ravel(np.broadcast_to(salario_min, salario.shape))
+    meses = np.asarray(list(meses), dtype=np.float64)
+    sin_m40 = bool((meses == 0).any())
+    meses = meses[meses > 0]
+    if not len(meses):
+        raise ValueError("`meses` debe incluir al menos un mes de M40")
+    edades = np.asarray(list(edades_retiro), dtype=np.float64)
+    reglas = obtener_reglas(reglas)
+    if salario_max is None:
+        salario_max = reglas.tope_salario
+    coeficientes = _coeficientes(historial, len(semanas), meses, reglas)
+
+    pasos = []
+    for i in range(0, len(semanas), CLIENTES_POR_PASO_META):
+        tramo = slice(i, i + CLIENTES_POR_PASO_META)
+        pasos.append(_meta_paso(semanas[tramo], salario[tramo], edad_actual[tramo], esposa[tramo], meta[tramo],
+                                año_inicio[tramo], salario_min[tramo], meses, edades, salario_max, reglas, sin_m40,
+                                None if coeficientes is None else [c[tramo] for c in coeficientes]))
+    if not pasos:
+        return {}
+    return {k: np.concatenate([p[k] for p in pasos]) for k in pasos[0]}
+
+def meta_mod40(semanas, salario, edad_actual, meta, esposa=True, **opciones):
+    """Plan M40 más barato para llegar a una pensión mensual meta, como dict (None si no se alcanza)"""
+    plan = meta_mod40_lote(semanas=semanas, salario=salario, edad_actual=edad_actual, esposa=esposa, meta=meta,
+                           **opciones)
+    if not plan["factible"][0]:
+        return None
+    resultado = {k: v[0].item() for k, v in plan.items() if k != "factible"}
+    resultado["meses_m40"] = int(resultado["meses_m40"])
+    resultado["edad_retiro"] = int(resultado["edad_retiro"])
+    return resultado
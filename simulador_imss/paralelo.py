@@ -0,0 +1,153 @@
+"""Cálculo de Modalidad 40 en varios procesos con memoria compartida
+
+Las entradas se copian una sola vez a un bloque de memoria compartida y
+cada proceso escribe sus resultados directamente en otro bloque, en la
+posición de sus filas. Entre procesos solo viajan índices (inicio, fin),
+nunca dicts por fila, y el resultado queda en el mismo orden de entrada.
+
+    with CalculadorParalelo(procesos=32, tamano_bloque=250_000) as calc:
+        res = calc.calcular_mod40(datos)
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import lote
+from .lote import calcular_mod40_lote, _columna
+
+ENTRADAS_M40 = ("semanas", "salario", "edad_actual", "edad_retiro", "salario_m40", "meses_m40", "esposa",
+                "año_inicio_m40", "promedio_m40")
+CAMPOS_M40 = ("base", "con_m40", "incremento", "inversion", "recuperacion_meses", "utilidad_20", "roi", "nuevo_promedio")
+
+# Valores de las columnas opcionales (NaN = el que use calcular_mod40_lote por defecto)
+DEFECTOS_M40 = {"esposa": True, "año_inicio_m40": np.nan, "promedio_m40": np.nan}
+# Nombre del argumento de calcular_mod40_lote cuando difiere del de la columna
+ARGUMENTOS_M40 = {"año_inicio_m40": "año_inicio"}
+
+TAMANO_BLOQUE = 250_000
+
+# ============================================
+# LADO DEL PROCESO DE TRABAJO
+# ============================================
+
+# Par (entrada, salida) de memoria compartida abierto en el proceso de trabajo
+_abiertas = {}
+
+def _abrir(nombre_entrada, nombre_salida):
+    clave = (nombre_entrada, nombre_salida)
+    if clave not in _abiertas:
+        # Solo se conserva el par de la llamada en curso
+        for par in _abiertas.values():
+            for shm in par:
+                shm.close()
+        _abiertas.clear()
+        _abiertas[clave] = (shared_memory.SharedMemory(name=nombre_entrada),
+                            shared_memory.SharedMemory(name=nombre_salida))
+    return _abiertas[clave]
+
+def _iniciar_proceso():
+    # El pool ya reparte las filas: el núcleo compilado usa un solo hilo en cada proceso
+    if lote.NUCLEO:
+        import numba
+        numba.set_num_threads(1)
+
+def _calcular_tramo(nombre_entrada, nombre_salida, n, inicio, fin, reglas=None):
+    shm_entrada, shm_salida = _abrir(nombre_entrada, nombre_salida)
+    entrada = np.ndarray((len(ENTRADAS_M40), n), dtype=np.float64, buffer=shm_entrada.buf)
+    salida = np.ndarray((len(CAMPOS_M40), n), dtype=np.float64, buffer=shm_salida.buf)
+    datos = {c: entrada[i, inicio:fin] for i, c in enumerate(ENTRADAS_M40)}
+    res = calcular_mod40_lote(datos, reglas=reglas)
+    for i, campo in enumerate(CAMPOS_M40):
+        salida[i, inicio:fin] = res[campo]
+    # Soltar las vistas para poder cerrar la memoria en la siguiente llamada
+    del entrada, salida, datos
+    return fin - inicio
+
+# ============================================
+# LADO DEL PROCESO PRINCIPAL
+# ============================================
+
+class CalculadorParalelo:
+    """Pool de procesos reutilizable para calcular_mod40 en lote"""
+
+    def __init__(self, procesos=None, tamano_bloque=TAMANO_BLOQUE):
+        if tamano_bloque <= 0:
+            raise ValueError("tamano_bloque debe ser mayor que cero")
+        self.procesos = procesos or os.cpu_count() or 1
+        self.tamano_bloque = tamano_bloque
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def calcular_mod40(self, datos=None, reglas=None, **columnas):
+        """Igual que calcular_mod40_lote, repartido entre procesos
+
+        `reglas` es el nombre de una versión para todo el lote; una columna
+        'reglas' con varias versiones se calcula en este proceso.
+        """
+        if reglas is None and datos is not None and "reglas" in datos:
+            versiones = set(np.asarray(datos["reglas"], dtype=object).ravel().tolist())
+            if len(versiones) > 1:
+                return calcular_mod40_lote(datos, **columnas)
+            reglas = versiones.pop() if versiones else None
+        valores = [_columna(datos, c, columnas.get(ARGUMENTOS_M40.get(c, c), DEFECTOS_M40.get(c)))
+                   for c in ENTRADAS_M40]
+        valores = np.broadcast_arrays(*valores)
+        n = valores[0].size
+
+        # Con un solo proceso o un solo bloque no vale la pena repartir
+        if self.procesos == 1 or n <= self.tamano_bloque:
+            return calcular_mod40_lote(dict(zip(ENTRADAS_M40, (v.ravel() for v in valores))), reglas=reglas)
+
+        if self._pool is None:
+            # Sin fork: OpenMP (el del núcleo compilado) aborta el proceso hijo si el padre ya lo usó
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            contexto = multiprocessing.get_context(metodo)
+            if metodo == "forkserver":
+                # Los procesos nacen de un servidor que ya importó NumPy y el motor
+                contexto.set_forkserver_preload([__name__])
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=contexto,
+                                             initializer=_iniciar_proceso)
+
+        shm_entrada = shared_memory.SharedMemory(create=True, size=len(ENTRADAS_M40) * n * 8)
+        shm_salida = shared_memory.SharedMemory(create=True, size=len(CAMPOS_M40) * n * 8)
+        try:
+            entrada = np.ndarray((len(ENTRADAS_M40), n), dtype=np.float64, buffer=shm_entrada.buf)
+            for i, v in enumerate(valores):
+                entrada[i] = v.ravel()
+            del entrada
+
+            tareas = [
+                self._pool.submit(_calcular_tramo, shm_entrada.name, shm_salida.name, n, inicio,
+                                 min(inicio + self.tamano_bloque, n), reglas)
+                for inicio in range(0, n, self.tamano_bloque)
+            ]
+            for tarea in tareas:
+                tarea.result()
+
+            salida = np.ndarray((len(CAMPOS_M40), n), dtype=np.float64, buffer=shm_salida.buf)
+            resultado = {campo: salida[i].copy() for i, campo in enumerate(CAMPOS_M40)}
+            del salida
+            return resultado
+        finally:
+            for shm in (shm_entrada, shm_salida):
+                shm.close()
+                shm.unlink()
+
+def calcular_mod40_paralelo(datos=None, procesos=None, tamano_bloque=TAMANO_BLOQUE, **columnas):
+    """Atajo de un solo uso: crea el pool, calcula y lo cierra"""
+    with CalculadorParalelo(procesos, tamano_bloque) as calc:
+        return calc.calcular_mod40(datos, **columnas)
@@ -0,0 +1,143 @@
+"""Reglas Ley 73 / Modalidad 40 versionadas, cargadas de simulador_imss/reglas/*.json
+
+Cada archivo es una versión completa de las reglas: factor por edad,
+tabla del Art. 167 (cuantía e incremento por grupo de salario en veces el
+salario mínimo), UMA y salario mínimo por año, tope de 25 UMA y tasas de
+M40 por año calendario (o, con "tasas_m40_relativas", por año de M40
+contado desde 1). Todas las versiones se cargan una sola vez al importar;
+cambiar de versión en un escenario es una consulta al dict.
+
+El costo de M40 se precompila como costo por peso de salario de cada mes
+y su suma acumulada, una fila por año de inicio, así que la inversión de
+cualquier número de meses es salario_m40 * costo_m40(meses): O(1).
+"""
+
+import bisect
+import hashlib
+import itertools
+import json
+from pathlib import Path
+
+DIRECTORIO_REGLAS = Path(__file__).resolve().parent / "reglas"
+VERSION_DEFECTO = "ley73-v1"
+
+# Meses precompilados por fila; más allá se extrapola con el costo del último mes
+MESES_TABLA = 600
+
+class Reglas:
+    """Una versión de las reglas, precompilada para consultas O(1)"""
+
+    def __init__(self, datos):
+        self.version = datos["version"]
+        self.descripcion = datos.get("descripcion", "")
+        # Huella del contenido: cambia con cualquier constante (las cachés en disco la usan como clave)
+        self.huella = hashlib.sha256(json.dumps(datos, sort_keys=True).encode()).hexdigest()[:16]
+        self.factor_por_edad = {int(e): f for e, f in datos["factor_por_edad"].items()}
+        self.factor_edad_otro = datos["factor_edad_otro"]
+        self.semanas_minimas = datos["semanas_minimas"]
+        self.semanas_promedio = datos["semanas_promedio"]
+        self.pct_esposa = datos["pct_esposa"]
+        self.decreto_fox = datos["decreto_fox"]
+        self.ajuste_final_m40 = datos["ajuste_final_m40"]
+        self.meses_minimos_m40 = datos["meses_minimos_m40"]
+        self.dias_por_mes_m40 = datos["dias_por_mes_m40"]
+
+        # Art. 167: el último grupo no tiene límite superior (null)
+        art167 = datos["art167"]
+        self.limites_vsm = tuple(float("inf") if l is None else l for l in art167["limites_vsm"])
+        self.pct_cuantia = tuple(art167["cuantia"])
+        self.pct_incremento = tuple(art167["incremento"])
+        if not len(self.limites_vsm) == len(self.pct_cuantia) == len(self.pct_incremento):
+            raise ValueError(f"{self.version}: la tabla del Art. 167 tiene columnas de distinto largo")
+        if list(self.limites_vsm) != sorted(self.limites_vsm) or self.limites_vsm[-1] != float("inf"):
+            raise ValueError(f"{self.version}: los límites del Art. 167 deben ser crecientes y terminar en null")
+
+        self.año_vigencia = datos["año_vigencia"]
+        self.uma = {int(a): v for a, v in datos["uma"].items()}
+        self.salario_minimo = {int(a): v for a, v in datos["salario_minimo"].items()}
+        self.salario_minimo_vigente = self.salario_minimo[self.año_vigencia]
+        self.tope_salario = datos["veces_uma_tope"] * self.uma[self.año_vigencia]
+
+        # Tasas M40 por año calendario; antes de la tabla se usa la primera y después la posterior
+        tasas = {int(a): t for a, t in datos["tasas_m40"].items()}
+        ultimo = max(tasas)
+        posterior = datos["tasa_m40_posterior"]
+        posterior = tasas[ultimo] if posterior is None else posterior
+        if posterior < tasas[ultimo]:
+            # Con una tasa menor, empezar M40 después costaría menos (con 0.0, nada)
+            raise ValueError(f"{self.version}: tasa_m40_posterior no puede ser menor que la tasa de {ultimo}")
+        self.tasas_m40 = tasas
+        self.año_inicio_m40 = datos["año_inicio_m40"]
+        relativas = datos.get("tasas_m40_relativas", False)
+        # Tasas por año de M40: una sola fila de costos, la misma para cualquier año de inicio
+        self.primer_año_m40 = self.año_inicio_m40 if relativas else min(tasas)
+        primera = min(tasas)
+
+        def tasa(año):
+            if año < primera:
+                return tasas[primera]
+            return tasas.get(año, posterior)
+
+        # Una fila por año de inicio: del primer año de la tabla al primero sin tabla
+        self.costo_mensual = []
+        self.costo_acumulado = []
+        for inicio in ([1] if relativas else range(primera, ultimo + 2)):
+            mensual = [self.dias_por_mes_m40 * tasa(inicio + m // 12) for m in range(MESES_TABLA)]
+            self.costo_mensual.append(mensual)
+            self.costo_acumulado.append(list(itertools.accumulate(mensual, initial=0.0)))
+
+    def __repr__(self):
+        return f"Reglas({self.version!r})"
+
+    def factor_edad(self, edad_retiro):
+        return self.factor_por_edad.get(edad_retiro, self.factor_edad_otro)
+
+    def porcentajes(self, salario):
+        """(cuantía, incremento) del Art. 167 para un salario diario promedio"""
+        if len(self.limites_vsm) == 1:
+            return self.pct_cuantia[0], self.pct_incremento[0]
+        grupo = bisect.bisect_left(self.limites_vsm, salario / self.salario_minimo_vigente)
+        return self.pct_cuantia[grupo], self.pct_incremento[grupo]
+
+    def fila_m40(self, año_inicio=None):
+        """Índice de la fila de costos para un año de inicio de M40"""
+        if año_inicio is None:
+            año_inicio = self.año_inicio_m40
+        return min(max(int(año_inicio) - self.primer_año_m40, 0), len(self.costo_acumulado) - 1)
+
+    def costo_m40(self, meses, año_inicio=None):
+        """Inversión por cada peso de salario diario M40 en `meses` (acepta meses fraccionarios)"""
+        if not meses > 0:
+            return 0.0
+        fila = self.fila_m40(año_inicio)
+        k = min(int(meses), MESES_TABLA)
+        return self.costo_acumulado[fila][k] + (meses - k) * self.costo_mensual[fila][min(k, MESES_TABLA - 1)]
+
+# ============================================
+# CARGA DE VERSIONES
+# ============================================
+
+def cargar_reglas(directorio=DIRECTORIO_REGLAS):
+    """Lee y compila todas las versiones de un directorio: {versión: Reglas}"""
+    versiones = {}
+    for ruta in sorted(Path(directorio).glob("*.json")):
+        with open(ruta, "r", encoding="utf-8") as f:
+            reglas = Reglas(json.load(f))
+        if reglas.version in versiones:
+            raise ValueError(f"Versión de reglas repetida: {reglas.version} ({ruta.name})")
+        versiones[reglas.version] = reglas
+    return versiones
+
+REGLAS = cargar_reglas()
+_DEFECTO = REGLAS[VERSION_DEFECTO]
+
+def obtener_reglas(reglas=None):
+    """Reglas de una versión (por nombre); None es la versión por defecto"""
+    if reglas is None:
+        return _DEFECTO
+    if isinstance(reglas, Reglas):
+        return reglas
+    try:
+        return REGLAS[reglas]
+    except KeyError:
+        raise ValueError(f"Versión de reglas desconocida: {reglas!r} (hay {', '.join(REGLAS)})") from None
@@ -0,0 +1,317 @@
+"""Caché persistente de resultados en SQLite (WAL), compartida por procesos y reinicios
+
+Segundo nivel detrás de las cachés en memoria para los resultados caros
+(comparativa, rejilla de sensibilidad, Monte Carlo): lo que un proceso
+calcula lo encuentran los demás procesos del servidor y los que arrancan
+después de un despliegue. Se usa igual que CacheLRU:
+
+    from simulador_imss import persistente
+    res = persistente.obtener(('rejilla', semanas, ..., reglas), lambda: _calcular_rejilla(...))
+
+La clave es el SHA-256 de las entradas normalizadas (1315 y 1315.0 son lo
+mismo, los escalares de NumPy cuentan como los de Python). Un objeto Reglas
+entra con su versión y la huella de su contenido, así que editar cualquier
+constante de reglas/*.json deja fuera los resultados anteriores.
+VERSION_CALCULO se sube cuando cambia una fórmula del motor.
+
+El archivo se acota solo por tamaño y edad: al pasarse de MAXIMO_BYTES se
+desalojan los de uso más antiguo, y lo que nadie usa en MAXIMA_EDAD
+segundos se borra. Abrirlo no borra nada: durante un despliegue gradual los
+procesos viejos y nuevos comparten el archivo con reglas distintas. Los
+resultados de reglas que ya no existen se borran a mano con --purgar:
+
+    python -m simulador_imss.persistente --estadisticas
+    python -m simulador_imss.persistente --purgar
+
+Los valores se guardan con pickle: el archivo lo escribe solo el propio
+servidor. Cualquier error de SQLite o de un valor ilegible se cuenta en
+'errores' y el resultado se calcula como si no hubiera caché.
+
+Está apagada hasta que se pide: importar el paquete no escribe nada en
+disco. Se enciende con SIMULADOR_CACHE_DB=ruta.db o con activar(ruta) (la
+app la enciende en ARCHIVO_CACHE); SIMULADOR_CACHE_DB=0 la deja apagada.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+
+from .parametros import Reglas
+
+VARIABLE_RUTA = "SIMULADOR_CACHE_DB"
+ARCHIVO_CACHE = "cache_resultados.db"
+MAXIMO_BYTES = 256 * 1024 * 1024
+# Sin uso en este tiempo se borra aunque sobre espacio (30 días)
+MAXIMA_EDAD = 30 * 24 * 3600
+
+# Súbela al cambiar una fórmula: las claves anteriores dejan de coincidir
+VERSION_CALCULO = 1
+
+# El último uso se reescribe solo si es más viejo que esto (un acierto no siempre escribe)
+REFRESCAR_USO = 60.0
+
+# Al pasarse del máximo se desaloja esta fracción de las entradas por vuelta
+FRACCION_DESALOJO = 0.1
+
+# Archivo de la caché del proceso; None = desactivada
+RUTA = os.environ.get(VARIABLE_RUTA) or None
+if RUTA == "0":
+    RUTA = None
+
+# ============================================
+# CLAVES
+# ============================================
+
+def _normalizar(valor):
+    """Forma estable para JSON: números como float, secuencias como listas, Reglas como (versión, huella)"""
+    if isinstance(valor, Reglas):
+        return ["reglas", valor.version, valor.huella]
+    if valor is None or isinstance(valor, (bool, str)):
+        return valor
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if hasattr(valor, "item") and getattr(valor, "ndim", None) == 0:
+        return _normalizar(valor.item())
+    if isinstance(valor, (tuple, list, range)):
+        return [_normalizar(v) for v in valor]
+    if isinstance(valor, dict):
+        return {str(k): _normalizar(v) for k, v in sorted(valor.items())}
+    raise TypeError(f"No se puede usar {type(valor).__name__} en una clave de caché")
+
+def clave_estable(*partes):
+    """SHA-256 (bytes) de las partes normalizadas; igual en cualquier proceso o máquina"""
+    texto = json.dumps([VERSION_CALCULO, *map(_normalizar, partes)], separators=(",", ":"))
+    return hashlib.sha256(texto.encode()).digest()
+
+def _huella(partes):
+    return next((p.huella for p in partes if isinstance(p, Reglas)), "")
+
+# ============================================
+# ALMACÉN
+# ============================================
+
+class CachePersistente:
+    """Resultados por clave estable en un archivo SQLite con desalojo LRU por tamaño y edad"""
+
+    def __init__(self, ruta=ARCHIVO_CACHE, maximo_bytes=MAXIMO_BYTES, maxima_edad=MAXIMA_EDAD):
+        if maximo_bytes <= 0 or maxima_edad <= 0:
+            raise ValueError("maximo_bytes y maxima_edad deben ser mayores que cero")
+        self.ruta = ruta
+        self.maximo_bytes = maximo_bytes
+        self.maxima_edad = maxima_edad
+        self._local = threading.local()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.errores = 0
+
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS resultados (
+                    clave BLOB PRIMARY KEY,
+                    valor BLOB NOT NULL,
+                    reglas TEXT NOT NULL,
+                    usado REAL NOT NULL
+                )
+            """)
+            conexion.execute("CREATE INDEX IF NOT EXISTS resultados_usado ON resultados (usado)")
+
+    def _conexion(self):
+        # sqlite3 no comparte conexiones entre hilos: una por hilo
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def _contar(self, campo, n=1):
+        with self._candado:
+            setattr(self, campo, getattr(self, campo) + n)
+
+    def leer(self, clave):
+        """(True, valor) si `clave` (de clave_estable) está guardada; (False, None) si no"""
+        conexion = self._conexion()
+        fila = conexion.execute("SELECT valor, usado FROM resultados WHERE clave = ?", (clave,)).fetchone()
+        if fila is None:
+            return False, None
+        try:
+            valor = pickle.loads(fila[0])
+        except Exception:
+            # Ilegible (p. ej. de otra versión de una biblioteca): se descarta y se recalcula
+            self._contar("errores")
+            conexion.execute("DELETE FROM resultados WHERE clave = ?", (clave,))
+            return False, None
+        ahora = time.time()
+        if ahora - fila[1] > REFRESCAR_USO:
+            conexion.execute("UPDATE resultados SET usado = ? WHERE clave = ?", (ahora, clave))
+        return True, valor
+
+    def guardar(self, clave, valor, huella=""):
+        conexion = self._conexion()
+        datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        with conexion:
+            conexion.execute("INSERT OR REPLACE INTO resultados (clave, valor, reglas, usado) VALUES (?, ?, ?, ?)",
+                             (clave, datos, huella, time.time()))
+            self._desalojar(conexion)
+
+    def _tamano(self, conexion):
+        # Páginas en uso: lo borrado vuelve a la lista libre y se reutiliza, así el archivo no crece de más
+        paginas = conexion.execute("PRAGMA page_count").fetchone()[0]
+        libres = conexion.execute("PRAGMA freelist_count").fetchone()[0]
+        return (paginas - libres) * conexion.execute("PRAGMA page_size").fetchone()[0]
+
+    def _desalojar(self, conexion):
+        # Con el índice por uso, ver si hay algo vencido es una sola búsqueda
+        vencidas = conexion.execute("DELETE FROM resultados WHERE usado < ?",
+                                    (time.time() - self.maxima_edad,)).rowcount
+        if vencidas:
+            self._contar("desalojos", vencidas)
+        while self._tamano(conexion) > self.maximo_bytes:
+            total = conexion.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+            if total <= 1:
+                return
+            borradas = conexion.execute(
+                "DELETE FROM resultados WHERE clave IN (SELECT clave FROM resultados ORDER BY usado LIMIT ?)",
+                (max(1, int(total * FRACCION_DESALOJO)),)).rowcount
+            self._contar("desalojos", borradas)
+
+    def obtener(self, partes, calcular):
+        """Valor guardado para la tupla `partes`; si no existe lo calcula con calcular() y lo guarda"""
+        clave = clave_estable(*partes)
+        try:
+            encontrado, valor = self.leer(clave)
+        except sqlite3.Error:
+            self._contar("errores")
+            return calcular()
+        if encontrado:
+            self._contar("aciertos")
+            return valor
+        self._contar("fallos")
+
+        valor = calcular()
+        try:
+            self.guardar(clave, valor, _huella(partes))
+        except (sqlite3.Error, pickle.PicklingError):
+            self._contar("errores")
+        return valor
+
+    def purgar(self, huellas):
+        """Borra los resultados de reglas cuya huella no está en `huellas` (mantenimiento, no se llama sola)"""
+        huellas = list(huellas)
+        marcas = ", ".join("?" * len(huellas)) or "NULL"
+        with self._conexion() as conexion:
+            return conexion.execute(f"DELETE FROM resultados WHERE reglas != '' AND reglas NOT IN ({marcas})",
+                                    huellas).rowcount
+
+    def limpiar(self):
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM resultados")
+        with self._candado:
+            self.aciertos = self.fallos = self.desalojos = self.errores = 0
+
+    def estadisticas(self):
+        conexion = self._conexion()
+        entradas = conexion.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+        tamano = self._tamano(conexion)
+        with self._candado:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'errores': self.errores,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+                'entradas': entradas,
+                'bytes': tamano,
+                'maximo_bytes': self.maximo_bytes,
+            }
+
+    def __len__(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+
+# ============================================
+# CACHÉ DEL PROCESO
+# ============================================
+
+_cache = None
+_candado_cache = threading.Lock()
+
+def _ruta():
+    return RUTA or ARCHIVO_CACHE
+
+def obtener_cache():
+    """Caché del proceso en RUTA; None si está desactivada o no se pudo abrir"""
+    global _cache, RUTA
+    with _candado_cache:
+        if RUTA is None:
+            return None
+        if _cache is None or _cache.ruta != RUTA:
+            try:
+                _cache = CachePersistente(RUTA)
+            except sqlite3.Error:
+                RUTA = None
+                return None
+        return _cache
+
+def activar(ruta=ARCHIVO_CACHE):
+    """Activa la caché en disco de todo el proceso en `ruta`; activar(None) la desactiva"""
+    global RUTA
+    with _candado_cache:
+        RUTA = None if ruta is None else os.fspath(ruta)
+
+def obtener(partes, calcular):
+    """Como CachePersistente.obtener con la caché del proceso; sin caché solo calcula"""
+    cache = obtener_cache()
+    if cache is None:
+        return calcular()
+    return cache.obtener(partes, calcular)
+
+# ============================================
+# MANTENIMIENTO
+# ============================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulador_imss.persistente",
+                                     description="Mantenimiento de la caché de resultados en disco")
+    parser.add_argument("--ruta", default=None, help=f"archivo de la caché (default ${VARIABLE_RUTA} o {ARCHIVO_CACHE})")
+    acciones = parser.add_mutually_exclusive_group(required=True)
+    acciones.add_argument("--estadisticas", action="store_true", help="entradas y tamaño")
+    acciones.add_argument("--purgar", action="store_true",
+                          help="borrar los resultados de reglas que ya no están en reglas/*.json "
+                               "(cuando ningún proceso use ya las anteriores)")
+    acciones.add_argument("--limpiar", action="store_true", help="borrar todo")
+    args = parser.parse_args(argv)
+
+    ruta = args.ruta or _ruta()
+    if not os.path.exists(ruta):
+        print(f"❌ No existe {ruta}", file=sys.stderr)
+        return 1
+    try:
+        cache = CachePersistente(ruta)
+        if args.purgar:
+            from .parametros import REGLAS
+            borradas = cache.purgar(r.huella for r in REGLAS.values())
+            print(f"✅ {borradas:,} resultados de reglas anteriores borrados")
+        elif args.limpiar:
+            cache.limpiar()
+            print(f"✅ {ruta} vacía")
+        datos = cache.estadisticas()
+    except sqlite3.Error as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(f"{ruta}: {datos['entradas']:,} entradas, {datos['bytes'] / 2**20:.1f} MB "
+          f"de {datos['maximo_bytes'] / 2**20:.0f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
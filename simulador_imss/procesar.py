@@ -0,0 +1,256 @@
+"""Procesamiento por bloques de archivos de clientes (CSV/Parquet)
+
+Lee el archivo en bloques de tamaño fijo, calcula cada fila con el motor
+vectorizado y escribe los resultados conforme avanza, así que la memoria
+no crece con el tamaño del archivo.
+
+Uso:
+    python -m simulador_imss.procesar clientes.csv resultados.csv
+    python -m simulador_imss.procesar clientes.parquet resultados.parquet --bloque 500000 --reanudar
+    python -m simulador_imss.procesar clientes.csv resultados.csv --bloque 4000000 --procesos 32
+    python -m simulador_imss.procesar clientes.csv planes.csv --meta 30000
+
+Columnas requeridas: semanas, salario, edad_actual, edad_retiro.
+Opcionales: esposa (por defecto True); salario_m40 y meses_m40 (si ambas
+existen se agregan las columnas de Modalidad 40, si no solo la pensión base);
+reglas (versión de reglas por fila) y año_inicio_m40. Con una columna meta
+(o --meta) se busca el plan M40 más barato para llegar a esa pensión mensual;
+el plan sale en plan_salario_m40, plan_meses_m40 (0 = no hace falta M40) y
+plan_edad_retiro.
+
+Una salida .csv es un solo archivo; una salida .parquet es un directorio
+con una parte por bloque. El avance se guarda en <salida>.progreso.json
+para poder continuar con --reanudar desde el último bloque terminado.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from .lote import calcular_pension_lote, calcular_mod40_lote
+from .optimizador import meta_mod40_lote
+from .paralelo import CalculadorParalelo, TAMANO_BLOQUE as TAMANO_BLOQUE_PROCESO
+
+COLUMNAS_BASE = ("semanas", "salario", "edad_actual", "edad_retiro")
+COLUMNAS_M40 = ("salario_m40", "meses_m40")
+COLUMNAS_META = ("semanas", "salario", "edad_actual", "meta")
+# Columnas del plan que también pueden venir en la entrada: el plan va como plan_<columna>
+COLUMNAS_PLAN = ("salario_m40", "meses_m40", "edad_retiro")
+
+TAMANO_BLOQUE = 250_000
+
+# ============================================
+# CÁLCULO POR BLOQUE
+# ============================================
+
+def calcular_bloque(bloque, calculador=None):
+    """Agrega al DataFrame las columnas de resultado del motor"""
+    if "meta" in bloque:
+        return calcular_meta(bloque)
+    faltantes = [c for c in COLUMNAS_BASE if c not in bloque]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+
+    if all(c in bloque for c in COLUMNAS_M40):
+        if calculador is not None:
+            resultado = calculador.calcular_mod40(bloque)
+        else:
+            resultado = calcular_mod40_lote(bloque)
+    else:
+        resultado = calcular_pension_lote(bloque)
+    return bloque.assign(**resultado)
+
+def calcular_meta(bloque):
+    """Agrega el plan M40 más barato para llegar a la columna meta (NaN si no se alcanza)"""
+    faltantes = [c for c in COLUMNAS_META if c not in bloque]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+    reglas = bloque["reglas"].iloc[0] if "reglas" in bloque and len(bloque) else None
+    if "reglas" in bloque and bloque["reglas"].nunique() > 1:
+        # La búsqueda inversa trabaja con una versión a la vez
+        partes = [calcular_meta(parte) for _, parte in bloque.groupby("reglas", sort=False)]
+        return pd.concat(partes).loc[bloque.index]
+    plan = meta_mod40_lote(bloque, reglas=reglas)
+    return bloque.assign(**{f"plan_{c}" if c in COLUMNAS_PLAN else c: v for c, v in plan.items()})
+
+# ============================================
+# LECTURA Y ESCRITURA INCREMENTAL
+# ============================================
+
+def _es_parquet(ruta):
+    return ruta.lower().rstrip("/\\").endswith(".parquet")
+
+def leer_bloques(ruta, tamano=TAMANO_BLOQUE, saltar_filas=0):
+    """Genera DataFrames de a lo más `tamano` filas, omitiendo las primeras `saltar_filas`"""
+    if _es_parquet(ruta):
+        vistas = 0
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=tamano):
+            inicio = max(0, saltar_filas - vistas)
+            vistas += lote.num_rows
+            if inicio >= lote.num_rows:
+                continue
+            yield lote.slice(inicio).to_pandas()
+    else:
+        # Se descartan bloques completos: skiprows=range(...) arma un conjunto del tamaño del salto
+        vistas = 0
+        for bloque in pd.read_csv(ruta, chunksize=tamano):
+            inicio = max(0, saltar_filas - vistas)
+            vistas += len(bloque)
+            if inicio >= len(bloque):
+                continue
+            yield bloque.iloc[inicio:] if inicio else bloque
+
+class _SalidaCSV:
+    """Un solo CSV; al reanudar se recorta al último bloque confirmado"""
+
+    def __init__(self, ruta, progreso):
+        self.ruta = ruta
+        if progreso["filas"]:
+            if not os.path.exists(ruta):
+                raise ValueError(f"No se encontró {ruta} para reanudar")
+            self.archivo = open(ruta, "r+b")
+            self.archivo.truncate(progreso["bytes"])
+        else:
+            self.archivo = open(ruta, "wb")
+        self.archivo.seek(0, os.SEEK_END)
+        self.encabezado = progreso["filas"] == 0
+
+    def escribir(self, df, numero):
+        # pyarrow escribe CSV ~8x más rápido que DataFrame.to_csv
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        pa_csv.write_csv(tabla, self.archivo, pa_csv.WriteOptions(include_header=self.encabezado))
+        self.encabezado = False
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+        return self.archivo.tell()
+
+    def cerrar(self):
+        self.archivo.close()
+
+class _SalidaParquet:
+    """Directorio con una parte Parquet por bloque"""
+
+    def __init__(self, ruta, progreso):
+        self.ruta = ruta
+        if progreso["filas"] == 0 and os.path.isdir(ruta):
+            shutil.rmtree(ruta)
+        os.makedirs(ruta, exist_ok=True)
+
+    def escribir(self, df, numero):
+        destino = os.path.join(self.ruta, f"parte-{numero:06d}.parquet")
+        df.to_parquet(destino + ".tmp", index=False)
+        os.replace(destino + ".tmp", destino)
+        return 0
+
+    def cerrar(self):
+        pass
+
+def _ruta_progreso(salida):
+    return salida.rstrip("/\\") + ".progreso.json"
+
+def _leer_progreso(salida, entrada, reanudar):
+    nuevo = {"entrada": os.path.abspath(entrada), "bloques": 0, "filas": 0, "bytes": 0, "completo": False}
+    ruta = _ruta_progreso(salida)
+    if not reanudar or not os.path.exists(ruta):
+        return nuevo
+    with open(ruta, "r") as f:
+        progreso = json.load(f)
+    if progreso.get("entrada") != nuevo["entrada"]:
+        raise ValueError(f"El progreso en {ruta} corresponde a otro archivo: {progreso.get('entrada')}")
+    return progreso
+
+def _guardar_progreso(salida, progreso):
+    ruta = _ruta_progreso(salida)
+    with open(ruta + ".tmp", "w") as f:
+        json.dump(progreso, f, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+
+# ============================================
+# PROCESO COMPLETO
+# ============================================
+
+def procesar_archivo(entrada, salida, tamano=TAMANO_BLOQUE, reanudar=False, reporte=None, calculador=None, meta=None):
+    """Calcula todo el archivo por bloques; devuelve el progreso final
+
+    `calculador` (un CalculadorParalelo) reparte cada bloque entre procesos;
+    `meta` busca para todas las filas el plan M40 más barato para esa pensión.
+    """
+    reporte = reporte or sys.stderr
+    progreso = _leer_progreso(salida, entrada, reanudar)
+    if progreso["completo"]:
+        print(f"✅ {salida} ya estaba completo ({progreso['filas']:,} filas)", file=reporte)
+        return progreso
+    if progreso["filas"]:
+        print(f"↻ Reanudando después de {progreso['filas']:,} filas ({progreso['bloques']} bloques)", file=reporte)
+
+    escritor = _SalidaParquet(salida, progreso) if _es_parquet(salida) else _SalidaCSV(salida, progreso)
+    inicio = time.perf_counter()
+    filas_sesion = 0
+    try:
+        for bloque in leer_bloques(entrada, tamano, progreso["filas"]):
+            t0 = time.perf_counter()
+            if meta is not None:
+                bloque = bloque.assign(meta=meta)
+            resultado = calcular_bloque(bloque, calculador)
+            progreso["bytes"] = escritor.escribir(resultado, progreso["bloques"])
+            progreso["bloques"] += 1
+            progreso["filas"] += len(bloque)
+            _guardar_progreso(salida, progreso)
+
+            filas_sesion += len(bloque)
+            transcurrido = time.perf_counter() - t0
+            print(f"bloque {progreso['bloques']}: {len(bloque):,} filas "
+                  f"({len(bloque) / max(transcurrido, 1e-9):,.0f} filas/s) - total {progreso['filas']:,}",
+                  file=reporte)
+    finally:
+        escritor.cerrar()
+
+    progreso["completo"] = True
+    _guardar_progreso(salida, progreso)
+    total = time.perf_counter() - inicio
+    print(f"✅ {filas_sesion:,} filas en {total:.2f} s ({filas_sesion / max(total, 1e-9):,.0f} filas/s)", file=reporte)
+    return progreso
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m simulador_imss.procesar",
+        description="Calcula pensión Ley 73 / Modalidad 40 para un archivo de clientes por bloques")
+    parser.add_argument("entrada", help="archivo de clientes (.csv o .parquet)")
+    parser.add_argument("salida", help="archivo de resultados (.csv) o directorio (.parquet)")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help=f"filas por bloque (default {TAMANO_BLOQUE:,})")
+    parser.add_argument("--reanudar", action="store_true", help="continuar desde el último bloque terminado")
+    parser.add_argument("--procesos", type=int, default=1, help="procesos para Modalidad 40 (0 = todos los núcleos)")
+    parser.add_argument("--meta", type=float, default=None,
+                        help="pensión mensual meta para todos los clientes (plan M40 más barato)")
+    parser.add_argument("--bloque-proceso", type=int, default=TAMANO_BLOQUE_PROCESO,
+                        help=f"filas por tarea de cada proceso (default {TAMANO_BLOQUE_PROCESO:,})")
+    args = parser.parse_args(argv)
+
+    if args.bloque <= 0 or args.bloque_proceso <= 0:
+        parser.error("--bloque y --bloque-proceso deben ser mayores que cero")
+    if args.procesos < 0:
+        parser.error("--procesos no puede ser negativo")
+
+    calculador = None
+    if args.procesos != 1:
+        calculador = CalculadorParalelo(args.procesos or None, args.bloque_proceso)
+    try:
+        procesar_archivo(args.entrada, args.salida, args.bloque, args.reanudar, calculador=calculador, meta=args.meta)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        if calculador is not None:
+            calculador.cerrar()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
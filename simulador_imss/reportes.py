@@ -0,0 +1,804 @@
+"""Reporte para el cliente en PDF y XLSX, generado en segundo plano
+
+El reporte trae los datos del cliente, la pensión base, la tabla de la
+comparativa M40 y la gráfica Base vs Con M40. Ambos formatos se escriben
+con la biblioteca estándar (el PDF dibuja la gráfica con vectores y el
+XLSX lleva una gráfica nativa de Excel), así que no hay dependencias de
+render ni navegador.
+
+GENERADOR atiende a la app: cada reporte se genera en un hilo aparte y
+se guarda por hash del escenario, así que volver a descargarlo es
+inmediato. El escenario lleva la fecha del reporte: los bytes dependen
+solo de él. generar_zip reparte miles de reportes entre procesos y los
+escribe en un zip conforme terminan; verificar_reporte revisa la
+estructura de un PDF o XLSX ya generado.
+
+Uso:
+    python -m simulador_imss.reportes clientes.csv reportes.zip
+    python -m simulador_imss.reportes clientes.csv reportes.zip --formato pdf xlsx --procesos 8 --verificar
+
+Columnas: semanas, salario, edad_actual, edad_retiro; opcionales nombre,
+esposa, salario_m40 (por defecto el tope de 25 UMA), reglas y fecha
+(AAAA-MM-DD, por defecto hoy).
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+import unicodedata
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from . import motor
+from .cache import CacheLRU
+from .lote import calcular_mod40_lote
+from .parametros import obtener_reglas
+
+FORMATOS = ("pdf", "xlsx")
+MESES_REPORTE = (6, 12, 18, 24, 30, 36, 42, 48)
+
+# Cambia cuando cambia el diseño: invalida los reportes guardados
+VERSION_REPORTE = 1
+
+REPORTES_EN_CACHE = 256
+HILOS = 2
+ESCENARIOS_POR_TAREA = 32
+
+AZUL = (0.0, 0.4, 0.702)
+GRIS = (0.6, 0.6, 0.6)
+VERDE = (0.0, 0.659, 0.42)
+
+# ============================================
+# ESCENARIO Y DATOS
+# ============================================
+
+def escenario_reporte(semanas, salario, edad_actual, edad_retiro, esposa=True, salario_m40=None,
+                      meses=MESES_REPORTE, reglas=None, nombre="", fecha=None, historial=None):
+    """Escenario normalizado (mismos valores => mismo hash)
+
+    `fecha` (date o 'AAAA-MM-DD', por defecto hoy) es la que imprime el
+    reporte, así que el mismo cliente otro día es otro reporte. Con
+    `historial` (un cliente) cada fila usa su promedio exacto con M40.
+    """
+    reglas = obtener_reglas(reglas)
+    salario_m40 = float(reglas.tope_salario if salario_m40 is None else salario_m40)
+    promedios_m40 = None
+    if historial is not None:
+        if len(historial) != 1:
+            raise ValueError(f"El reporte es de un cliente y el historial trae {len(historial)}")
+        promedios_m40 = [float(historial.promedio_m40(salario_m40, m, reglas)[0]) for m in meses]
+    return {
+        'nombre': str(nombre).strip(),
+        'fecha': date.fromisoformat(str(fecha or date.today())).isoformat(),
+        'semanas': float(semanas),
+        'salario': float(salario),
+        'edad_actual': float(edad_actual),
+        'edad_retiro': float(edad_retiro),
+        'esposa': bool(esposa),
+        'salario_m40': salario_m40,
+        'meses': [float(m) for m in meses],
+        'promedios_m40': promedios_m40,
+        'reglas': reglas.version,
+    }
+
+def clave_reporte(escenario, formato):
+    texto = json.dumps([VERSION_REPORTE, formato, escenario], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+def datos_reporte(escenario):
+    """Pensión base y una fila de comparativa por cada meses (una sola llamada en lote)"""
+    e = escenario
+    base = motor.calcular_pension(e['semanas'], e['salario'], e['edad_actual'], e['edad_retiro'], e['esposa'],
+                                  reglas=e['reglas'])
+    promedios = e['promedios_m40']
+    res = calcular_mod40_lote(semanas=e['semanas'], salario=e['salario'], edad_actual=e['edad_actual'],
+                              edad_retiro=e['edad_retiro'], salario_m40=e['salario_m40'],
+                              meses_m40=np.asarray(e['meses']), esposa=e['esposa'], reglas=e['reglas'],
+                              promedio_m40=None if promedios is None else np.asarray(promedios, dtype=np.float64))
+    columnas = {campo: valores.tolist() for campo, valores in res.items()}
+    filas = [{'meses': m, **{campo: valores[i] for campo, valores in columnas.items()}}
+             for i, m in enumerate(e['meses'])]
+    return base, filas
+
+def _pesos(valor, decimales=0):
+    return f"${valor:,.{decimales}f}"
+
+def _entero(valor):
+    return f"{valor:.0f}"
+
+def _tipo_promedio(e):
+    return "Ponderado" if e['promedios_m40'] is None else "Exacto (historial)"
+
+def _datos_cliente(e):
+    return [
+        ("Semanas cotizadas", _entero(e['semanas'])),
+        ("Salario promedio diario", _pesos(e['salario'], 2)),
+        ("Edad actual", _entero(e['edad_actual'])),
+        ("Edad de retiro", _entero(e['edad_retiro'])),
+        ("Asignación por esposa", "Sí" if e['esposa'] else "No"),
+        ("Salario diario en M40", _pesos(e['salario_m40'], 2)),
+        ("Reglas de cálculo", e['reglas']),
+        ("Promedio con M40", _tipo_promedio(e)),
+    ]
+
+COLUMNAS_TABLA = ("Meses", "Pensión con M40", "Incremento", "Inversión", "Recuperación", "Utilidad 20a", "ROI")
+
+def _fila_tabla(f):
+    return (_entero(f['meses']), _pesos(f['con_m40']), _pesos(f['incremento']), _pesos(f['inversion']),
+            f"{f['recuperacion_meses']:.1f} meses", _pesos(f['utilidad_20']), f"{f['roi']:.0f}%")
+
+# ============================================
+# PDF
+# ============================================
+
+# Anchos de Helvetica (milésimas del tamaño de letra); el resto se toma como 556
+_ANCHOS = {
+    " ": 278, "!": 278, "$": 556, "%": 889, "(": 333, ")": 333, ",": 278, "-": 333, ".": 278, "/": 278,
+    ":": 278, "I": 278, "J": 500, "L": 556, "M": 833, "W": 944, "C": 722, "D": 722, "G": 778, "H": 722,
+    "N": 722, "O": 778, "Q": 778, "R": 722, "U": 722, "F": 611, "T": 611, "Z": 611,
+    "c": 500, "f": 278, "i": 222, "j": 222, "k": 500, "l": 222, "m": 833, "r": 333, "s": 500, "t": 278,
+    "v": 500, "w": 722, "x": 500, "y": 500, "z": 500,
+}
+
+def _ancho(texto, tamano):
+    return sum(_ANCHOS.get(unicodedata.normalize("NFD", c)[0], 556) for c in texto) * tamano / 1000
+
+def _literal(texto):
+    """Texto para una cadena (...) de PDF: \\, ( y ) escapados"""
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _rgb(color):
+    return " ".join(f"{c:.3f}" for c in color)
+
+class _PDF:
+    """Una página carta con texto Helvetica (WinAnsi), rectángulos y líneas"""
+
+    ANCHO, ALTO = 612, 792
+
+    def __init__(self):
+        self._ops = []
+
+    def texto(self, x, y, texto, tamano=10, negrita=False, color=(0, 0, 0), alinear="izq"):
+        if alinear == "der":
+            x -= _ancho(texto, tamano)
+        elif alinear == "centro":
+            x -= _ancho(texto, tamano) / 2
+        self._ops.append(f"BT /{'F2' if negrita else 'F1'} {tamano} Tf {_rgb(color)} rg "
+                         f"{x:.2f} {y:.2f} Td ({_literal(texto)}) Tj ET")
+
+    def rect(self, x, y, ancho, alto, color):
+        self._ops.append(f"{_rgb(color)} rg {x:.2f} {y:.2f} {ancho:.2f} {alto:.2f} re f")
+
+    def linea(self, x1, y1, x2, y2, color=(0.8, 0.8, 0.8), grosor=0.5):
+        self._ops.append(f"{_rgb(color)} RG {grosor} w {x1:.2f} {y1:.2f} m {x2:.2f} {y2:.2f} l S")
+
+    def bytes(self, titulo=""):
+        contenido = zlib.compress("\n".join(self._ops).encode("cp1252", "replace"))
+        objetos = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.ANCHO} {self.ALTO}] "
+             f"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>").encode("ascii"),
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+            f"<< /Length {len(contenido)} /Filter /FlateDecode >>\nstream\n".encode("ascii") + contenido + b"\nendstream",
+            b"<< /Title (" + _literal(titulo).encode("cp1252", "replace") + b") /Producer (simulador_imss) >>",
+        ]
+        salida = io.BytesIO()
+        salida.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        posiciones = []
+        for i, objeto in enumerate(objetos, start=1):
+            posiciones.append(salida.tell())
+            salida.write(f"{i} 0 obj\n".encode("ascii") + objeto + b"\nendobj\n")
+        inicio_xref = salida.tell()
+        salida.write(f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode("ascii"))
+        for posicion in posiciones:
+            salida.write(f"{posicion:010d} 00000 n \n".encode("ascii"))
+        salida.write(f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R /Info {len(objetos)} 0 R >>\n"
+                     f"startxref\n{inicio_xref}\n%%EOF\n".encode("ascii"))
+        return salida.getvalue()
+
+def _escala(maximo, divisiones=5):
+    """Paso 'redondo' (1, 2 o 5 × 10^k) para el eje de la gráfica"""
+    bruto = maximo / divisiones if maximo > 0 else 1
+    potencia = 10 ** np.floor(np.log10(bruto))
+    return next(p * potencia for p in (1, 2, 5, 10) if p * potencia >= bruto)
+
+def _grafica_pdf(pdf, x0, y0, ancho, alto, base, filas):
+    """Barras agrupadas Base vs Con M40, igual que la gráfica de la comparativa"""
+    valores = [base['mensual']] + [f['con_m40'] for f in filas]
+    paso = _escala(max(valores) * 1.1)
+    tope = paso * np.ceil(max(valores) * 1.1 / paso)
+
+    pdf.texto(x0, y0 + alto + 24, "Pensión mensual con y sin Modalidad 40", 12, negrita=True)
+    pdf.rect(x0 + ancho - 170, y0 + alto + 25, 8, 8, GRIS)
+    pdf.texto(x0 + ancho - 158, y0 + alto + 26, "Base (sin M40)", 8)
+    pdf.rect(x0 + ancho - 80, y0 + alto + 25, 8, 8, AZUL)
+    pdf.texto(x0 + ancho - 68, y0 + alto + 26, "Con M40", 8)
+
+    marca = 0.0
+    while marca <= tope + 1e-9:
+        y = y0 + alto * marca / tope
+        pdf.linea(x0, y, x0 + ancho, y)
+        pdf.texto(x0 - 4, y - 3, _pesos(marca), 7, color=(0.4, 0.4, 0.4), alinear="der")
+        marca += paso
+
+    grupo = ancho / len(filas)
+    barra = grupo * 0.36
+    for i, f in enumerate(filas):
+        centro = x0 + grupo * (i + 0.5)
+        for valor, color, x in ((base['mensual'], GRIS, centro - barra), (f['con_m40'], AZUL, centro)):
+            h = alto * valor / tope
+            pdf.rect(x, y0, barra, h, color)
+            pdf.texto(x + barra / 2, y0 + h + 2, _pesos(valor), 5.5, alinear="centro")
+        pdf.texto(centro, y0 - 11, f"{f['meses']:.0f} meses", 7.5, alinear="centro")
+    pdf.linea(x0, y0, x0 + ancho, y0, color=(0.3, 0.3, 0.3), grosor=0.8)
+    pdf.texto(x0 + ancho / 2, y0 - 24, "Meses en M40", 8, alinear="centro")
+
+def reporte_pdf(escenario):
+    e = escenario
+    base, filas = datos_reporte(e)
+    pdf = _PDF()
+    izq, der = 50, _PDF.ANCHO - 50
+
+    pdf.rect(0, 742, _PDF.ANCHO, 50, AZUL)
+    pdf.texto(izq, 768, "SIMULADOR DE PENSIÓN IMSS", 18, negrita=True, color=(1, 1, 1))
+    pdf.texto(izq, 752, "Ley 73 - Art. 167 con Modalidad 40", 10, color=(0.88, 0.88, 0.88))
+    pdf.texto(der, 768, e['nombre'] or "Reporte para el cliente", 11, negrita=True, color=(1, 1, 1), alinear="der")
+    pdf.texto(der, 752, date.fromisoformat(e['fecha']).strftime("%d/%m/%Y"), 9, color=(0.88, 0.88, 0.88),
+              alinear="der")
+
+    # Datos del cliente en dos columnas
+    y = 718
+    pdf.texto(izq, y, "Datos del cliente", 12, negrita=True, color=AZUL)
+    datos = _datos_cliente(e)
+    for i, (etiqueta, valor) in enumerate(datos):
+        x = izq if i < 4 else 320
+        fila_y = y - 16 - 14 * (i % 4)
+        pdf.texto(x, fila_y, etiqueta, 9, color=(0.4, 0.4, 0.4))
+        pdf.texto(x + 240 if i < 4 else der, fila_y, valor, 9, negrita=True, alinear="der")
+
+    # Pensión base
+    y = 632
+    pdf.rect(izq, y - 36, der - izq, 44, (0.93, 0.96, 0.99))
+    pdf.texto(izq + 12, y - 10, "PENSIÓN BASE MENSUAL (sin M40)", 10, negrita=True, color=AZUL)
+    pdf.texto(izq + 12, y - 26, f"Anual {_pesos(base['anual'], 2)} | Semanas al retiro {base['semanas_60']:.0f} | "
+              f"Factor por edad {base['factor_edad'] * 100:.0f}%", 8, color=(0.4, 0.4, 0.4))
+    pdf.texto(der - 12, y - 22, _pesos(base['mensual'], 2), 20, negrita=True, color=AZUL, alinear="der")
+
+    # Tabla de la comparativa
+    y = 574
+    pdf.texto(izq, y, "Comparativa de escenarios Modalidad 40", 12, negrita=True, color=AZUL)
+    derechas = (82, 172, 242, 318, 386, 462, der - 4)
+    y -= 22
+    pdf.rect(izq, y - 4, der - izq, 16, AZUL)
+    for x, titulo in zip(derechas, COLUMNAS_TABLA):
+        pdf.texto(x, y + 1, titulo, 8, negrita=True, color=(1, 1, 1), alinear="der")
+    for i, f in enumerate(filas):
+        y -= 15
+        if i % 2:
+            pdf.rect(izq, y - 4, der - izq, 15, (0.95, 0.95, 0.95))
+        for x, valor in zip(derechas, _fila_tabla(f)):
+            pdf.texto(x, y, valor, 8, alinear="der")
+
+    mejor = max(filas, key=lambda f: f['utilidad_20'])
+    y -= 20
+    pdf.texto(izq, y, f"Mayor utilidad a 20 años: {mejor['meses']:.0f} meses en M40, "
+              f"+{_pesos(mejor['incremento'])} al mes ({_pesos(mejor['utilidad_20'])}).", 9, negrita=True, color=VERDE)
+
+    _grafica_pdf(pdf, izq + 40, 110, der - izq - 40, y - 190, base, filas)
+
+    pdf.linea(izq, 60, der, 60)
+    pdf.texto(izq, 48, "Estimación con fines informativos basada en la Ley del Seguro Social de 1973. "
+              "No sustituye la resolución del IMSS.", 7, color=(0.5, 0.5, 0.5))
+    return pdf.bytes(titulo=f"Simulación de pensión {e['nombre']}".strip())
+
+# ============================================
+# XLSX
+# ============================================
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+_NS_CHART = "http://schemas.openxmlformats.org/drawingml/2006/chart"
+_NS_DRAW = "http://schemas.openxmlformats.org/drawingml/2006/main"
+_NS_XDR = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+_TIPO = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+_CONTENIDO = "application/vnd.openxmlformats-officedocument."
+
+# Estilos (índices de cellXfs en _ESTILOS)
+NORMAL, NEGRITA, PESOS_CENTAVOS, PESOS, ENCABEZADO, TITULO, DECIMAL = range(7)
+
+_ESTILOS = f"""{_XML}<styleSheet xmlns="{_NS_MAIN}">
+<numFmts count="3"><numFmt numFmtId="164" formatCode="&quot;$&quot;#,##0.00"/><numFmt numFmtId="165" formatCode="&quot;$&quot;#,##0"/><numFmt numFmtId="166" formatCode="0.0"/></numFmts>
+<fonts count="4"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font><font><b/><sz val="16"/><color rgb="FF0066B3"/><name val="Calibri"/></font></fonts>
+<fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill><fill><patternFill patternType="solid"><fgColor rgb="FF0066B3"/><bgColor indexed="64"/></patternFill></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="7"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/><xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/><xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/><xf numFmtId="0" fontId="2" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1"/><xf numFmtId="0" fontId="3" fillId="0" borderId="0" xfId="0" applyFont="1"/><xf numFmtId="166" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+def _columna_excel(indice):
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+def _celda(ref, valor, estilo=NORMAL):
+    if isinstance(valor, str):
+        return f'<c r="{ref}" t="inlineStr" s="{estilo}"><is><t xml:space="preserve">{escape(valor)}</t></is></c>'
+    if isinstance(valor, bool):
+        return f'<c r="{ref}" t="b" s="{estilo}"><v>{int(valor)}</v></c>'
+    return f'<c r="{ref}" s="{estilo}"><v>{valor!r}</v></c>'
+
+def _hoja(filas, anchos, dibujo=False):
+    """filas: lista de listas de (valor, estilo) o None"""
+    xml = [f'{_XML}<worksheet xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><cols>']
+    xml += [f'<col min="{i}" max="{i}" width="{a}" customWidth="1"/>' for i, a in enumerate(anchos, start=1)]
+    xml.append("</cols><sheetData>")
+    for r, fila in enumerate(filas, start=1):
+        celdas = "".join(_celda(f"{_columna_excel(c)}{r}", *celda) for c, celda in enumerate(fila) if celda is not None)
+        xml.append(f'<row r="{r}">{celdas}</row>')
+    xml.append("</sheetData>")
+    if dibujo:
+        xml.append('<drawing r:id="rId1"/>')
+    xml.append("</worksheet>")
+    return "".join(xml)
+
+def _grafica_xlsx(base, filas):
+    """Columnas agrupadas que leen Comparativa!B (base) y C (con M40) por meses en A"""
+    n = len(filas)
+
+    def serie(i, columna, titulo, color, valores):
+        puntos = "".join(f'<c:pt idx="{j}"><c:v>{v!r}</c:v></c:pt>' for j, v in enumerate(valores))
+        categorias = "".join(f'<c:pt idx="{j}"><c:v>{f["meses"]!r}</c:v></c:pt>' for j, f in enumerate(filas))
+        return (f'<c:ser><c:idx val="{i}"/><c:order val="{i}"/>'
+                f'<c:tx><c:strRef><c:f>Comparativa!${columna}$1</c:f><c:strCache><c:ptCount val="1"/>'
+                f'<c:pt idx="0"><c:v>{escape(titulo)}</c:v></c:pt></c:strCache></c:strRef></c:tx>'
+                f'<c:spPr><a:solidFill><a:srgbClr val="{color}"/></a:solidFill></c:spPr><c:invertIfNegative val="0"/>'
+                f'<c:cat><c:numRef><c:f>Comparativa!$A$2:$A${n + 1}</c:f><c:numCache><c:formatCode>General</c:formatCode>'
+                f'<c:ptCount val="{n}"/>{categorias}</c:numCache></c:numRef></c:cat>'
+                f'<c:val><c:numRef><c:f>Comparativa!${columna}$2:${columna}${n + 1}</c:f><c:numCache>'
+                f'<c:formatCode>General</c:formatCode><c:ptCount val="{n}"/>{puntos}</c:numCache></c:numRef></c:val></c:ser>')
+
+    titulo = ('<c:title><c:tx><c:rich><a:bodyPr/><a:p><a:r><a:t>Pensión mensual con y sin Modalidad 40</a:t></a:r></a:p>'
+              '</c:rich></c:tx><c:overlay val="0"/></c:title>')
+    return (f'{_XML}<c:chartSpace xmlns:c="{_NS_CHART}" xmlns:a="{_NS_DRAW}" xmlns:r="{_NS_REL}">'
+            f'<c:chart>{titulo}<c:autoTitleDeleted val="0"/><c:plotArea><c:layout/>'
+            f'<c:barChart><c:barDir val="col"/><c:grouping val="clustered"/><c:varyColors val="0"/>'
+            + serie(0, "B", "Base (sin M40)", "999999", [base['mensual']] * n)
+            + serie(1, "C", "Con M40", "0066B3", [f['con_m40'] for f in filas])
+            + '<c:gapWidth val="80"/><c:axId val="1001"/><c:axId val="1002"/></c:barChart>'
+            '<c:catAx><c:axId val="1001"/><c:scaling><c:orientation val="minMax"/></c:scaling><c:delete val="0"/>'
+            '<c:axPos val="b"/><c:title><c:tx><c:rich><a:bodyPr/><a:p><a:r><a:t>Meses en M40</a:t></a:r></a:p></c:rich></c:tx>'
+            '<c:overlay val="0"/></c:title><c:numFmt formatCode="General" sourceLinked="1"/><c:tickLblPos val="nextTo"/>'
+            '<c:crossAx val="1002"/><c:crosses val="autoZero"/><c:auto val="1"/><c:lblAlgn val="ctr"/><c:lblOffset val="100"/></c:catAx>'
+            '<c:valAx><c:axId val="1002"/><c:scaling><c:orientation val="minMax"/></c:scaling><c:delete val="0"/>'
+            '<c:axPos val="l"/><c:majorGridlines/><c:numFmt formatCode="&quot;$&quot;#,##0" sourceLinked="0"/>'
+            '<c:tickLblPos val="nextTo"/><c:crossAx val="1001"/><c:crosses val="autoZero"/><c:crossBetween val="between"/></c:valAx>'
+            '</c:plotArea><c:legend><c:legendPos val="t"/><c:overlay val="0"/></c:legend><c:plotVisOnly val="1"/></c:chart>'
+            '</c:chartSpace>')
+
+_DIBUJO = (f'{_XML}<xdr:wsDr xmlns:xdr="{_NS_XDR}" xmlns:a="{_NS_DRAW}" xmlns:r="{_NS_REL}" xmlns:c="{_NS_CHART}">'
+           '<xdr:twoCellAnchor><xdr:from><xdr:col>9</xdr:col><xdr:colOff>0</xdr:colOff><xdr:row>1</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>'
+           '<xdr:to><xdr:col>19</xdr:col><xdr:colOff>0</xdr:colOff><xdr:row>22</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:to>'
+           '<xdr:graphicFrame macro=""><xdr:nvGraphicFramePr><xdr:cNvPr id="2" name="Comparativa"/><xdr:cNvGraphicFramePr/></xdr:nvGraphicFramePr>'
+           '<xdr:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/></xdr:xfrm><a:graphic><a:graphicData uri="' + _NS_CHART + '">'
+           '<c:chart r:id="rId1"/></a:graphicData></a:graphic></xdr:graphicFrame><xdr:clientData/></xdr:twoCellAnchor></xdr:wsDr>')
+
+def _relaciones(*relaciones):
+    return (f'{_XML}<Relationships xmlns="{_NS_PKG_REL}">'
+            + "".join(f'<Relationship Id="rId{i}" Type="{_TIPO}{tipo}" Target="{destino}"/>'
+                      for i, (tipo, destino) in enumerate(relaciones, start=1))
+            + "</Relationships>")
+
+def reporte_xlsx(escenario):
+    e = escenario
+    base, filas = datos_reporte(e)
+
+    resumen = [
+        [("Simulador de pensión IMSS - Ley 73", TITULO)],
+        [("Cliente", NEGRITA), (e['nombre'] or "-", NORMAL)],
+        [("Fecha", NEGRITA), (e['fecha'], NORMAL)],
+        [],
+        [("Datos del cliente", ENCABEZADO), ("", ENCABEZADO)],
+        [("Semanas cotizadas", NORMAL), (e['semanas'], NORMAL)],
+        [("Salario promedio diario", NORMAL), (e['salario'], PESOS_CENTAVOS)],
+        [("Edad actual", NORMAL), (e['edad_actual'], NORMAL)],
+        [("Edad de retiro", NORMAL), (e['edad_retiro'], NORMAL)],
+        [("Asignación por esposa", NORMAL), ("Sí" if e['esposa'] else "No", NORMAL)],
+        [("Salario diario en M40", NORMAL), (e['salario_m40'], PESOS_CENTAVOS)],
+        [("Reglas de cálculo", NORMAL), (e['reglas'], NORMAL)],
+        [("Promedio con M40", NORMAL), (_tipo_promedio(e), NORMAL)],
+        [],
+        [("Pensión base (sin M40)", ENCABEZADO), ("", ENCABEZADO)],
+        [("Pensión mensual", NEGRITA), (base['mensual'], PESOS_CENTAVOS)],
+        [("Pensión anual", NORMAL), (base['anual'], PESOS_CENTAVOS)],
+        [("Semanas al retiro", NORMAL), (base['semanas_60'], NORMAL)],
+        [("Factor por edad", NORMAL), (base['factor_edad'], NORMAL)],
+    ]
+    encabezados = ("Meses", "Pensión base", "Pensión con M40", "Incremento", "Inversión",
+                   "Recuperación (meses)", "Utilidad 20 años", "ROI (%)", "Nuevo promedio")
+    comparativa = [[(t, ENCABEZADO) for t in encabezados]]
+    for f in filas:
+        comparativa.append([(f['meses'], NORMAL), (base['mensual'], PESOS), (f['con_m40'], PESOS),
+                            (f['incremento'], PESOS), (f['inversion'], PESOS), (f['recuperacion_meses'], DECIMAL),
+                            (f['utilidad_20'], PESOS), (f['roi'], NORMAL), (f['nuevo_promedio'], PESOS_CENTAVOS)])
+
+    partes = {
+        "[Content_Types].xml": (
+            f'{_XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{_CONTENIDO}spreadsheetml.sheet.main+xml"/>'
+            f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{_CONTENIDO}spreadsheetml.worksheet+xml"/>'
+            f'<Override PartName="/xl/worksheets/sheet2.xml" ContentType="{_CONTENIDO}spreadsheetml.worksheet+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="{_CONTENIDO}spreadsheetml.styles+xml"/>'
+            f'<Override PartName="/xl/drawings/drawing1.xml" ContentType="{_CONTENIDO}drawing+xml"/>'
+            f'<Override PartName="/xl/charts/chart1.xml" ContentType="{_CONTENIDO}drawingml.chart+xml"/>'
+            '</Types>'),
+        "_rels/.rels": _relaciones(("officeDocument", "xl/workbook.xml")),
+        "xl/workbook.xml": (
+            f'{_XML}<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><sheets>'
+            '<sheet name="Resumen" sheetId="1" r:id="rId1"/><sheet name="Comparativa" sheetId="2" r:id="rId2"/>'
+            '</sheets></workbook>'),
+        "xl/_rels/workbook.xml.rels": _relaciones(("worksheet", "worksheets/sheet1.xml"),
+                                                  ("worksheet", "worksheets/sheet2.xml"), ("styles", "styles.xml")),
+        "xl/styles.xml": _ESTILOS,
+        "xl/worksheets/sheet1.xml": _hoja(resumen, (28, 22)),
+        "xl/worksheets/sheet2.xml": _hoja(comparativa, (8, 14, 16, 14, 14, 20, 17, 10, 16), dibujo=True),
+        "xl/worksheets/_rels/sheet2.xml.rels": _relaciones(("drawing", "../drawings/drawing1.xml")),
+        "xl/drawings/drawing1.xml": _DIBUJO,
+        "xl/drawings/_rels/drawing1.xml.rels": _relaciones(("chart", "../charts/chart1.xml")),
+        "xl/charts/chart1.xml": _grafica_xlsx(base, filas),
+    }
+    salida = io.BytesIO()
+    with zipfile.ZipFile(salida, "w", zipfile.ZIP_DEFLATED) as z:
+        for nombre, contenido in partes.items():
+            # Fecha fija en el zip: los bytes dependen solo del escenario, que ya trae la fecha del reporte
+            z.writestr(zipfile.ZipInfo(nombre, (1980, 1, 1, 0, 0, 0)), contenido.encode("utf-8"),
+                       compress_type=zipfile.ZIP_DEFLATED)
+    return salida.getvalue()
+
+_GENERADORES = {"pdf": reporte_pdf, "xlsx": reporte_xlsx}
+
+def generar_reporte(escenario, formato):
+    if formato not in _GENERADORES:
+        raise ValueError(f"Formato desconocido: {formato!r} (usa {', '.join(FORMATOS)})")
+    return _GENERADORES[formato](escenario)
+
+# ============================================
+# VERIFICACIÓN
+# ============================================
+
+_FIN_PDF = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+_XREF = re.compile(rb"xref\s+0 (\d+)\s+")
+_ENTRADA_XREF = re.compile(rb"(\d{10}) (\d{5}) ([nf])[ \r]\n")
+_TRAILER = re.compile(rb"trailer\s*<<(.*?)>>\s*startxref", re.S)
+_STREAM = re.compile(rb"/Length (\d+)(.*?)>>\s*stream\r?\n", re.S)
+
+def _revisar_sintaxis(datos, donde):
+    """Cadenas (...) cerradas (con \\ de escape y paréntesis anidados) y << >> balanceados"""
+    i, n, diccionarios = 0, len(datos), 0
+    while i < n:
+        c = datos[i:i + 1]
+        if c == b"(":
+            nivel, i = 1, i + 1
+            while i < n and nivel:
+                c = datos[i:i + 1]
+                if c == b"\\":
+                    i += 2
+                    continue
+                nivel += {b"(": 1, b")": -1}.get(c, 0)
+                i += 1
+            if nivel:
+                raise ValueError(f"Cadena sin cerrar en {donde}")
+            continue
+        if c == b")":
+            raise ValueError(f"Paréntesis de cierre sin cadena en {donde}")
+        if datos.startswith(b"<<", i) or datos.startswith(b">>", i):
+            diccionarios += 1 if c == b"<" else -1
+            if diccionarios < 0:
+                raise ValueError(f">> sin << en {donde}")
+            i += 2
+            continue
+        i += 1
+    if diccionarios:
+        raise ValueError(f"<< sin cerrar en {donde}")
+
+def _verificar_pdf(contenido):
+    """Revisa encabezado, tabla xref, trailer y streams del PDF de _PDF.bytes"""
+    if not contenido.startswith(b"%PDF-"):
+        raise ValueError("PDF sin encabezado %PDF-")
+    fin = _FIN_PDF.search(contenido)
+    if fin is None:
+        raise ValueError("PDF sin startxref / %%EOF al final")
+    xref = _XREF.match(contenido, int(fin.group(1)))
+    if xref is None:
+        raise ValueError(f"startxref {fin.group(1).decode()} no apunta a una tabla xref")
+    total = int(xref.group(1))
+    posicion, objetos = xref.end(), {}
+    for numero in range(total):
+        entrada = _ENTRADA_XREF.match(contenido, posicion)
+        if entrada is None:
+            raise ValueError(f"Entrada {numero} de la tabla xref mal formada")
+        posicion = entrada.end()
+        if entrada.group(3) == b"n":
+            objetos[numero] = int(entrada.group(1))
+    trailer = _TRAILER.match(contenido, posicion)
+    if trailer is None:
+        raise ValueError("Falta el trailer después de la tabla xref")
+    tamano = re.search(rb"/Size (\d+)", trailer.group(1))
+    raiz = re.search(rb"/Root (\d+) 0 R", trailer.group(1))
+    info = re.search(rb"/Info (\d+) 0 R", trailer.group(1))
+    if tamano is None or int(tamano.group(1)) != total:
+        raise ValueError(f"/Size del trailer no coincide con las {total} entradas de la tabla xref")
+    if raiz is None or int(raiz.group(1)) not in objetos:
+        raise ValueError("/Root del trailer no es un objeto de la tabla xref")
+    if info is not None and int(info.group(1)) not in objetos:
+        raise ValueError("/Info del trailer no es un objeto de la tabla xref")
+    diccionarios = {int(r.group(1)) for r in (raiz, info) if r is not None}
+
+    # Cada objeto termina donde empieza el siguiente (o la tabla xref): endobj podría aparecer dentro de un stream
+    limites = sorted(objetos.values()) + [int(fin.group(1))]
+    for numero, inicio in objetos.items():
+        if not contenido.startswith(f"{numero} 0 obj".encode("ascii"), inicio):
+            raise ValueError(f"La tabla xref apunta el objeto {numero} al byte {inicio}, donde no empieza")
+        limite = limites[limites.index(inicio) + 1]
+        cierre = contenido.rfind(b"endobj", inicio, limite)
+        if cierre < 0:
+            raise ValueError(f"El objeto {numero} no termina en endobj")
+        stream = _STREAM.search(contenido, inicio, cierre)
+        # El diccionario del objeto (sin el stream): el de /Info trae el título con el nombre del cliente
+        cuerpo = contenido[contenido.index(b"obj", inicio) + 3:stream.end() if stream else cierre]
+        _revisar_sintaxis(cuerpo, f"el objeto {numero}")
+        if numero in diccionarios and not (cuerpo.strip().startswith(b"<<") and cuerpo.strip().endswith(b">>")):
+            raise ValueError(f"El objeto {numero} (/Root o /Info) no es un diccionario")
+        if stream is None:
+            continue
+        datos = contenido[stream.end():stream.end() + int(stream.group(1))]
+        if not re.match(rb"\r?\nendstream", contenido[stream.end() + len(datos):]):
+            raise ValueError(f"/Length del stream del objeto {numero} no llega a endstream")
+        if b"/FlateDecode" in stream.group(2):
+            try:
+                datos = zlib.decompress(datos)
+            except zlib.error as e:
+                raise ValueError(f"Stream del objeto {numero} no se puede descomprimir: {e}") from None
+        # Los textos de la página son cadenas (...) Tj
+        _revisar_sintaxis(datos, f"el stream del objeto {numero}")
+    return len(objetos)
+
+def _verificar_xlsx(contenido):
+    """Revisa el paquete OOXML: zip, XML bien formado, tipos y relaciones; con openpyxl, además lo abre"""
+    try:
+        paquete = zipfile.ZipFile(io.BytesIO(contenido))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"XLSX no es un zip válido: {e}") from None
+    with paquete:
+        danado = paquete.testzip()
+        if danado is not None:
+            raise ValueError(f"Parte dañada en el XLSX: {danado}")
+        nombres = set(paquete.namelist())
+        partes = {}
+        for nombre in nombres:
+            try:
+                partes[nombre] = ElementTree.fromstring(paquete.read(nombre))
+            except ElementTree.ParseError as e:
+                raise ValueError(f"{nombre} no es XML válido: {e}") from None
+    if "[Content_Types].xml" not in partes:
+        raise ValueError("Falta [Content_Types].xml")
+    for tipo in partes["[Content_Types].xml"]:
+        parte = tipo.get("PartName", "").lstrip("/")
+        if parte and parte not in nombres:
+            raise ValueError(f"[Content_Types].xml declara {parte}, que no está en el paquete")
+    for nombre, xml in partes.items():
+        if not nombre.endswith(".rels"):
+            continue
+        # xl/_rels/workbook.xml.rels resuelve sus destinos desde xl/
+        carpeta = posixpath.dirname(posixpath.dirname(nombre))
+        for relacion in xml:
+            destino = relacion.get("Target", "")
+            destino = destino[1:] if destino.startswith("/") else posixpath.normpath(posixpath.join(carpeta, destino))
+            if destino not in nombres:
+                raise ValueError(f"{nombre} apunta a {destino}, que no está en el paquete")
+
+    try:
+        import openpyxl
+    except ImportError:
+        return len(nombres)
+    try:
+        libro = openpyxl.load_workbook(io.BytesIO(contenido))
+    except Exception as e:
+        raise ValueError(f"openpyxl no puede abrir el XLSX: {e}") from None
+    if libro.sheetnames != ["Resumen", "Comparativa"]:
+        raise ValueError(f"Hojas inesperadas en el XLSX: {libro.sheetnames}")
+    return len(nombres)
+
+_VERIFICADORES = {"pdf": _verificar_pdf, "xlsx": _verificar_xlsx}
+
+def verificar_reporte(contenido, formato):
+    """Revisa la estructura de un reporte generado; ValueError con el primer problema
+
+    PDF: la tabla xref y el trailer apuntan a objetos reales y cada stream
+    mide su /Length. XLSX: partes, tipos y relaciones del paquete, y que
+    openpyxl lo abra (si está instalado). Devuelve el número de objetos o
+    de partes revisados.
+    """
+    if formato not in _VERIFICADORES:
+        raise ValueError(f"Formato desconocido: {formato!r} (usa {', '.join(FORMATOS)})")
+    return _VERIFICADORES[formato](contenido)
+
+def verificar_zip(ruta):
+    """verificar_reporte para cada archivo de un zip de generar_zip; devuelve cuántos revisó"""
+    total = 0
+    with zipfile.ZipFile(ruta) as z:
+        for nombre in z.namelist():
+            try:
+                verificar_reporte(z.read(nombre), posixpath.splitext(nombre)[1].lstrip("."))
+            except ValueError as e:
+                raise ValueError(f"{nombre}: {e}") from None
+            total += 1
+    return total
+
+# ============================================
+# GENERACIÓN EN SEGUNDO PLANO
+# ============================================
+
+class GeneradorReportes:
+    """Genera reportes en hilos aparte; cada resultado (un Future) se guarda por hash del escenario"""
+
+    def __init__(self, hilos=HILOS, maximo=REPORTES_EN_CACHE):
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="reportes")
+        self.cache = CacheLRU(maximo)
+
+    def solicitar(self, escenario, formato):
+        """Future con los bytes del reporte; si ya se pidió, el mismo Future (terminado o en curso)
+
+        Un Future guardado que terminó en error no se entrega otra vez: se
+        descarta y el reporte se vuelve a generar.
+        """
+        clave = clave_reporte(escenario, formato)
+        enviados = []
+
+        def enviar():
+            enviados.append(clave)
+            return self._pool.submit(generar_reporte, escenario, formato)
+
+        futuro = self.cache.obtener(clave, enviar)
+        if not enviados and futuro.done() and futuro.exception() is not None:
+            self.cache.descartar(clave)
+            futuro = self.cache.obtener(clave, enviar)
+        return futuro
+
+GENERADOR = GeneradorReportes()
+
+# ============================================
+# GENERACIÓN MASIVA (ZIP)
+# ============================================
+
+def _nombre_archivo(indice, escenario, formato):
+    texto = unicodedata.normalize("NFKD", escenario['nombre']).encode("ascii", "ignore").decode("ascii")
+    texto = re.sub(r"[^A-Za-z0-9]+", "_", texto).strip("_")[:60]
+    return f"{indice:06d}{'_' + texto if texto else ''}.{formato}"
+
+def _generar_tarea(tarea, formatos):
+    # Corre en el proceso de trabajo: devuelve [(nombre en el zip, bytes), ...]
+    archivos = []
+    for indice, escenario in tarea:
+        for formato in formatos:
+            archivos.append((_nombre_archivo(indice, escenario, formato), generar_reporte(escenario, formato)))
+    return archivos
+
+def _tareas(escenarios, por_tarea):
+    tarea = []
+    for indice, escenario in enumerate(escenarios, start=1):
+        tarea.append((indice, escenario))
+        if len(tarea) == por_tarea:
+            yield tarea
+            tarea = []
+    if tarea:
+        yield tarea
+
+def generar_zip(escenarios, destino, formatos=("pdf",), procesos=None, por_tarea=ESCENARIOS_POR_TAREA, reporte=None):
+    """Genera los reportes de un iterable de escenarios en un pool y los escribe en un zip conforme terminan
+
+    Solo hay unas cuantas tareas en vuelo a la vez, así que la memoria no
+    crece con el número de clientes. Devuelve el número de archivos.
+    """
+    for formato in formatos:
+        if formato not in _GENERADORES:
+            raise ValueError(f"Formato desconocido: {formato!r} (usa {', '.join(FORMATOS)})")
+    procesos = procesos or os.cpu_count() or 1
+    total = 0
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_STORED) as z, \
+            ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_vuelo = deque()
+        tareas = _tareas(escenarios, por_tarea)
+
+        def escribir(futuro):
+            nonlocal total
+            for nombre, contenido in futuro.result():
+                # PDF y XLSX ya van comprimidos por dentro
+                z.writestr(nombre, contenido)
+                total += 1
+            if reporte:
+                reporte(total)
+
+        for tarea in tareas:
+            en_vuelo.append(pool.submit(_generar_tarea, tarea, formatos))
+            if len(en_vuelo) >= procesos * 2:
+                escribir(en_vuelo.popleft())
+        while en_vuelo:
+            escribir(en_vuelo.popleft())
+    return total
+
+# ============================================
+# LÍNEA DE COMANDOS
+# ============================================
+
+_VERDADERO = {"1", "true", "si", "sí", "s", "yes", "y", "verdadero"}
+
+def leer_clientes(ruta):
+    """Escenarios de un CSV, uno por fila, leídos conforme se necesitan"""
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        for numero, fila in enumerate(csv.DictReader(f), start=2):
+            try:
+                yield escenario_reporte(
+                    fila["semanas"], fila["salario"], fila["edad_actual"], fila["edad_retiro"],
+                    esposa=fila.get("esposa", "1").strip().lower() in _VERDADERO,
+                    salario_m40=fila.get("salario_m40") or None,
+                    reglas=fila.get("reglas") or None,
+                    nombre=fila.get("nombre", ""),
+                    fecha=fila.get("fecha") or None,
+                )
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"{ruta}, línea {numero}: {e}") from None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulador_imss.reportes",
+                                     description="Genera reportes PDF/XLSX de un archivo de clientes en un zip")
+    parser.add_argument("entrada", help="CSV de clientes")
+    parser.add_argument("salida", help="archivo .zip de salida")
+    parser.add_argument("--formato", nargs="+", choices=FORMATOS, default=["pdf"])
+    parser.add_argument("--procesos", type=int, default=0, help="procesos de trabajo (0 = todos los núcleos)")
+    parser.add_argument("--por-tarea", type=int, default=ESCENARIOS_POR_TAREA, help="clientes por tarea del pool")
+    parser.add_argument("--verificar", action="store_true",
+                        help="al terminar, revisar la estructura de cada PDF/XLSX del zip")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+
+    def avance(total):
+        print(f"\r{total:,} archivos ({total / (time.perf_counter() - inicio):,.0f}/s)", end="", file=sys.stderr)
+
+    try:
+        total = generar_zip(leer_clientes(args.entrada), args.salida, args.formato, args.procesos or None,
+                            args.por_tarea, reporte=avance)
+        if args.verificar:
+            print(f"\n✅ {verificar_zip(args.salida):,} archivos con estructura válida", end="", file=sys.stderr)
+    except (ValueError, OSError) as e:
+        print(f"\n❌ {e}", file=sys.stderr)
+        return 1
+    print(f"\n✅ {total:,} archivos en {args.salida} ({time.perf_counter() - inicio:.1f} s)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
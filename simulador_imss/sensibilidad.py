@@ -0,0 +1,74 @@
+"""Rejilla de sensibilidad de Modalidad 40: salario_m40 × meses
+
+Toda la rejilla (≈10 mil celdas) sale de una sola llamada a
+calcular_mod40_lote. El resultado trae todas las métricas y se guarda por
+tupla de entrada (en memoria y en la caché en disco de persistente.py),
+así que cambiar de métrica, redibujar u otro proceso no recalcula. Con un
+historial el promedio con M40 es el exacto (Historial.coeficientes_m40) y
+sus coeficientes entran en la clave.
+"""
+
+import functools
+
+import numpy as np
+
+from . import persistente
+from .lote import calcular_mod40_lote
+from .parametros import obtener_reglas
+
+MESES = tuple(range(1, 61))
+PUNTOS_SALARIO = 167
+
+# Métricas que se pueden graficar: campo del resultado -> etiqueta
+METRICAS = {
+    'incremento': "Incremento mensual ($)",
+    'con_m40': "Pensión con M40 ($)",
+    'roi': "ROI 20 años (%)",
+    'recuperacion_meses': "Recuperación (meses)",
+    'utilidad_20': "Utilidad 20 años ($)",
+    'inversion': "Inversión total ($)",
+}
+
+def _calcular_rejilla(semanas, salario, edad_actual, edad_retiro, esposa, salario_hasta, puntos, meses, reglas,
+                      coeficientes=None):
+    salarios = np.linspace(min(salario, salario_hasta), salario_hasta, puntos)
+    meses_arr = np.asarray(meses, dtype=np.float64)
+    promedio_m40 = None
+    if coeficientes is not None:
+        ordenada, pendiente = (np.asarray(c)[None, :] for c in coeficientes)
+        promedio_m40 = ordenada + pendiente * salarios[:, None]
+    res = calcular_mod40_lote(semanas=semanas, salario=salario, edad_actual=edad_actual, edad_retiro=edad_retiro,
+                              salario_m40=salarios[:, None], meses_m40=meses_arr[None, :], esposa=esposa,
+                              reglas=reglas, promedio_m40=promedio_m40)
+    return {'salarios': salarios, 'meses': meses_arr, **res}
+
+@functools.lru_cache(maxsize=64)
+def _rejilla(semanas, salario, edad_actual, edad_retiro, esposa, salario_hasta, puntos, meses, reglas=None,
+             coeficientes=None):
+    argumentos = (semanas, salario, edad_actual, edad_retiro, esposa, salario_hasta, puntos, meses,
+                  obtener_reglas(reglas), coeficientes)
+    rejilla = persistente.obtener(('rejilla', *argumentos), lambda: _calcular_rejilla(*argumentos))
+    # Lo guardado en caché se comparte entre llamadas: solo lectura
+    for valor in rejilla.values():
+        valor.flags.writeable = False
+    return rejilla
+
+def rejilla_mod40(semanas, salario, edad_actual, edad_retiro, esposa=True,
+                  salario_hasta=None, puntos=PUNTOS_SALARIO, meses=MESES, reglas=None, historial=None):
+    """Resultados de calcular_mod40 para cada (salario_m40, meses)
+
+    Los salarios van del salario actual al tope (25 UMA de las reglas si
+    no se indica) en `puntos` pasos. Cada métrica es una matriz
+    (salarios × meses) de solo lectura. `historial` (un cliente) da el
+    promedio exacto con M40.
+    """
+    reglas = obtener_reglas(reglas)
+    if salario_hasta is None:
+        salario_hasta = reglas.tope_salario
+    coeficientes = None
+    if historial is not None:
+        if len(historial) != 1:
+            raise ValueError(f"La rejilla es de un cliente y el historial trae {len(historial)}")
+        coeficientes = tuple(tuple(c[0].tolist()) for c in historial.coeficientes_m40(meses, reglas))
+    return _rejilla(float(semanas), float(salario), float(edad_actual), float(edad_retiro), bool(esposa),
+                    float(salario_hasta), int(puntos), tuple(meses), reglas.version, coeficientes)
@@ -0,0 +1,390 @@
+"""Servicio HTTP/JSON local del simulador (asyncio, solo biblioteca estándar + NumPy)
+
+Las solicitudes individuales que llegan dentro de la misma ventana de
+unos milisegundos se agrupan en una sola llamada al motor vectorizado;
+/lote recibe miles de escenarios en una sola solicitud.
+
+    POST /pension       {"semanas": 1315, "salario": 965.25, "edad_actual": 55, "edad_retiro": 60, "esposa": true}
+    POST /mod40         {... "salario_m40": 2932.75, "meses_m40": 24}
+    POST /comparativa   {... "salario_m40": 2932.75, "meses": [6, 12, 24, 48]}
+    POST /lote          {"tipo": "mod40", "escenarios": [{...}, ...]}   o   {"tipo": "mod40", "columnas": {...}}
+    GET  /salud         estado del servicio
+    GET  /metricas      contadores, tamaño de los grupos y latencias
+    GET  /metricas/prometheus   tiempos por sección en formato Prometheus (con --instrumentar)
+
+Todos los escenarios aceptan "reglas" (versión) y los de M40 "año_inicio_m40".
+
+Uso:
+    python -m simulador_imss.servicio --puerto 8040
+    python -m simulador_imss.servicio --host 0.0.0.0 --puerto 8040 --ventana-ms 2 --max-grupo 4096
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from collections import deque
+from http import HTTPStatus
+
+import numpy as np
+
+from . import instrumentacion
+from .instrumentacion import medir
+from .lote import calcular_mod40_lote, calcular_pension_lote
+from .parametros import REGLAS, VERSION_DEFECTO
+
+PUERTO = 8040
+VENTANA_MS = 2.0
+MAX_GRUPO = 4096
+MAX_CUERPO = 64 * 2**20
+MAX_ESCENARIOS_LOTE = 1_000_000
+MESES_COMPARATIVA = (6, 12, 18, 24, 30, 36, 42, 48)
+
+ENTRADAS = {
+    "pension": ("semanas", "salario", "edad_actual", "edad_retiro"),
+    "mod40": ("semanas", "salario", "edad_actual", "edad_retiro", "salario_m40", "meses_m40"),
+}
+
+class SolicitudInvalida(ValueError):
+    """Error del cliente: se responde con 400"""
+
+# ============================================
+# ESCENARIOS
+# ============================================
+
+def _numero(escenario, campo):
+    try:
+        valor = escenario[campo]
+    except KeyError:
+        raise SolicitudInvalida(f"Falta el campo '{campo}'") from None
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+        raise SolicitudInvalida(f"'{campo}' debe ser un número")
+    return float(valor)
+
+def _reglas(escenario):
+    version = escenario.get("reglas", VERSION_DEFECTO)
+    if not isinstance(version, str) or version not in REGLAS:
+        raise SolicitudInvalida(f"Versión de reglas desconocida: {version!r} (hay {', '.join(REGLAS)})")
+    return version
+
+def _esposa(escenario):
+    # Estricto: bool("false") sería True
+    valor = escenario.get("esposa", True)
+    if not isinstance(valor, bool):
+        raise SolicitudInvalida("'esposa' debe ser true o false")
+    return valor
+
+def normalizar(tipo, escenario):
+    """Valida un escenario y lo deja como tupla de columnas para el motor en lote"""
+    if not isinstance(escenario, dict):
+        raise SolicitudInvalida("Cada escenario debe ser un objeto JSON")
+    valores = [_numero(escenario, campo) for campo in ENTRADAS[tipo]]
+    valores.append(_esposa(escenario))
+    if tipo == "mod40":
+        valores.append(_numero(escenario, "año_inicio_m40") if "año_inicio_m40" in escenario else math.nan)
+    valores.append(_reglas(escenario))
+    return tuple(valores)
+
+def calcular_columnas(tipo, filas):
+    """Una sola llamada vectorizada para todas las filas normalizadas"""
+    columnas = list(zip(*filas))
+    datos = {campo: np.asarray(columnas[i], dtype=np.float64) for i, campo in enumerate(ENTRADAS[tipo])}
+    n = len(ENTRADAS[tipo])
+    datos["esposa"] = np.asarray(columnas[n], dtype=bool)
+    if tipo == "mod40":
+        datos["año_inicio_m40"] = np.asarray(columnas[n + 1], dtype=np.float64)
+        return calcular_mod40_lote(datos, reglas=np.asarray(columnas[n + 2], dtype=object))
+    return calcular_pension_lote(datos, reglas=np.asarray(columnas[n + 1], dtype=object))
+
+def _filas(resultado, n):
+    columnas = {campo: valores.tolist() for campo, valores in resultado.items()}
+    return [{campo: valores[i] for campo, valores in columnas.items()} for i in range(n)]
+
+# ============================================
+# AGRUPADOR (MICRO-LOTES)
+# ============================================
+
+class Agrupador:
+    """Junta los escenarios que llegan dentro de `ventana` segundos en una sola llamada al motor"""
+
+    def __init__(self, tipo, metricas, ventana=VENTANA_MS / 1000, maximo=MAX_GRUPO):
+        self.tipo = tipo
+        self.metricas = metricas
+        self.ventana = ventana
+        self.maximo = maximo
+        self._pendientes = []
+        self._temporizador = None
+
+    def calcular(self, fila):
+        """Encola una fila normalizada; devuelve un future con su dict de resultado"""
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes.append((fila, futuro))
+        if len(self._pendientes) >= self.maximo:
+            self._vaciar()
+        elif self._temporizador is None:
+            self._temporizador = asyncio.get_running_loop().call_later(self.ventana, self._vaciar)
+        return futuro
+
+    def _vaciar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        pendientes, self._pendientes = self._pendientes, []
+        if not pendientes:
+            return
+        self.metricas.grupo(self.tipo, len(pendientes))
+        try:
+            with medir(f"servicio.{self.tipo}"):
+                resultados = _filas(calcular_columnas(self.tipo, [fila for fila, _ in pendientes]), len(pendientes))
+        except Exception as e:
+            for _, futuro in pendientes:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for (_, futuro), resultado in zip(pendientes, resultados):
+            if not futuro.done():
+                futuro.set_result(resultado)
+
+# ============================================
+# MÉTRICAS
+# ============================================
+
+class Metricas:
+    """Contadores en memoria del proceso (el servicio corre en un solo hilo)"""
+
+    def __init__(self, muestras=10_000):
+        self.inicio = time.time()
+        self.solicitudes = {}
+        self.errores = {}
+        self.grupos = {}
+        self.escenarios = {}
+        self._latencias = {}
+        self._muestras = muestras
+
+    def solicitud(self, ruta, estado, segundos):
+        self.solicitudes[ruta] = self.solicitudes.get(ruta, 0) + 1
+        if estado >= 400:
+            self.errores[ruta] = self.errores.get(ruta, 0) + 1
+        self._latencias.setdefault(ruta, deque(maxlen=self._muestras)).append(segundos)
+
+    def grupo(self, tipo, n):
+        self.grupos[tipo] = self.grupos.get(tipo, 0) + 1
+        self.escenarios[tipo] = self.escenarios.get(tipo, 0) + n
+
+    def resumen(self):
+        latencias = {}
+        for ruta, valores in self._latencias.items():
+            p50, p95, p99 = np.percentile(np.fromiter(valores, float), (50, 95, 99)) * 1000
+            latencias[ruta] = {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "muestras": len(valores)}
+        return {
+            "activo_segundos": time.time() - self.inicio,
+            "solicitudes": self.solicitudes,
+            "errores": self.errores,
+            "grupos": self.grupos,
+            "escenarios_agrupados": self.escenarios,
+            "escenarios_por_grupo": {t: self.escenarios[t] / self.grupos[t] for t in self.grupos},
+            "latencias": latencias,
+        }
+
+# ============================================
+# RUTAS
+# ============================================
+
+class Servicio:
+    """Rutas JSON del simulador sobre un servidor HTTP/1.1 mínimo de asyncio"""
+
+    def __init__(self, ventana_ms=VENTANA_MS, max_grupo=MAX_GRUPO):
+        self.metricas = Metricas()
+        self.agrupadores = {tipo: Agrupador(tipo, self.metricas, ventana_ms / 1000, max_grupo) for tipo in ENTRADAS}
+        self.rutas = {
+            ("GET", "/salud"): self.salud,
+            ("GET", "/metricas"): self.resumen_metricas,
+            ("GET", "/metricas/prometheus"): self.metricas_prometheus,
+            ("POST", "/pension"): self.pension,
+            ("POST", "/mod40"): self.mod40,
+            ("POST", "/comparativa"): self.comparativa,
+            ("POST", "/lote"): self.lote,
+        }
+
+    async def salud(self, _):
+        return {"estado": "ok", "reglas": list(REGLAS), "reglas_defecto": VERSION_DEFECTO,
+                "activo_segundos": time.time() - self.metricas.inicio}
+
+    async def resumen_metricas(self, _):
+        return self.metricas.resumen()
+
+    async def metricas_prometheus(self, _):
+        # Texto plano: _responder no lo convierte a JSON
+        return instrumentacion.prometheus()
+
+    async def pension(self, cuerpo):
+        return await self.agrupadores["pension"].calcular(normalizar("pension", cuerpo))
+
+    async def mod40(self, cuerpo):
+        return await self.agrupadores["mod40"].calcular(normalizar("mod40", cuerpo))
+
+    async def comparativa(self, cuerpo):
+        if not isinstance(cuerpo, dict):
+            raise SolicitudInvalida("El cuerpo debe ser un objeto JSON")
+        meses = cuerpo.get("meses", list(MESES_COMPARATIVA))
+        if not isinstance(meses, list) or not meses:
+            raise SolicitudInvalida("'meses' debe ser una lista no vacía")
+        filas = [normalizar("mod40", {**cuerpo, "meses_m40": m}) for m in meses]
+        agrupador = self.agrupadores["mod40"]
+        resultados = await asyncio.gather(*(agrupador.calcular(fila) for fila in filas))
+        return {
+            "base": resultados[0]["base"],
+            "escenarios": [{"meses": m, **r} for m, r in zip(meses, resultados)],
+        }
+
+    async def lote(self, cuerpo):
+        """Miles de escenarios en una sola llamada al motor (sin pasar por el agrupador)"""
+        # En un hilo aparte para no detener a las demás conexiones mientras se valida y calcula
+        tipo, n, respuesta = await asyncio.to_thread(self._lote, cuerpo)
+        self.metricas.grupo(f"lote_{tipo}", n)
+        return respuesta
+
+    def _lote(self, cuerpo):
+        if not isinstance(cuerpo, dict) or cuerpo.get("tipo") not in ENTRADAS:
+            raise SolicitudInvalida(f"'tipo' debe ser uno de: {', '.join(ENTRADAS)}")
+        tipo = cuerpo["tipo"]
+        if "columnas" in cuerpo:
+            columnas = cuerpo["columnas"]
+            if not isinstance(columnas, dict) or not columnas:
+                raise SolicitudInvalida("'columnas' debe ser un objeto de listas")
+            n = {len(v) if isinstance(v, list) else -1 for v in columnas.values()}
+            if len(n) != 1 or -1 in n:
+                raise SolicitudInvalida("Todas las columnas deben ser listas del mismo largo")
+            escenarios = [dict(zip(columnas, valores)) for valores in zip(*columnas.values())]
+        else:
+            escenarios = cuerpo.get("escenarios")
+            if not isinstance(escenarios, list):
+                raise SolicitudInvalida("Falta 'escenarios' (lista) o 'columnas' (objeto)")
+        if len(escenarios) > MAX_ESCENARIOS_LOTE:
+            raise SolicitudInvalida(f"Máximo {MAX_ESCENARIOS_LOTE:,} escenarios por solicitud")
+
+        filas = []
+        for i, escenario in enumerate(escenarios):
+            try:
+                filas.append(normalizar(tipo, escenario))
+            except SolicitudInvalida as e:
+                raise SolicitudInvalida(f"Escenario {i}: {e}") from None
+        if not filas:
+            return tipo, 0, {"columnas": {}} if "columnas" in cuerpo else {"resultados": []}
+
+        with medir(f"servicio.lote_{tipo}"):
+            resultado = calcular_columnas(tipo, filas)
+        if "columnas" in cuerpo:
+            return tipo, len(filas), {"columnas": {campo: valores.tolist() for campo, valores in resultado.items()}}
+        return tipo, len(filas), {"resultados": _filas(resultado, len(filas))}
+
+    # ============================================
+    # HTTP
+    # ============================================
+
+    async def atender(self, lector, escritor):
+        """Una conexión HTTP/1.1 (keep-alive) con varias solicitudes en serie"""
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                inicio = time.perf_counter()
+                try:
+                    metodo, ruta, version = linea.decode("latin-1").split()
+                except ValueError:
+                    await self._responder(escritor, HTTPStatus.BAD_REQUEST, {"error": "Línea de solicitud inválida"}, False)
+                    break
+                encabezados = {}
+                while True:
+                    linea = await lector.readline()
+                    if linea in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = linea.decode("latin-1").partition(":")
+                    encabezados[nombre.strip().lower()] = valor.strip()
+                conexion = encabezados.get("connection", "").lower()
+                mantener = conexion != "close" if version == "HTTP/1.1" else conexion == "keep-alive"
+
+                estado, respuesta = await self._despachar(metodo, ruta.split("?", 1)[0], encabezados, lector)
+                await self._responder(escritor, estado, respuesta, mantener)
+                self.metricas.solicitud(ruta.split("?", 1)[0], estado, time.perf_counter() - inicio)
+                if not mantener or estado == HTTPStatus.REQUEST_ENTITY_TOO_LARGE:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _despachar(self, metodo, ruta, encabezados, lector):
+        try:
+            largo = int(encabezados.get("content-length", 0))
+            if largo < 0:
+                raise ValueError(largo)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"error": "Content-Length inválido"}
+        if largo > MAX_CUERPO:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": f"Cuerpo mayor a {MAX_CUERPO // 2**20} MB"}
+        cuerpo = await lector.readexactly(largo) if largo else b""
+
+        manejador = self.rutas.get((metodo, ruta))
+        if manejador is None:
+            if any(r == ruta for _, r in self.rutas):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"Método {metodo} no permitido en {ruta}"}
+            return HTTPStatus.NOT_FOUND, {"error": f"Ruta desconocida: {ruta}"}
+        try:
+            datos = json.loads(cuerpo) if cuerpo else {}
+        except (ValueError, UnicodeDecodeError):
+            return HTTPStatus.BAD_REQUEST, {"error": "El cuerpo no es JSON válido"}
+        try:
+            return HTTPStatus.OK, await manejador(datos)
+        except SolicitudInvalida as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _responder(self, escritor, estado, datos, mantener):
+        if isinstance(datos, str):
+            cuerpo, tipo = datos.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            cuerpo, tipo = json.dumps(datos, ensure_ascii=False, default=str).encode("utf-8"), "application/json; charset=utf-8"
+        encabezado = (
+            f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(cuerpo)}\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+        )
+        escritor.write(encabezado.encode("latin-1") + cuerpo)
+        await escritor.drain()
+
+    async def iniciar(self, host="127.0.0.1", puerto=PUERTO):
+        """Arranca el servidor y lo devuelve (asyncio.Server)"""
+        return await asyncio.start_server(self.atender, host, puerto)
+
+async def servir(host="127.0.0.1", puerto=PUERTO, ventana_ms=VENTANA_MS, max_grupo=MAX_GRUPO):
+    servidor = await Servicio(ventana_ms, max_grupo).iniciar(host, puerto)
+    direcciones = ", ".join(f"http://{s.getsockname()[0]}:{s.getsockname()[1]}" for s in servidor.sockets)
+    print(f"✅ Servicio en {direcciones} (ventana {ventana_ms} ms, grupos de hasta {max_grupo})", flush=True)
+    async with servidor:
+        await servidor.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulador_imss.servicio",
+                                     description="Servicio HTTP/JSON local del simulador")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--ventana-ms", type=float, default=VENTANA_MS, help="espera máxima para juntar solicitudes")
+    parser.add_argument("--max-grupo", type=int, default=MAX_GRUPO, help="escenarios por llamada al motor")
+    parser.add_argument("--instrumentar", action="store_true", help="medir tiempos por sección (/metricas/prometheus)")
+    args = parser.parse_args(argv)
+    if args.instrumentar:
+        instrumentacion.activar()
+    try:
+        asyncio.run(servir(args.host, args.puerto, args.ventana_ms, args.max_grupo))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
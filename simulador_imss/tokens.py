@@ -0,0 +1,220 @@
+"""Licencias como tokens firmados (HMAC-SHA256), validables sin archivos ni BD
+
+Un token lleva dentro el código, la fecha de expiración, max_maquinas y
+las máquinas autorizadas, firmado con una clave secreta compartida por
+todas las réplicas. Validarlo es solo CPU: decodificar, comparar la firma
+y revisar fecha, máquina y lista de revocados (en memoria), así que no
+depende de qué réplica atiende la sesión.
+
+    <carga base64url>.<firma base64url>
+
+La clave se lee de la variable SIMULADOR_CLAVE_LICENCIAS (hex) o del
+archivo clave_licencias.key. Los tokens revocados se listan por id, uno
+por línea, en licencias_revocadas.txt.
+
+Uso:
+    python -m simulador_imss.tokens clave
+    python -m simulador_imss.tokens emitir CLIENTE1-A3F8 --expira 2026-12-31 --maquina 6384691658 --maquina 1a2b3c4d5e
+    python -m simulador_imss.tokens verificar <token> --maquina 6384691658
+    python -m simulador_imss.tokens revocar <token o id>
+"""
+
+import argparse
+import base64
+import binascii
+import functools
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+VARIABLE_CLAVE = "SIMULADOR_CLAVE_LICENCIAS"
+ARCHIVO_CLAVE = "clave_licencias.key"
+ARCHIVO_REVOCADOS = "licencias_revocadas.txt"
+
+# Cada cuánto se revisa si cambió la lista de revocados (segundos)
+INTERVALO_REVOCADOS = 60
+
+class LicenciaInvalida(ValueError):
+    """El token no es válido para esta máquina o fecha"""
+
+# ============================================
+# CLAVE Y CODIFICACIÓN
+# ============================================
+
+@functools.lru_cache(maxsize=None)
+def cargar_clave():
+    """Clave secreta de firma (variable de entorno o archivo)"""
+    texto = os.environ.get(VARIABLE_CLAVE)
+    if not texto and os.path.exists(ARCHIVO_CLAVE):
+        with open(ARCHIVO_CLAVE, "r") as f:
+            texto = f.read()
+    if not texto:
+        raise LicenciaInvalida(f"No hay clave de licencias ({VARIABLE_CLAVE} o {ARCHIVO_CLAVE})")
+    return bytes.fromhex(texto.strip())
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+def _firmar(carga, clave):
+    return hmac.new(clave, carga.encode("ascii"), hashlib.sha256).digest()
+
+def emitir_token(codigo, expira, maquinas, max_maquinas=2, clave=None):
+    """Crea un token firmado; `expira` es 'AAAA-MM-DD' o date"""
+    maquinas = list(dict.fromkeys(maquinas))
+    if len(maquinas) > max_maquinas:
+        raise ValueError(f"{len(maquinas)} máquinas exceden el máximo de {max_maquinas}")
+    if isinstance(expira, date):
+        expira = expira.isoformat()
+    datetime.strptime(expira, "%Y-%m-%d")
+
+    datos = {
+        "v": 1,
+        "id": secrets.token_hex(8),
+        "codigo": codigo,
+        "expira": expira,
+        "max_maquinas": max_maquinas,
+        "maquinas": maquinas,
+        "emitida": datetime.now().isoformat(timespec="seconds"),
+    }
+    carga = _b64(json.dumps(datos, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    return f"{carga}.{_b64(_firmar(carga, clave or cargar_clave()))}"
+
+@functools.lru_cache(maxsize=1024)
+def _leer_token(token, clave):
+    # Solo la parte pura (firma y decodificación) se memoriza; la fecha y
+    # los revocados se revisan en cada validación
+    try:
+        carga, firma = token.strip().split(".")
+        firma_ok = hmac.compare_digest(_desde_b64(firma), _firmar(carga, clave))
+    except (ValueError, binascii.Error):
+        raise LicenciaInvalida("Token con formato inválido") from None
+    if not firma_ok:
+        raise LicenciaInvalida("Firma inválida")
+    datos = json.loads(_desde_b64(carga))
+    datos["_expira"] = datetime.strptime(datos["expira"], "%Y-%m-%d")
+    datos["maquinas"] = frozenset(datos["maquinas"])
+    return datos
+
+# ============================================
+# REVOCADOS
+# ============================================
+
+class ListaRevocados:
+    """Ids revocados en un set en memoria; el archivo se revisa cada INTERVALO_REVOCADOS"""
+
+    def __init__(self, ruta=ARCHIVO_REVOCADOS, intervalo=INTERVALO_REVOCADOS):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._ids = frozenset()
+        self._mtime = None
+        self._revisado = float("-inf")
+        self._candado = threading.Lock()
+
+    def _recargar(self):
+        try:
+            mtime = os.stat(self.ruta).st_mtime_ns
+        except FileNotFoundError:
+            self._ids, self._mtime = frozenset(), None
+            return
+        if mtime != self._mtime:
+            with open(self.ruta, "r") as f:
+                self._ids = frozenset(linea.strip() for linea in f if linea.strip() and not linea.startswith("#"))
+            self._mtime = mtime
+
+    def __contains__(self, id_token):
+        ahora = time.monotonic()
+        if ahora - self._revisado >= self.intervalo:
+            with self._candado:
+                if ahora - self._revisado >= self.intervalo:
+                    self._recargar()
+                    self._revisado = ahora
+        return id_token in self._ids
+
+    def revocar(self, id_token):
+        with self._candado:
+            with open(self.ruta, "a") as f:
+                f.write(f"{id_token}\n")
+            self._revisado = float("-inf")
+
+REVOCADOS = ListaRevocados()
+
+# ============================================
+# VALIDACIÓN
+# ============================================
+
+def validar_token(token, machine_id, ahora=None, clave=None, revocados=None):
+    """Devuelve los datos del token o lanza LicenciaInvalida"""
+    datos = _leer_token(token, clave or cargar_clave())
+    if datos["id"] in (REVOCADOS if revocados is None else revocados):
+        raise LicenciaInvalida("Licencia revocada")
+    if (ahora or datetime.now()) > datos["_expira"]:
+        raise LicenciaInvalida("Licencia expirada")
+    if machine_id not in datos["maquinas"]:
+        raise LicenciaInvalida(f"Esta máquina no está autorizada ({len(datos['maquinas'])}/{datos['max_maquinas']} registradas)")
+    return dict(datos)
+
+def parece_token(texto):
+    return texto.count(".") == 1 and len(texto) > 40
+
+# ============================================
+# LÍNEA DE COMANDOS
+# ============================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulador_imss.tokens",
+                                     description="Emite, verifica y revoca tokens de licencia")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_clave = sub.add_parser("clave", help=f"genera una clave nueva en {ARCHIVO_CLAVE}")
+    p_clave.add_argument("--forzar", action="store_true", help="reemplazar la clave existente")
+
+    p_emitir = sub.add_parser("emitir", help="emite un token")
+    p_emitir.add_argument("codigo")
+    p_emitir.add_argument("--expira", required=True, help="AAAA-MM-DD")
+    p_emitir.add_argument("--maquina", action="append", default=[], required=True, help="machine id autorizado (repetible)")
+    p_emitir.add_argument("--max-maquinas", type=int, default=2)
+
+    p_verificar = sub.add_parser("verificar", help="valida un token")
+    p_verificar.add_argument("token")
+    p_verificar.add_argument("--maquina", help="machine id a comprobar (por defecto, cualquiera del token)")
+
+    p_revocar = sub.add_parser("revocar", help=f"agrega el id del token a {ARCHIVO_REVOCADOS}")
+    p_revocar.add_argument("token", help="token completo o su id")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.comando == "clave":
+            if os.path.exists(ARCHIVO_CLAVE) and not args.forzar:
+                raise LicenciaInvalida(f"{ARCHIVO_CLAVE} ya existe (usa --forzar para reemplazarla; los tokens anteriores dejarán de valer)")
+            with open(ARCHIVO_CLAVE, "w") as f:
+                f.write(secrets.token_hex(32))
+            os.chmod(ARCHIVO_CLAVE, 0o600)
+            print(f"✅ Clave guardada en {ARCHIVO_CLAVE}")
+        elif args.comando == "emitir":
+            print(emitir_token(args.codigo, args.expira, args.maquina, args.max_maquinas))
+        elif args.comando == "verificar":
+            datos = _leer_token(args.token, cargar_clave())
+            maquina = args.maquina or next(iter(datos["maquinas"]), "")
+            datos = validar_token(args.token, maquina)
+            print(f"✅ {datos['codigo']} (id {datos['id']}) válido hasta {datos['expira']} - "
+                  f"máquinas: {', '.join(sorted(datos['maquinas']))}")
+        elif args.comando == "revocar":
+            id_token = _leer_token(args.token, cargar_clave())["id"] if "." in args.token else args.token
+            REVOCADOS.revocar(id_token)
+            print(f"✅ Token {id_token} revocado")
+    except (LicenciaInvalida, ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Reglas versionadas: costo de Modalidad 40 por año de inicio"""
+
+import numpy as np
+import pytest
+
+from simulador_imss import motor
+from simulador_imss.lote import costo_m40_lote
+from simulador_imss.parametros import REGLAS, Reglas
+
+AÑOS_INICIO = range(2015, 2046)
+MESES = (6, 12, 24, 48, 60, 120)
+
+@pytest.mark.parametrize("version", sorted(REGLAS))
+@pytest.mark.parametrize("meses", MESES)
+def test_costo_no_decrece_con_el_año_de_inicio(version, meses):
+    reglas = REGLAS[version]
+    costos = [reglas.costo_m40(meses, año) for año in AÑOS_INICIO]
+    assert all(c > 0 for c in costos)
+    assert costos == sorted(costos)
+    lote = costo_m40_lote(np.full(len(AÑOS_INICIO), meses), version, np.array(AÑOS_INICIO, dtype=np.float64))
+    np.testing.assert_array_equal(lote, costos)
+
+def test_v1_cobra_igual_cualquier_año_de_inicio():
+    # Las tasas de v1 van por año de M40, como en el simulador original
+    for año in (None, 2025, 2029, 2040):
+        res = motor.calcular_mod40(1315, 965.25, 55, 60, 2932, 48, True, reglas="ley73-v1", año_inicio=año)
+        assert res["inversion"] == 641050.23
+
+def test_tasa_posterior_menor_se_rechaza():
+    datos = {
+        "version": "prueba", "factor_por_edad": {"60": 0.75}, "factor_edad_otro": 0.75, "semanas_minimas": 500,
+        "semanas_promedio": 250, "pct_esposa": 0.15, "decreto_fox": 0.11, "ajuste_final_m40": 1.0,
+        "meses_minimos_m40": 6, "dias_por_mes_m40": 30.4,
+        "art167": {"limites_vsm": [None], "cuantia": [0.13], "incremento": [0.0245]},
+        "año_vigencia": 2026, "uma": {"2026": 117.31}, "salario_minimo": {"2026": 315.04}, "veces_uma_tope": 25,
+        "año_inicio_m40": 2025, "tasas_m40": {"2025": 0.13347, "2026": 0.14438}, "tasa_m40_posterior": 0.0,
+    }
+    with pytest.raises(ValueError, match="tasa_m40_posterior"):
+        Reglas(datos)
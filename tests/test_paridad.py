@@ -0,0 +1,146 @@
+"""Motores reescritos contra la referencia: lote y núcleo contra motor.py, optimizador contra fuerza bruta"""
+
+import numpy as np
+import pytest
+
+from simulador_imss import motor
+from simulador_imss.historial import Historial
+from simulador_imss.lote import calcular_mod40_lote, calcular_pension_lote
+from simulador_imss.optimizador import meta_mod40, optimizar_mod40
+from simulador_imss.parametros import REGLAS
+
+VERSIONES = sorted(REGLAS)
+# Búsqueda acotada para que la fuerza bruta quepa en la prueba
+MESES = (3, 6, 12, 24, 48, 60)
+EDADES = (60, 62, 65)
+
+def _escenarios(n, semilla):
+    """Mismos casos límite que nucleo.escenarios_paridad, sin depender de numba"""
+    rng = np.random.default_rng(semilla)
+    return {
+        "semanas": rng.integers(0, 2600, n).astype(np.float64),
+        "salario": np.round(rng.uniform(50, 3500, n), 2),
+        "edad_actual": rng.integers(40, 66, n).astype(np.float64),
+        "edad_retiro": rng.choice([59, 60, 61, 62, 63, 64, 65, 66, 60.5], n).astype(np.float64),
+        "salario_m40": np.round(rng.uniform(100, 3200, n), 2),
+        "meses_m40": np.where(rng.random(n) < 0.2, np.round(rng.uniform(0, 700, n), 1),
+                              rng.integers(0, 61, n)).astype(np.float64),
+        "esposa": rng.integers(0, 2, n).astype(bool),
+        "año_inicio_m40": rng.choice([np.nan, 2018, 2022, 2026, 2031, 2040], n),
+        "promedio_m40": np.where(rng.random(n) < 0.2, np.round(rng.uniform(100, 3200, n), 2), np.nan),
+    }
+
+def _opcional(valor):
+    return None if np.isnan(valor) else valor
+
+def _historial(semilla):
+    """Un cliente con huecos y cambios de salario"""
+    rng = np.random.default_rng(semilla)
+    semanas = np.arange(1000, 1000 + int(rng.integers(150, 900)))
+    salario = np.round(rng.uniform(200, 1200, len(semanas)), 2)
+    salario[rng.random(len(semanas)) < 0.15] = 0.0
+    return Historial(semanas, salario, en_numeros=True)
+
+# ============================================
+# LOTE Y NÚCLEO CONTRA MOTOR
+# ============================================
+
+@pytest.mark.parametrize("version", VERSIONES)
+def test_lote_igual_a_motor(version):
+    datos = _escenarios(400, semilla=1)
+    base = calcular_pension_lote(semanas=datos["semanas"], salario=datos["salario"],
+                                 edad_actual=datos["edad_actual"], edad_retiro=datos["edad_retiro"],
+                                 esposa=datos["esposa"], reglas=version)
+    res = calcular_mod40_lote(**{k: v for k, v in datos.items() if k not in ("año_inicio_m40",)},
+                              año_inicio=datos["año_inicio_m40"], reglas=version)
+    for i in range(len(datos["semanas"])):
+        fila = {k: v[i].item() for k, v in datos.items()}
+        argumentos = (fila["semanas"], fila["salario"], fila["edad_actual"], fila["edad_retiro"])
+        esperado = motor.calcular_pension(*argumentos, fila["esposa"], reglas=version)
+        assert {k: base[k][i] for k in esperado} == esperado, i
+        esperado = motor.calcular_mod40(*argumentos, fila["salario_m40"], fila["meses_m40"], fila["esposa"],
+                                        reglas=version, año_inicio=_opcional(fila["año_inicio_m40"]),
+                                        promedio_m40=_opcional(fila["promedio_m40"]))
+        assert {k: res[k][i] for k in esperado} == esperado, i
+
+def test_nucleo_igual_a_lote_y_motor():
+    pytest.importorskip("numba")
+    from simulador_imss import nucleo
+
+    assert nucleo.verificar_paridad(filas=5_000, escalares=200) == []
+
+# ============================================
+# OPTIMIZADOR Y META CONTRA FUERZA BRUTA
+# ============================================
+
+def _clientes(n, semilla):
+    rng = np.random.default_rng(semilla)
+    for _ in range(n):
+        yield (float(rng.integers(500, 1500)), float(np.round(rng.uniform(200, 1200), 2)),
+               float(rng.integers(50, 59)), bool(rng.integers(0, 2)), rng)
+
+def _rejilla(semanas, salario, edad_actual, esposa, version, historial):
+    """calcular_mod40 en cada (edad, meses, salario_m40 de peso en peso hasta el tope): la fuerza bruta"""
+    tope = REGLAS[version].tope_salario
+    salarios = np.append(np.arange(np.ceil(salario), tope, 1.0), tope)
+    for edad in EDADES:
+        for meses in MESES:
+            promedio_m40 = None
+            if historial is not None:
+                promedio_m40 = historial.promedio_m40(salarios, meses, version)
+            yield calcular_mod40_lote(semanas=semanas, salario=salario, edad_actual=edad_actual, edad_retiro=edad,
+                                      salario_m40=salarios, meses_m40=meses, esposa=esposa, reglas=version,
+                                      promedio_m40=promedio_m40)
+
+def _igual_a_motor(plan, semanas, salario, edad_actual, esposa, version, historial):
+    promedio_m40 = None
+    if historial is not None:
+        promedio_m40 = historial.promedio_m40(plan["salario_m40"], plan["meses_m40"], version)[0].item()
+    esperado = motor.calcular_mod40(semanas, salario, edad_actual, plan["edad_retiro"], plan["salario_m40"],
+                                    plan["meses_m40"], esposa, reglas=version, promedio_m40=promedio_m40)
+    assert {k: plan[k] for k in esperado} == esperado
+
+@pytest.mark.parametrize("version", VERSIONES)
+@pytest.mark.parametrize("objetivo,campo", [("roi", "roi"), ("utilidad", "utilidad_20"), ("pension", "con_m40")])
+@pytest.mark.parametrize("con_historial", [False, True])
+def test_optimizar_mod40_no_pierde_contra_fuerza_bruta(version, objetivo, campo, con_historial):
+    for semanas, salario, edad_actual, esposa, rng in _clientes(2, semilla=7):
+        presupuesto = float(rng.uniform(20_000, 300_000))
+        historial = _historial(int(rng.integers(1 << 30))) if con_historial else None
+        if historial is not None:
+            salario = round(historial.promedio(version)[0].item(), 2)
+        plan = optimizar_mod40(semanas, salario, edad_actual, esposa, presupuesto, objetivo, meses=MESES,
+                               edades_retiro=EDADES, reglas=version, historial=historial)
+        mejor = -np.inf
+        for res in _rejilla(semanas, salario, edad_actual, esposa, version, historial):
+            cabe = res["inversion"] <= presupuesto
+            if cabe.any():
+                mejor = max(mejor, res[campo][cabe].max())
+        if plan is None:
+            assert mejor == -np.inf
+            continue
+        assert plan["inversion"] <= presupuesto
+        assert plan[campo] >= mejor
+        _igual_a_motor(plan, semanas, salario, edad_actual, esposa, version, historial)
+
+@pytest.mark.parametrize("version", VERSIONES)
+@pytest.mark.parametrize("con_historial", [False, True])
+def test_meta_mod40_es_el_plan_mas_barato(version, con_historial):
+    for semanas, salario, edad_actual, esposa, rng in _clientes(3, semilla=5):
+        meta = float(np.round(rng.uniform(15_000, 40_000)))
+        historial = _historial(int(rng.integers(1 << 30))) if con_historial else None
+        if historial is not None:
+            salario = round(historial.promedio(version)[0].item(), 2)
+        plan = meta_mod40(semanas, salario, edad_actual, meta, esposa, meses=MESES, edades_retiro=EDADES,
+                          reglas=version, historial=historial)
+        mas_barato = np.inf
+        for res in _rejilla(semanas, salario, edad_actual, esposa, version, historial):
+            llega = res["con_m40"] >= meta
+            if llega.any():
+                mas_barato = min(mas_barato, res["inversion"][llega].min())
+        if plan is None:
+            assert mas_barato == np.inf
+            continue
+        assert plan["con_m40"] >= meta
+        assert plan["inversion"] <= mas_barato
+        _igual_a_motor(plan, semanas, salario, edad_actual, esposa, version, historial)
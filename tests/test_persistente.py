@@ -0,0 +1,33 @@
+"""Caché en disco: apagada hasta que se activa"""
+
+import pytest
+
+from simulador_imss import persistente
+from simulador_imss.sensibilidad import _rejilla, rejilla_mod40
+
+@pytest.fixture
+def sin_cache_en_disco(monkeypatch):
+    monkeypatch.setattr(persistente, "RUTA", None)
+    monkeypatch.setattr(persistente, "_cache", None)
+    _rejilla.cache_clear()
+    yield
+    _rejilla.cache_clear()
+
+def test_sin_activar_no_escribe_nada(sin_cache_en_disco, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rejilla_mod40(1315, 965.25, 55, 60, puntos=3, meses=(12, 24))
+    assert persistente.obtener_cache() is None
+    assert list(tmp_path.iterdir()) == []
+
+def test_activar_guarda_en_la_ruta(sin_cache_en_disco, tmp_path):
+    ruta = tmp_path / "resultados.db"
+    persistente.activar(ruta)
+    primera = rejilla_mod40(1315, 965.25, 55, 60, puntos=3, meses=(12, 24))
+    _rejilla.cache_clear()
+    segunda = rejilla_mod40(1315, 965.25, 55, 60, puntos=3, meses=(12, 24))
+    assert ruta.exists()
+    assert persistente.obtener_cache().estadisticas()["aciertos"] == 1
+    assert (primera["con_m40"] == segunda["con_m40"]).all()
+
+    persistente.activar(None)
+    assert persistente.obtener_cache() is None